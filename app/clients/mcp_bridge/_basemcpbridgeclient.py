@@ -20,6 +20,10 @@ class BaseMCPBridgeClient(ABC):
         self.headers = headers
         self.timeout = timeout
 
+    @abstractmethod
+    async def check(self) -> bool:
+        """Check the health of the MCP bridge API."""
+
     @abstractmethod
     async def get_tool_list(self) -> List[AgentsTool]:
         pass
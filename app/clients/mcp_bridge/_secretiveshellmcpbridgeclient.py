@@ -1,4 +1,5 @@
 import json
+import logging
 from typing import Dict, List
 
 from fastapi import HTTPException
@@ -7,17 +8,22 @@ import httpx
 from app.clients.mcp_bridge._basemcpbridgeclient import BaseMCPBridgeClient
 from app.schemas.agents import AgentsTool
 
+logger = logging.getLogger(__name__)
+
 
 class SecretiveshellMCPBridgeClient(BaseMCPBridgeClient):
     def __init__(self, url: str, headers: Dict[str, str], timeout: int, *args, **kwargs):
         super().__init__(url=url, headers=headers, timeout=timeout)
 
-        # Keep health check synchronous in __init__
+    async def check(self) -> bool:
         try:
-            response = httpx.get(f"{self.url}/health", headers=self.headers, timeout=self.timeout)
+            async with httpx.AsyncClient(timeout=self.timeout) as async_client:
+                response = await async_client.get(f"{self.url}/health", headers=self.headers)
             assert response.status_code == 200, f"Secretiveshell API is not reachable: {response.text} {response.status_code}"
+            return True
         except Exception as e:
-            raise Exception(f"Secretiveshell API is not reachable: {e}") from e
+            logger.error(f"Secretiveshell API is not reachable: {e}")
+            return False
 
     async def get_tool_list(self) -> List[AgentsTool]:
         async with httpx.AsyncClient(timeout=self.timeout) as async_client:
@@ -1,7 +1,6 @@
 from urllib.parse import urljoin
 
 from coredis import ConnectionPool
-import requests
 
 from app.utils.variables import (
     ENDPOINT__AUDIO_TRANSCRIPTIONS,
@@ -44,7 +43,7 @@ class AlbertModelClient(BaseModelClient):
         **kwargs,
     ) -> None:
         """
-        Initialize the Albert model client and check if the model is available.
+        Initialize the Albert model client.
         """
         super().__init__(
             url=url,
@@ -58,12 +57,17 @@ class AlbertModelClient(BaseModelClient):
             model_cost_completion_tokens=model_cost_completion_tokens,
             redis=redis,
             metrics_retention_ms=metrics_retention_ms,
+            *args,
+            **kwargs,
         )
 
-        # check if model is available
+    async def load(self) -> None:
+        """
+        Check if the model is available and set the attributes of the model.
+        """
         url = urljoin(base=str(self.url), url=self.ENDPOINT_TABLE[ENDPOINT__MODELS])
 
-        response = requests.get(url=url, headers=self.headers, timeout=self.timeout)
+        response = await self.async_client.get(url=url, headers=self.headers)
         assert response.status_code == 200, f"Failed to get models list ({response.status_code})."
 
         response = response.json()["data"]
@@ -75,13 +79,4 @@ class AlbertModelClient(BaseModelClient):
         self.max_context_length = response.get("max_context_length")
 
         # set vector size
-        response = requests.post(
-            url=urljoin(base=self.url, url=self.ENDPOINT_TABLE[ENDPOINT__EMBEDDINGS]),
-            headers=self.headers,
-            json={"model": self.name, "input": "hello world"},
-            timeout=self.timeout,
-        )
-        if response.status_code == 200:
-            self.vector_size = len(response.json()["data"][0]["embedding"])
-        else:
-            self.vector_size = None
+        self.vector_size = await self._get_vector_size()
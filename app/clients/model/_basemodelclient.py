@@ -1,11 +1,9 @@
 from abc import ABC
 import ast
-import asyncio
 from datetime import datetime
 import importlib
 from json import JSONDecodeError, dumps, loads
 import logging
-import re
 import time
 import traceback
 from typing import Any, Dict, Optional, Tuple, Type
@@ -14,7 +12,12 @@ from urllib.parse import urljoin
 from coredis import ConnectionPool, Redis
 from fastapi import HTTPException
 import httpx
+import orjson
 
+from app.helpers._circuitbreaker import CircuitBreaker
+from app.helpers._metricsbuffer import MetricsBuffer
+from app.helpers._serversenteventsparser import ServerSentEventsParser
+from app.helpers._usagetokenizer import StreamUsageAccumulator
 from app.schemas.core.configuration import ModelProviderType
 from app.schemas.core.metric import Metric
 from app.schemas.usage import Detail, Usage
@@ -57,6 +60,15 @@ class BaseModelClient(ABC):
         model_cost_completion_tokens: float,
         redis: ConnectionPool,
         metrics_retention_ms: int,
+        connect_timeout: Optional[int] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 5.0,
+        http2: bool = False,
+        max_batch_size: Optional[int] = None,
+        max_concurrent_requests: Optional[int] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        metrics_buffer: Optional[MetricsBuffer] = None,
         *args,
         **kwargs,
     ) -> None:
@@ -71,11 +83,32 @@ class BaseModelClient(ABC):
         self.timeout = timeout
         self.vector_size = None
         self.max_context_length = None
+        self.max_batch_size = max_batch_size
+        self.max_concurrent_requests = max_concurrent_requests
+        self.inflight_requests = 0  # requests of this worker
+        self.shared_inflight_requests = 0  # requests of the other workers, if shared through redis
         self.redis = Redis(connection_pool=redis)
         self.metrics_retention_ms = metrics_retention_ms
 
         self.headers = {"Authorization": f"Bearer {self.key}"} if self.key else {}
 
+        # fed with the outcomes of the forwarded requests and of the health checks, used by the ModelRouter to eject unhealthy providers
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(name=f"{self.name} ({self.url})")
+
+        # performance metrics are written in redis in batches, the buffer is usually shared by all model providers
+        self.metrics_buffer = metrics_buffer or MetricsBuffer(redis=redis, retention_ms=metrics_retention_ms)
+
+        # persistent connection pool shared by all requests forwarded to the model provider
+        self.async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout=self.timeout, connect=connect_timeout or self.timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            http2=http2,
+        )
+
     @staticmethod
     def import_module(type: ModelProviderType) -> "Type[BaseModelClient]":
         """
@@ -92,6 +125,120 @@ class BaseModelClient(ABC):
 
         return getattr(module, f"{type.capitalize()}ModelClient")
 
+    async def load(self) -> None:
+        """
+        Check if the model is available on the model provider and set the attributes of the model (max context length, vector size). This method
+        can be overridden by a subclass to probe the model provider, it raises an exception if the model is not available.
+        """
+        pass
+
+    async def check(self, timeout: float) -> bool:
+        """
+        Check the health of the model provider by requesting its models endpoint, and record the result in the circuit breaker.
+
+        Args:
+            timeout(float): The timeout of the health check in seconds.
+
+        Returns:
+            bool: True if the model provider is healthy.
+        """
+        url = urljoin(base=str(self.url), url=self.ENDPOINT_TABLE[ENDPOINT__MODELS])
+        try:
+            response = await self.async_client.get(url=url, headers=self.headers, timeout=timeout)
+            healthy = response.status_code == 200
+        except Exception as e:
+            logger.debug(f"Health check of model provider {self.name} ({self.url}) failed: {e}")
+            healthy = False
+
+        if healthy:
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+
+        return healthy
+
+    async def get_latency(self, metric: str, percentile: float = 0.9) -> Optional[float]:
+        """
+        Get a percentile of the recent values of a performance metric of the model provider, stored in Redis time series by _log_performance_metric.
+
+        Args:
+            metric(str): The metric to read, "latency" (in milliseconds) or "time_to_first_token" (in microseconds).
+            percentile(float): The percentile to compute, between 0 and 1.
+
+        Returns:
+            Optional[float]: The percentile of the values of the metric over the metrics retention window, None if there is no value.
+        """
+        key = f"metrics_ts:{metric}:{self.name}:{self.url}"
+        now = int(time.time() * 1_000)
+        try:
+            values = await self.redis.timeseries.range(key=key, fromtimestamp=now - self.metrics_retention_ms, totimestamp=now)
+        except Exception as e:
+            logger.debug(f"Failed to read request metrics in redis ts {key}: {e}")
+            return None
+
+        values = sorted(float(value) for _, value in values)
+        if not values:
+            return None
+
+        return values[min(int(len(values) * percentile), len(values) - 1)]
+
+    async def share_inflight_requests(self, worker_id: str, ttl: int) -> None:
+        """
+        Publish the number of in-flight requests of this worker to the model provider in Redis, and read the number of in-flight requests of the
+        other workers. The counters of the workers that have not published for more than the time to live are ignored and removed.
+
+        Args:
+            worker_id(str): The unique identifier of the worker.
+            ttl(int): The time to live of the counters in seconds.
+        """
+        key = f"inflight_requests:{self.name}:{self.url}"
+        now = int(time.time())
+        try:
+            await self.redis.hset(key=key, field_values={worker_id: f"{self.inflight_requests}:{now}"})
+            await self.redis.expire(key=key, seconds=ttl)
+            counters = await self.redis.hgetall(key=key)
+        except Exception as e:
+            logger.debug(f"Failed to share in-flight requests in redis {key}: {e}")
+            return
+
+        shared_inflight_requests, expired_workers = 0, list()
+        for worker, counter in counters.items():
+            worker = worker.decode() if isinstance(worker, bytes) else worker
+            counter = counter.decode() if isinstance(counter, bytes) else counter
+            inflight_requests, timestamp = counter.split(":")
+            if now - int(timestamp) > ttl:
+                expired_workers.append(worker)
+            elif worker != worker_id:
+                shared_inflight_requests += int(inflight_requests)
+
+        self.shared_inflight_requests = shared_inflight_requests
+
+        if expired_workers:
+            try:
+                await self.redis.hdel(key=key, fields=expired_workers)
+            except Exception as e:
+                logger.debug(f"Failed to remove expired in-flight requests in redis {key}: {e}")
+
+    async def close(self) -> None:
+        """
+        Close the connection pool of the model provider.
+        """
+        await self.async_client.aclose()
+
+    async def _get_vector_size(self) -> Optional[int]:
+        """
+        Get the vector size of the model by embedding a test input.
+
+        Returns:
+            Optional[int]: The vector size of the model, None if the model does not support embeddings.
+        """
+        url = urljoin(base=self.url, url=self.ENDPOINT_TABLE[ENDPOINT__EMBEDDINGS])
+        response = await self.async_client.post(url=url, headers=self.headers, json={"model": self.name, "input": "hello world"})
+        if response.status_code != 200:
+            return None
+
+        return len(response.json()["data"][0]["embedding"])
+
     async def setup_metrics_storage(self) -> None:
         time_to_first_token_ts_key = f"metrics_ts:time_to_first_token:{self.name}:{self.url}"
         try:
@@ -101,7 +248,6 @@ class BaseModelClient(ABC):
                 logger.debug(f"Redis timeseries {time_to_first_token_ts_key} already exists.")
             else:
                 logger.error(f"Creation of redis timeseries {time_to_first_token_ts_key} failed : {e}", exc_info=True)
-                await self.redis.reset()
 
         latency_ts_key = f"metrics_ts:latency:{self.name}:{self.url}"
         try:
@@ -112,13 +258,13 @@ class BaseModelClient(ABC):
             else:
                 logger.error(f"Creation of redis timeseries {latency_ts_key} failed : {e}", exc_info=True)
 
-    def _get_usage(self, json: dict, data: dict | list[dict], stream: bool, request_latency: float = 0.0) -> Optional[Usage]:
+    def _get_usage(self, json: dict, data: dict | StreamUsageAccumulator, stream: bool, request_latency: float = 0.0) -> Optional[Usage]:
         """
         Get usage data from request and response.
 
         Args:
             json(dict): The JSON body of the request.
-            data(dict): The data of the response.
+            data(dict | StreamUsageAccumulator): The data of the response, or the accumulator fed with the chunks of the stream if stream.
             stream(bool): Whether the response is a stream.
 
         Returns:
@@ -132,7 +278,7 @@ class BaseModelClient(ABC):
                 usage = request_context.get().usage
 
                 # compute usage for the current (add a detail object)
-                detail_id = data[0].get("id", generate_request_id()) if stream else data.get("id", generate_request_id())
+                detail_id = (data.id or generate_request_id()) if stream else data.get("id", generate_request_id())
                 detail = Detail(id=detail_id, model=self.name, usage=Usage())
                 detail.usage.prompt_tokens = global_context.tokenizer.get_prompt_tokens(endpoint=self.endpoint, body=json)
 
@@ -186,7 +332,7 @@ class BaseModelClient(ABC):
 
         return usage
 
-    def _get_additional_data(self, json: dict, data: dict | list[dict], stream: bool, request_latency: float = 0.0) -> dict:
+    def _get_additional_data(self, json: dict, data: dict | StreamUsageAccumulator, stream: bool, request_latency: float = 0.0) -> dict:
         """
         Get additional data from request and response.
         """
@@ -218,6 +364,8 @@ class BaseModelClient(ABC):
         url = urljoin(base=self.url, url=self.ENDPOINT_TABLE[self.endpoint])
         if json and "model" in json:
             json["model"] = self.name
+        if data and "model" in data:
+            data["model"] = self.name
 
         return url, json, files, data
 
@@ -231,6 +379,8 @@ class BaseModelClient(ABC):
         """
         Format a response from a client model and add usage data and model ID to the response. This method can be overridden by a subclass to add additional headers or parameters.
 
+        The body is decoded and encoded once, the content of the returned response is ready to be sent as is to the user.
+
         Args:
             json(dict): The JSON body of the request to the API.
             response(httpx.Response): The response from the API.
@@ -245,28 +395,15 @@ class BaseModelClient(ABC):
 
         content_type = response.headers.get("Content-Type", "")
         if content_type == "application/json":
-            data = response.json()
+            data = orjson.loads(response.content)
             data.update(self._get_additional_data(json=json, data=data, stream=False, request_latency=request_latency))
             data.update(additional_data)
-            response = httpx.Response(status_code=response.status_code, content=dumps(data))
+            response = httpx.Response(status_code=response.status_code, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
 
         return response
 
-    async def _log_performance_metric(self, metric: Metric) -> None:
-        time_to_first_token_ts_key = f"metrics_ts:time_to_first_token:{metric.model_name}:{metric.provider_url}"
-        try:
-            if metric.time_to_first_token_us is not None:
-                await self.redis.timeseries.add(key=time_to_first_token_ts_key, value=metric.time_to_first_token_us, timestamp=metric.timestamp)
-        except Exception as e:
-            logger.error(f"Failed to log request metrics in redis ts {time_to_first_token_ts_key}: {e}", exc_info=True)
-            await self.redis.reset()
-
-        latency_ts_key = f"metrics_ts:latency:{metric.model_name}:{metric.provider_url}"
-        try:
-            if metric.latency_ms is not None:
-                await self.redis.timeseries.add(key=latency_ts_key, value=metric.latency_ms, timestamp=metric.timestamp)
-        except Exception as e:
-            logger.error(f"Failed to log request metrics in redis ts {latency_ts_key}: {e}", exc_info=True)
+    def _log_performance_metric(self, metric: Metric) -> None:
+        self.metrics_buffer.add(metric=metric)
 
     async def forward_request(
         self,
@@ -294,42 +431,51 @@ class BaseModelClient(ABC):
         if not additional_data:
             additional_data = {}
 
-        async with httpx.AsyncClient(timeout=self.timeout) as async_client:
-            try:
-                start_time = time.perf_counter()
-                response = await async_client.request(method=method, url=url, headers=self.headers, json=json, files=files, data=data)
-                end_time = time.perf_counter()
-            except (httpx.TimeoutException, httpx.ReadTimeout, httpx.ConnectTimeout, httpx.WriteTimeout, httpx.PoolTimeout) as e:
-                raise HTTPException(status_code=504, detail="Request timed out, model is too busy.")
-            except Exception as e:
-                logger.exception(msg=f"Failed to forward request to {self.name}: {e}.")
-                raise HTTPException(status_code=500, detail=type(e).__name__)
+        self.inflight_requests += 1
+        try:
+            start_time = time.perf_counter()
+            response = await self.async_client.request(method=method, url=url, headers=self.headers, json=json, files=files, data=data)
+            end_time = time.perf_counter()
+        except (httpx.TimeoutException, httpx.ReadTimeout, httpx.ConnectTimeout, httpx.WriteTimeout, httpx.PoolTimeout) as e:
+            self.circuit_breaker.record_failure()
+            raise HTTPException(status_code=504, detail="Request timed out, model is too busy.")
+        except Exception as e:
+            self.circuit_breaker.record_failure()
+            logger.exception(msg=f"Failed to forward request to {self.name}: {e}.")
+            raise HTTPException(status_code=500, detail=type(e).__name__)
+        finally:
+            self.inflight_requests -= 1
+
+        # client errors are not counted as failures of the model provider
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError:
             try:
-                response.raise_for_status()
-            except httpx.HTTPStatusError:
-                try:
-                    message = loads(response.text)  # format error message
-                    if "message" in message:
-                        try:
-                            message = ast.literal_eval(message["message"])
-                        except Exception:
-                            message = message["message"]
-                except JSONDecodeError:
-                    logger.debug(traceback.format_exc())
-                    message = response.text
-                raise HTTPException(status_code=response.status_code, detail=message)
+                message = loads(response.text)  # format error message
+                if "message" in message:
+                    try:
+                        message = ast.literal_eval(message["message"])
+                    except Exception:
+                        message = message["message"]
+            except JSONDecodeError:
+                logger.debug(traceback.format_exc())
+                message = response.text
+            raise HTTPException(status_code=response.status_code, detail=message)
 
         # add additional data to the response
         request_latency = end_time - start_time
         response = self._format_response(json=json, response=response, additional_data=additional_data, request_latency=request_latency)
-        asyncio.create_task(
-            self._log_performance_metric(
-                metric=Metric(
-                    timestamp=datetime.now(),
-                    model_name=self.name,
-                    provider_url=self.url,
-                    latency_ms=int(request_latency * 1_000),
-                )
+        self._log_performance_metric(
+            metric=Metric(
+                timestamp=datetime.now(),
+                model_name=self.name,
+                provider_url=self.url,
+                latency_ms=int(request_latency * 1_000),
             )
         )
 
@@ -338,49 +484,34 @@ class BaseModelClient(ABC):
     def _format_stream_response(
         self,
         json: dict,
-        response: list,
+        response: StreamUsageAccumulator,
         additional_data: Dict[str, Any] = None,
         request_latency: float = 0.0,
-    ) -> tuple | None:
+    ) -> Optional[dict]:
         """
-        Format streaming response data for chat completions.
+        Format the extra chunk added at the end of a streaming response of chat completions, with usage data and model ID.
 
         Args:
-            json(dict):
-            response (list): List of response chunks (buffer).
-            additional_data (Dict[str, Any]): Additional data to include in the response.
+            json(dict): The JSON body of the request to the API.
+            response(StreamUsageAccumulator): The accumulator fed with the chunks of the stream.
+            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
+            request_latency(float): The latency of the request.
 
         Returns:
-            tuple: (data, extra) where data is the processed raw data and extra is the formatted response.
+            Optional[dict]: The extra chunk, None if no chunk has been received.
         """
 
         if additional_data is None:
             additional_data = {}
 
-        content, chunks = None, list()
-        for lines in response:
-            lines = lines.decode(encoding="utf-8").split(sep="\n\n")
-            for line in lines:
-                line = line.strip()
-                if not line.startswith("data: "):
-                    continue
-                line = line.removeprefix("data: ")
-                if not line:
-                    continue
-                try:
-                    content = loads(line)
-                    chunks.append(content)
-                except JSONDecodeError as e:
-                    logger.debug(f"Failed to decode JSON from streaming response ({e}) on the following chunk: {line}.")
-
         # error case
-        if content is None:
+        if response.last_chunk is None:
             return None
 
         # normal case
-        extra_chunk = content  # based on last chunk to conserve the chunk structure
+        extra_chunk = response.last_chunk  # based on last chunk to conserve the chunk structure
         extra_chunk.update({"choices": []})
-        extra_chunk.update(self._get_additional_data(json=json, data=chunks, stream=True, request_latency=request_latency))
+        extra_chunk.update(self._get_additional_data(json=json, data=response, stream=True, request_latency=request_latency))
         extra_chunk.update(additional_data)
 
         return extra_chunk
@@ -396,6 +527,9 @@ class BaseModelClient(ABC):
         """
         Forward a stream request to a client model and add model name to the response. Optionally, add additional data to the response.
 
+        Server-sent events are framed once by an incremental parser, whatever the network chunking. Completion tokens are counted as the
+        chunks arrive, so the stream is never buffered.
+
         Args:
             method(str): The method to use for the request.
             json(Optional[dict]): The JSON body to use for the request.
@@ -409,87 +543,102 @@ class BaseModelClient(ABC):
 
         url, json, files, data = self._format_request(json=json, files=files, data=data)
 
-        async with httpx.AsyncClient(timeout=self.timeout) as async_client:
-            try:
-                async with async_client.stream(method=method, url=url, headers=self.headers, json=json, files=files, data=data) as response:
-                    buffer = list()
-                    start_time = time.perf_counter()
-                    first_token_time = None
-                    async for chunk in response.aiter_raw():
-                        # error case
-                        if response.status_code // 100 != 2:
-                            chunks = loads(chunk.decode(encoding="utf-8"))
-                            if "message" in chunks:
-                                try:
-                                    chunks["message"] = ast.literal_eval(chunks["message"])
-                                except Exception:
-                                    pass
-                            chunk = dumps(chunks).encode(encoding="utf-8")
-                            yield chunk, response.status_code
-                        # normal case
-                        else:
-                            match = re.search(rb"data: \[DONE\]", chunk)
-                            if not match:
-                                buffer.append(chunk)
-                                if first_token_time is None:
-                                    try:
-                                        # The first token comes in the first non-empty chunk of the stream
-                                        if loads((chunk.decode(encoding="utf-8")).removeprefix("data: "))["choices"][0]["delta"]["content"] != "":
-                                            first_token_time = time.perf_counter()
-                                    except Exception as e:
-                                        logger.debug("Chunk data could not be processed to compute time to first token")
-
-                                yield chunk, response.status_code
-
-                            # end of the stream
+        # the request is in-flight until the end of the stream, including client disconnection (the generator is closed) and errors
+        self.inflight_requests += 1
+        start_time, accumulator, completed = time.perf_counter(), None, False
+        try:
+            async with self.async_client.stream(method=method, url=url, headers=self.headers, json=json, files=files, data=data) as response:
+                if response.status_code >= 500:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+
+                # error case
+                if response.status_code // 100 != 2:
+                    content = await response.aread()
+                    try:
+                        content = loads(content)
+                        if "message" in content:
+                            try:
+                                content["message"] = ast.literal_eval(content["message"])
+                            except Exception:
+                                pass
+                        content = dumps(content).encode(encoding="utf-8")
+                    except JSONDecodeError:
+                        logger.debug(traceback.format_exc())
+                    yield content, response.status_code
+                    return
+
+                # normal case
+                parser = ServerSentEventsParser()
+                first_token_time, accumulator = None, global_context.tokenizer.get_stream_accumulator()
+                async for chunk in response.aiter_raw():
+                    events = list()
+                    for event in parser.feed(chunk=chunk):
+                        event_data = parser.get_data(event=event)
+
+                        # end of the stream
+                        if event_data == b"[DONE]":
+                            completed = True
+                            end_time = time.perf_counter()
+                            request_latency = end_time - start_time
+                            if first_token_time is not None:
+                                request_time_to_first_token = first_token_time - start_time
                             else:
-                                last_chunks = chunk[: match.start()]
-                                done_chunk = chunk[match.start() :]
-
-                                # Edge case: the stream consists in just one group of chunks
-                                if first_token_time is None and last_chunks != "" and len(buffer) == 0:
+                                logger.warning(f"Time to first token could not be determined for request {request_context.get().id}.")
+
+                            extra_chunk = self._format_stream_response(
+                                json=json,
+                                response=accumulator,
+                                additional_data=additional_data,
+                                request_latency=request_latency,
+                            )
+                            self._log_performance_metric(
+                                metric=Metric(
+                                    timestamp=datetime.now(),
+                                    time_to_first_token_us=int(request_time_to_first_token * 1_000_000) if first_token_time is not None else None,
+                                    latency_ms=int(request_latency * 1_000),
+                                    model_name=self.name,
+                                    provider_url=self.url,
+                                )
+                            )
+
+                            # if error case, only yield the done event
+                            if extra_chunk is not None:
+                                events.append(f"data: {dumps(extra_chunk)}\n\n".encode())
+                            events.append(event)
+                            continue
+
+                        if event_data:
+                            try:
+                                content = loads(event_data)
+                            except JSONDecodeError as e:
+                                logger.debug(f"Failed to decode JSON from streaming response ({e}) on the following event: {event_data}.")
+                            else:
+                                # the first token comes in the first non-empty delta of the stream
+                                if accumulator.add(chunk=content) and first_token_time is None:
                                     first_token_time = time.perf_counter()
 
-                                buffer.append(last_chunks)
+                        events.append(event)
 
-                                end_time = time.perf_counter()
-                                request_latency = end_time - start_time
-                                if first_token_time is not None:
-                                    request_time_to_first_token = first_token_time - start_time
-                                else:
-                                    logger.warning(f"Time to first token could not be determined for request {request_context.get().id}.")
+                    if events:
+                        yield b"".join(events), response.status_code
 
-                                extra_chunk = self._format_stream_response(
-                                    json=json,
-                                    response=buffer,
-                                    additional_data=additional_data,
-                                    request_latency=request_latency,
-                                )
-                                asyncio.create_task(
-                                    self._log_performance_metric(
-                                        Metric(
-                                            timestamp=datetime.now(),
-                                            time_to_first_token_us=int(request_time_to_first_token * 1_000_000)
-                                            if first_token_time is not None
-                                            else None,
-                                            latency_ms=int(request_latency * 1_000),
-                                            model_name=self.name,
-                                            provider_url=self.url,
-                                        )
-                                    )
-                                )
+                # incomplete event at the end of the stream
+                event = parser.flush()
+                if event:
+                    yield event, response.status_code
 
-                                # if error case, yield chunk
-                                if extra_chunk is None:
-                                    yield chunk, response.status_code
-                                    continue
-
-                                yield last_chunks, response.status_code
-                                yield f"data: {dumps(extra_chunk)}\n\n".encode(), response.status_code
-                                yield done_chunk, response.status_code
-
-            except (httpx.TimeoutException, httpx.ReadTimeout, httpx.ConnectTimeout, httpx.WriteTimeout, httpx.PoolTimeout) as e:
-                yield dumps({"detail": "Request timed out, model is too busy."}).encode(), 504
-            except Exception as e:
-                logger.error(traceback.format_exc())
-                yield dumps({"detail": type(e).__name__}).encode(), 500
+        except (httpx.TimeoutException, httpx.ReadTimeout, httpx.ConnectTimeout, httpx.WriteTimeout, httpx.PoolTimeout) as e:
+            self.circuit_breaker.record_failure()
+            yield dumps({"detail": "Request timed out, model is too busy."}).encode(), 504
+        except Exception as e:
+            self.circuit_breaker.record_failure()
+            logger.error(traceback.format_exc())
+            yield dumps({"detail": type(e).__name__}).encode(), 500
+        finally:
+            self.inflight_requests -= 1
+
+            # stream interrupted (client disconnection), the usage is computed for the tokens produced so far
+            if not completed and accumulator is not None and accumulator.last_chunk is not None:
+                self._get_usage(json=json, data=accumulator, stream=True, request_latency=time.perf_counter() - start_time)
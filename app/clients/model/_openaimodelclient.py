@@ -1,7 +1,6 @@
 from urllib.parse import urljoin
 
 from coredis import ConnectionPool
-import requests
 
 from app.utils.variables import (
     ENDPOINT__AUDIO_TRANSCRIPTIONS,
@@ -44,7 +43,7 @@ class OpenaiModelClient(BaseModelClient):
         **kwargs,
     ) -> None:
         """
-        Initialize the OpenAI model client and check if the model is available.
+        Initialize the OpenAI model client.
         """
         super().__init__(
             model_name=model_name,
@@ -53,8 +52,8 @@ class OpenaiModelClient(BaseModelClient):
             model_carbon_footprint_active_params=model_carbon_footprint_active_params,
             model_cost_prompt_tokens=model_cost_prompt_tokens,
             model_cost_completion_tokens=model_cost_completion_tokens,
-            api_url=url,
-            api_key=key,
+            url=url,
+            key=key,
             timeout=timeout,
             redis=redis,
             metrics_retention_ms=metrics_retention_ms,
@@ -62,10 +61,13 @@ class OpenaiModelClient(BaseModelClient):
             **kwargs,
         )
 
-        # check if model is available
+    async def load(self) -> None:
+        """
+        Check if the model is available and set the attributes of the model.
+        """
         url = urljoin(base=str(self.url), url=self.ENDPOINT_TABLE[ENDPOINT__MODELS])
 
-        response = requests.get(url=url, headers=self.headers, timeout=self.timeout)
+        response = await self.async_client.get(url=url, headers=self.headers)
         assert response.status_code == 200, f"Failed to get models list ({response.status_code})."
 
         response = response.json()["data"]
@@ -77,13 +79,4 @@ class OpenaiModelClient(BaseModelClient):
         self.max_context_length = response.get("max_context_length")
 
         # set vector size
-        response = requests.post(
-            url=urljoin(base=self.url, url=self.ENDPOINT_TABLE[ENDPOINT__EMBEDDINGS]),
-            headers=self.headers,
-            json={"model": self.name, "input": "hello world"},
-            timeout=self.timeout,
-        )
-        if response.status_code == 200:
-            self.vector_size = len(response.json()["data"][0]["embedding"])
-        else:
-            self.vector_size = None
+        self.vector_size = await self._get_vector_size()
@@ -1,10 +1,9 @@
-from json import dumps
 from typing import Any, Dict, Optional, Tuple
 from urllib.parse import urljoin
 
 from coredis import ConnectionPool
 import httpx
-import requests
+import orjson
 
 from app.utils.variables import (
     ENDPOINT__AUDIO_TRANSCRIPTIONS,
@@ -47,7 +46,7 @@ class TeiModelClient(BaseModelClient):
         **kwargs,
     ) -> None:
         """
-        Initialize the TEI model client and check if the model is available.
+        Initialize the TEI model client.
         """
         super().__init__(
             url=url,
@@ -65,10 +64,13 @@ class TeiModelClient(BaseModelClient):
             **kwargs,
         )
 
-        # check if model is available
+    async def load(self) -> None:
+        """
+        Check if the model is available and set the attributes of the model.
+        """
         url = urljoin(base=str(self.url), url=self.ENDPOINT_TABLE[ENDPOINT__MODELS])
 
-        response = requests.get(url=url, headers=self.headers, timeout=self.timeout)
+        response = await self.async_client.get(url=url, headers=self.headers)
         assert response.status_code == 200, f"Failed to get models list ({response.status_code})."
 
         response = response.json()
@@ -78,16 +80,7 @@ class TeiModelClient(BaseModelClient):
         self.max_context_length = response.get("max_input_length")
 
         # set vector size
-        response = requests.post(
-            url=urljoin(base=self.url, url=self.ENDPOINT_TABLE[ENDPOINT__EMBEDDINGS]),
-            headers=self.headers,
-            json={"model": self.name, "input": "hello world"},
-            timeout=self.timeout,
-        )
-        if response.status_code == 200:
-            self.vector_size = len(response.json()["data"][0]["embedding"])
-        else:
-            self.vector_size = None
+        self.vector_size = await self._get_vector_size()
 
     def _format_request(
         self, json: Optional[dict] = None, files: Optional[dict] = None, data: Optional[dict] = None
@@ -137,11 +130,11 @@ class TeiModelClient(BaseModelClient):
 
         content_type = response.headers.get("Content-Type", "")
         if content_type == "application/json":
-            data = response.json()
-            if isinstance(data, list):  # for TEI reranking
-                data = {"data": data}
+            data = orjson.loads(response.content)
+            if isinstance(data, list):  # for TEI reranking, the response is formatted as the rerank schema since it is not validated by the endpoint
+                data = {"object": "list", "data": [{"object": "rerank", "score": rank["score"], "index": rank["index"]} for rank in data]}
             data.update(self._get_additional_data(json=json, data=data, stream=False, request_latency=request_latency))
             data.update(additional_data)
-            response = httpx.Response(status_code=response.status_code, content=dumps(data))
+            response = httpx.Response(status_code=response.status_code, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
 
         return response
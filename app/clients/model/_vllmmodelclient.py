@@ -1,7 +1,6 @@
 from urllib.parse import urljoin
 
 from coredis import ConnectionPool
-import requests
 
 from app.utils.variables import (
     ENDPOINT__AUDIO_TRANSCRIPTIONS,
@@ -44,7 +43,7 @@ class VllmModelClient(BaseModelClient):
         **kwargs,
     ) -> None:
         """
-        Initialize the vLLM model client and check if the model is available.
+        Initialize the vLLM model client.
         """
         super().__init__(
             url=url,
@@ -62,9 +61,13 @@ class VllmModelClient(BaseModelClient):
             **kwargs,
         )
 
-        # check if model is available
+    async def load(self) -> None:
+        """
+        Check if the model is available and set the attributes of the model.
+        """
         url = urljoin(base=str(self.url), url=self.ENDPOINT_TABLE[ENDPOINT__MODELS])
-        response = requests.get(url=url, headers=self.headers, timeout=self.timeout)
+
+        response = await self.async_client.get(url=url, headers=self.headers)
         assert response.status_code == 200, f"Failed to get models list ({response.status_code})."
 
         response = response.json()["data"]
@@ -1,5 +1,6 @@
 from io import BytesIO
 import json
+import logging
 from typing import Dict, Optional
 
 from fastapi import HTTPException
@@ -11,6 +12,8 @@ from app.schemas.parse import ParsedDocument
 
 from ._baseparserclient import BaseParserClient
 
+logger = logging.getLogger(__name__)
+
 
 class AlbertParserClient(BaseParserClient):
     """
@@ -26,12 +29,15 @@ class AlbertParserClient(BaseParserClient):
         self.headers = headers
         self.timeout = timeout
 
-        # Keep health check synchronous in __init__
+    async def check(self) -> bool:
         try:
-            response = httpx.get(f"{self.URL}/health", headers=self.headers, timeout=self.timeout)
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.get(f"{self.url}/health", headers=self.headers)
             assert response.status_code == 200, f"Albert API is not reachable: {response.text} {response.status_code}"
+            return True
         except Exception as e:
-            raise Exception(f"Albert API is not reachable: {e}") from e
+            logger.error(f"Albert API is not reachable: {e}")
+            return False
 
     async def parse(self, params: ParserParams) -> ParsedDocument:
         file_content = await params.file.read()
@@ -42,6 +42,10 @@ class BaseParserClient(ABC):
 
         return pages
 
+    @abstractmethod
+    async def check(self) -> bool:
+        """Check the health of the parser API."""
+
     @abstractmethod
     def parse(self, params: ParserParams) -> ParsedDocument:
         pass
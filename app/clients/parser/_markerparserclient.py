@@ -1,5 +1,6 @@
 from io import BytesIO
 import json
+import logging
 from typing import Dict, List
 
 from fastapi import HTTPException
@@ -11,6 +12,8 @@ from app.schemas.parse import ParsedDocument, ParsedDocumentMetadata, ParsedDocu
 
 from ._baseparserclient import BaseParserClient
 
+logger = logging.getLogger(__name__)
+
 
 class MarkerParserClient(BaseParserClient):
     """
@@ -24,12 +27,15 @@ class MarkerParserClient(BaseParserClient):
         self.headers = headers
         self.timeout = timeout
 
-        # Keep health check synchronous in __init__
+    async def check(self) -> bool:
         try:
-            response = httpx.get(f"{self.url}/health", headers=self.headers, timeout=self.timeout)
-            assert response.status_code == 200, "Marker API is not reachable."
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.get(f"{self.url}/health", headers=self.headers)
+            assert response.status_code == 200, f"Marker API is not reachable: {response.text} {response.status_code}"
+            return True
         except Exception as e:
-            raise Exception(f"Marker API is not reachable: {e}") from e
+            logger.error(f"Marker API is not reachable: {e}")
+            return False
 
     def convert_page_range(self, page_range: str, page_count: int) -> List[int]:
         if page_range == "":
@@ -1,7 +1,7 @@
 from typing import List, Literal, Union
 
 from fastapi import APIRouter, File, Request, Security, UploadFile
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 
 from app.helpers._accesscontroller import AccessController
 from app.schemas.audio import (
@@ -14,8 +14,9 @@ from app.schemas.audio import (
     AudioTranscriptionTemperatureForm,
     AudioTranscriptionTimestampGranularitiesForm,
 )
+from app.utils.configuration import configuration
 from app.utils.context import global_context
-from app.utils.variables import ENDPOINT__AUDIO_TRANSCRIPTIONS
+from app.utils.variables import ENDPOINT__AUDIO_TRANSCRIPTIONS, ROUTER__AUDIO
 
 router = APIRouter()
 
@@ -30,7 +31,7 @@ async def audio_transcriptions(
     response_format: Literal["json", "text"] = AudioTranscriptionResponseFormatForm,
     temperature: float = AudioTranscriptionTemperatureForm,
     timestamp_granularities: List[str] = AudioTranscriptionTimestampGranularitiesForm,
-) -> JSONResponse | PlainTextResponse:
+) -> Response:
     """
     Transcribes audio into the input language.
     """
@@ -41,9 +42,8 @@ async def audio_transcriptions(
 
     file_content = await file.read()
     model = global_context.model_registry(model=model)
-    client = model.get_client(endpoint=ENDPOINT__AUDIO_TRANSCRIPTIONS)
     payload = {
-        "model": client.name,
+        "model": model.name,
         "response_format": response_format,
         "temperature": temperature,
         "timestamp_granularities": timestamp_granularities,
@@ -51,9 +51,14 @@ async def audio_transcriptions(
     if language != "":
         payload["language"] = language.value
 
-    response = await client.forward_request(method="POST", files={"file": (file.filename, file_content, file.content_type)}, data=payload)
+    response = await model.forward_request(
+        endpoint=ENDPOINT__AUDIO_TRANSCRIPTIONS, method="POST", files={"file": (file.filename, file_content, file.content_type)}, data=payload
+    )
 
     if response_format == "text":
         return PlainTextResponse(content=response.text)
 
-    return JSONResponse(content=AudioTranscription(**response.json()).model_dump(), status_code=response.status_code)
+    if ROUTER__AUDIO in configuration.settings.validated_routers:
+        return JSONResponse(content=AudioTranscription(**response.json()).model_dump(), status_code=response.status_code)
+
+    return Response(content=response.content, status_code=response.status_code, media_type="application/json")
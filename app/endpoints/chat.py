@@ -1,7 +1,7 @@
 from typing import List, Tuple, Union
 
 from fastapi import APIRouter, Request, Security, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.helpers._accesscontroller import AccessController
@@ -10,15 +10,16 @@ from app.helpers._streamingresponsewithstatuscode import StreamingResponseWithSt
 from app.schemas.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionRequest
 from app.schemas.search import Search, SearchMethod
 from app.sql.session import get_db_session
+from app.utils.configuration import configuration
 from app.utils.context import global_context, request_context
 from app.utils.exceptions import CollectionNotFoundException
-from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS, ROUTER__CHAT
 
 router = APIRouter()
 
 
 @router.post(path=ENDPOINT__CHAT_COMPLETIONS, dependencies=[Security(dependency=AccessController())], status_code=200, response_model=Union[ChatCompletion, ChatCompletionChunk])  # fmt: off
-async def chat_completions(request: Request, body: ChatCompletionRequest, session: AsyncSession = Depends(get_db_session)) -> Union[JSONResponse, StreamingResponseWithStatusCode]:  # fmt: off
+async def chat_completions(request: Request, body: ChatCompletionRequest, session: AsyncSession = Depends(get_db_session)) -> Union[Response, StreamingResponseWithStatusCode]:  # fmt: off
     """Creates a model response for the given chat conversation.
 
     **Important**: any others parameters are authorized, depending on the model backend. For example, if model is support by vLLM backend, additional
@@ -67,17 +68,19 @@ async def chat_completions(request: Request, body: ChatCompletionRequest, sessio
     body, results = await retrieval_augmentation_generation(initial_body=body, inner_session=session)
     additional_data = {"search_results": results} if results else {}
 
-    # select client
+    # select model, the provider is selected by the model router (with failover on another provider if the provider fails)
     model = global_context.model_registry(model=body["model"])
-    client = model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
 
     # not stream case
     if not body["stream"]:
-        response = await client.forward_request(method="POST", json=body, additional_data=additional_data)
-        return JSONResponse(content=response.json(), status_code=response.status_code)
+        response = await model.forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json=body, additional_data=additional_data)
+        if ROUTER__CHAT in configuration.settings.validated_routers:
+            return JSONResponse(content=ChatCompletion(**response.json()).model_dump(), status_code=response.status_code)
+
+        return Response(content=response.content, status_code=response.status_code, media_type="application/json")
 
     # stream case
     return StreamingResponseWithStatusCode(
-        content=client.forward_stream(method="POST", json=body, additional_data=additional_data),
+        content=model.forward_stream(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json=body, additional_data=additional_data),
         media_type="text/event-stream",
     )
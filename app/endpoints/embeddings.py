@@ -1,22 +1,25 @@
 from fastapi import APIRouter, Request, Security
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
 from app.helpers._accesscontroller import AccessController
 from app.schemas.embeddings import Embeddings, EmbeddingsRequest
+from app.utils.configuration import configuration
 from app.utils.context import global_context
-from app.utils.variables import ENDPOINT__EMBEDDINGS
+from app.utils.variables import ENDPOINT__EMBEDDINGS, ROUTER__EMBEDDINGS
 
 router = APIRouter()
 
 
 @router.post(path=ENDPOINT__EMBEDDINGS, dependencies=[Security(dependency=AccessController())], status_code=200, response_model=Embeddings)
-async def embeddings(request: Request, body: EmbeddingsRequest) -> JSONResponse:
+async def embeddings(request: Request, body: EmbeddingsRequest) -> Response:
     """
     Creates an embedding vector representing the input text.
     """
 
     model = global_context.model_registry(model=body.model)
-    client = model.get_client(endpoint=ENDPOINT__EMBEDDINGS)
-    response = await client.forward_request(method="POST", json=body.model_dump())
+    response = await model.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json=body.model_dump())
 
-    return JSONResponse(content=Embeddings(**response.json()).model_dump(), status_code=response.status_code)
+    if ROUTER__EMBEDDINGS in configuration.settings.validated_routers:
+        return JSONResponse(content=Embeddings(**response.json()).model_dump(), status_code=response.status_code)
+
+    return Response(content=response.content, status_code=response.status_code, media_type="application/json")
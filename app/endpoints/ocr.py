@@ -28,9 +28,8 @@ async def ocr(request: Request, file: UploadFile = FileForm, model: str = ModelF
     if file.size > FileSizeLimitExceededException.MAX_CONTENT_SIZE:
         raise FileSizeLimitExceededException()
 
-    # get model client
+    # get model
     model = global_context.model_registry(model=model)
-    client = model.get_client(endpoint=ENDPOINT__OCR)
 
     file_content = await file.read()  # open document
     pdf = pymupdf.open(stream=file_content, filetype="pdf")
@@ -42,7 +41,7 @@ async def ocr(request: Request, file: UploadFile = FileForm, model: str = ModelF
 
         # forward request
         payload = {
-            "model": model,
+            "model": model.name,
             "messages": [
                 {
                     "role": "user",
@@ -55,7 +54,7 @@ async def ocr(request: Request, file: UploadFile = FileForm, model: str = ModelF
             "n": 1,
             "stream": False,
         }
-        response = await client.forward_request(method="POST", json=payload)  # error are automatically raised
+        response = await model.forward_request(endpoint=ENDPOINT__OCR, method="POST", json=payload)  # error are automatically raised
         response = response.json()
         text = response.get("choices", [{}])[0].get("message", {}).get("content", "")
 
@@ -1,22 +1,25 @@
 from fastapi import APIRouter, Request, Security
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
 from app.helpers._accesscontroller import AccessController
 from app.schemas.rerank import RerankRequest, Reranks
+from app.utils.configuration import configuration
 from app.utils.context import global_context
-from app.utils.variables import ENDPOINT__RERANK
+from app.utils.variables import ENDPOINT__RERANK, ROUTER__RERANK
 
 router = APIRouter()
 
 
 @router.post(path=ENDPOINT__RERANK, dependencies=[Security(dependency=AccessController())], status_code=200, response_model=Reranks)
-async def rerank(request: Request, body: RerankRequest) -> JSONResponse:
+async def rerank(request: Request, body: RerankRequest) -> Response:
     """
     Creates an ordered array with each text assigned a relevance score, based on the query.
     """
 
     model = global_context.model_registry(model=body.model)
-    client = model.get_client(endpoint=ENDPOINT__RERANK)
-    response = await client.forward_request(method="POST", json=body.model_dump())
+    response = await model.forward_request(endpoint=ENDPOINT__RERANK, method="POST", json=body.model_dump())
 
-    return JSONResponse(content=Reranks(**response.json()).model_dump(), status_code=response.status_code)
+    if ROUTER__RERANK in configuration.settings.validated_routers:
+        return JSONResponse(content=Reranks(**response.json()).model_dump(), status_code=response.status_code)
+
+    return Response(content=response.content, status_code=response.status_code, media_type="application/json")
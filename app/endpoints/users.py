@@ -57,6 +57,7 @@ async def delete_user(
     Delete a user.
     """
     await global_context.identity_access_manager.delete_user(session=session, user_id=user)
+    await global_context.budget_ledger.set(user_id=user, budget=None)
 
     return Response(status_code=204)
 
@@ -84,6 +85,7 @@ async def update_user(
         budget=body.budget,
         expires_at=body.expires_at,
     )
+    await global_context.budget_ledger.set(user_id=user, budget=body.budget)
 
     return Response(status_code=204)
 
@@ -101,6 +103,7 @@ async def get_current_user(request: Request, session: AsyncSession = Depends(get
     """
 
     users = await global_context.identity_access_manager.get_users(session=session, user_id=request_context.get().user_id)
+    await global_context.budget_ledger.refresh(users=users)
 
     return JSONResponse(content=users[0].model_dump(), status_code=200)
 
@@ -119,6 +122,7 @@ async def get_user(
     """
 
     users = await global_context.identity_access_manager.get_users(session=session, user_id=user)
+    await global_context.budget_ledger.refresh(users=users)
 
     return JSONResponse(content=users[0].model_dump(), status_code=200)
 
@@ -145,5 +149,6 @@ async def get_users(
     data = await global_context.identity_access_manager.get_users(
         session=session, role_id=role, offset=offset, limit=limit, order_by=order_by, order_direction=order_direction
     )
+    await global_context.budget_ledger.refresh(users=data)
 
     return JSONResponse(content=Users(data=data).model_dump(), status_code=200)
@@ -1,4 +1,3 @@
-import json
 import logging
 import time
 from typing import Annotated, Dict, List, Optional
@@ -10,7 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.auth import Limit, LimitType, PermissionType, Role, User
 from app.schemas.collections import CollectionVisibility
 from app.schemas.core.auth import UserModelLimits
-from app.utils.context import global_context, request_context
+from app.utils.context import get_request_body, global_context, request_context
 from app.sql.session import get_db_session
 from app.utils.exceptions import (
     InsufficientBudgetException,
@@ -72,6 +71,7 @@ class AccessController:
         context = request_context.get()
         context.user_id = user.id
         context.role_id = role.id
+        context.role_name = role.name
         context.token_id = token_id
 
         if request.url.path.endswith(ENDPOINT__AUDIO_TRANSCRIPTIONS) and request.method == "POST":
@@ -226,12 +226,12 @@ class AccessController:
         if model.cost_prompt_tokens == 0 and model.cost_completion_tokens == 0:  # free model
             return
 
-        if user.budget == 0:
+        # the balance is read from the budget ledger, the budget stored in postgres may not include the cost of the last requests
+        if await global_context.budget_ledger.get(user_id=user.id, budget=user.budget) == 0:
             raise InsufficientBudgetException(detail="Insufficient budget.")
 
     async def _check_audio_transcription_post(self, user: User, role: Role, limits: Dict[str, UserModelLimits], request: Request) -> None:
-        form = await request.form()
-        form = {key: value for key, value in form.items()} if form else {}
+        form = await self._safely_parse_body(request)
 
         await self._check_request_limits(request=request, user=user, limits=limits, model=form.get("model"))
         await self._check_budget(user=user, model=form.get("model"))
@@ -279,8 +279,7 @@ class AccessController:
         await self._check_budget(user=user, model=global_context.document_manager.vector_store_model.name)
 
     async def _check_ocr_post(self, user: User, role: Role, limits: Dict[str, UserModelLimits], request: Request) -> None:
-        form = await request.form()
-        form = {key: value for key, value in form.items()} if form else {}
+        form = await self._safely_parse_body(request)
 
         await self._check_request_limits(request=request, user=user, limits=limits, model=form.get("model"))
 
@@ -327,46 +326,11 @@ class AccessController:
             raise InsufficientPermissionException("Missing permission to create token for another user.")
 
     async def _safely_parse_body(self, request: Request) -> Dict:
-        """Safely parse request body as JSON or form data, handling encoding errors."""
-        try:
-            # Check content type to determine parsing strategy
-            content_type = request.headers.get("content-type", "").lower()
-
-            if content_type.startswith("multipart/form-data") or content_type.startswith("application/x-www-form-urlencoded"):
-                # Handle multipart forms and URL-encoded forms
-                try:
-                    form_data = await request.form()
-                    # Convert form data to dictionary, handling file uploads
-                    result = {}
-                    for key, value in form_data.items():
-                        if hasattr(value, "filename"):  # File upload
-                            # For file uploads, store filename and content type info
-                            result[key] = {
-                                "filename": value.filename,
-                                "content_type": value.content_type,
-                                "size": value.size if hasattr(value, "size") else None,
-                            }
-                        else:
-                            # Regular form field
-                            result[key] = value
-                    return result
-                except Exception:
-                    logger.warning("Failed to parse multipart/form-data or application/x-www-form-urlencoded body.", exc_info=True)
-                    return {}
-            else:
-                # Handle JSON content
-                body = await request.body()
-                if not body:
-                    return {}
-
-                # Try to decode as UTF-8 first
-                try:
-                    body_str = body.decode("utf-8")
-                except UnicodeDecodeError:
-                    # If UTF-8 fails, try with error handling to replace invalid characters
-                    body_str = body.decode("utf-8", errors="replace")
-
-                return json.loads(body_str)
-        except (json.JSONDecodeError, AttributeError, ValueError):
-            logger.warning("Failed to parse request body as JSON or form data.", exc_info=True)
-            return {}
+        """Safely parse request body as JSON or form data, the body is parsed once for the request and shared with the hooks."""
+        body = await get_request_body(request=request)
+
+        # for file uploads, only the filename and content type info are returned
+        if any(hasattr(value, "filename") for value in body.values()):
+            body = {key: {"filename": value.filename, "content_type": value.content_type, "size": getattr(value, "size", None)} if hasattr(value, "filename") else value for key, value in body.items()}  # fmt: off
+
+        return body
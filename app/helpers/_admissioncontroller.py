@@ -0,0 +1,154 @@
+import asyncio
+import bisect
+from collections import defaultdict
+import itertools
+import math
+import time
+from typing import Callable, Dict, List
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.clients.model import BaseModelClient as ModelClient
+from app.utils.exceptions import ModelOverloadedException
+
+model_queue_depth = Gauge(name="model_queue_depth", documentation="Number of requests waiting for a provider of the model.", labelnames=["model"])  # fmt: off
+model_queue_wait_seconds = Histogram(name="model_queue_wait_seconds", documentation="Time waited by the requests for a provider of the model.", labelnames=["model"])  # fmt: off
+model_queue_rejected = Counter(name="model_queue_rejected", documentation="Number of requests rejected because the wait queue of the model is full or because they waited too long.", labelnames=["model", "reason"])  # fmt: off
+
+
+class _Waiter:
+    def __init__(self, priority: int, sequence: int, providers: List[ModelClient], choose: Callable[[List[ModelClient]], ModelClient]) -> None:
+        self.priority = priority
+        self.sequence = sequence
+        self.providers = providers
+        self.choose = choose
+        self.future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class AdmissionController:
+    """
+    Admission control of the requests of a model: each provider of the model serves at most `max_concurrent_requests` requests at a time (if defined),
+    the other requests wait in a bounded queue. When a provider finishes a request, its slot is given to the first waiting request that can be served
+    by this provider, by priority (the lower the value, the higher the priority) then by arrival order. Requests are rejected with a 429 error and a
+    `Retry-After` header if the queue is full or if they wait longer than the queue timeout.
+
+    Slots are counted by each worker of the API.
+    """
+
+    def __init__(self, name: str, queue_size: int, queue_timeout: float, priorities: Dict[str, int]) -> None:
+        self.name = name
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.priorities = priorities
+
+        self._running: Dict[ModelClient, int] = defaultdict(int)
+        self._queue: List[_Waiter] = list()
+        self._sequence = itertools.count()
+        self._wait_time = 0.0  # moving average of the wait time of the queued requests, to estimate the Retry-After header
+
+    def get_priority(self, role: str) -> int:
+        """
+        Get the priority of the requests of a role.
+
+        Args:
+            role(str): The name of the role of the user, None for the internal requests.
+
+        Returns:
+            int: The priority of the requests, 0 if the role has no priority.
+        """
+        return self.priorities.get(role, 0)
+
+    async def acquire(self, providers: List[ModelClient], priority: int, choose: Callable[[List[ModelClient]], ModelClient]) -> ModelClient:
+        """
+        Acquire a slot on a provider of the model, waiting in the queue if all the providers are busy.
+
+        Args:
+            providers(List[ModelClient]): The providers that can serve the request.
+            priority(int): The priority of the request.
+            choose(Callable[[List[ModelClient]], ModelClient]): The routing strategy, to choose a provider among those with a free slot.
+
+        Returns:
+            ModelClient: The provider to send the request to, release must be called when the request is finished.
+        """
+        available = [provider for provider in providers if self._is_available(provider=provider)]
+        if available:
+            client = choose(available)
+            self._running[client] += 1
+            return client
+
+        if len(self._queue) >= self.queue_size:
+            model_queue_rejected.labels(model=self.name, reason="full").inc()
+            raise ModelOverloadedException(retry_after=self._get_retry_after())
+
+        waiter = _Waiter(priority=priority, sequence=next(self._sequence), providers=providers, choose=choose)
+        bisect.insort(self._queue, waiter)
+        model_queue_depth.labels(model=self.name).set(len(self._queue))
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait([waiter.future], timeout=self.queue_timeout)
+        except BaseException:
+            # request cancelled while waiting, the slot given in the meantime is released
+            if waiter.future.done():
+                self.release(client=waiter.future.result())
+            else:
+                self._remove(waiter=waiter)
+            raise
+
+        wait_time = time.perf_counter() - start
+        model_queue_wait_seconds.labels(model=self.name).observe(wait_time)
+
+        if not waiter.future.done():
+            self._remove(waiter=waiter)
+            model_queue_rejected.labels(model=self.name, reason="timeout").inc()
+            raise ModelOverloadedException(detail="Model is too busy, request waited too long for a provider.", retry_after=self._get_retry_after())
+
+        self._wait_time = 0.8 * self._wait_time + 0.2 * wait_time
+
+        return waiter.future.result()
+
+    def release(self, client: ModelClient) -> None:
+        """
+        Release the slot of a finished request, the slot is given to the first waiting request that can be served by the provider. If the provider
+        has been ejected by its circuit breaker in the meantime, the first waiting request is admitted on another of its providers with a free slot
+        instead, if any.
+
+        Args:
+            client(ModelClient): The provider returned by acquire.
+        """
+        if client.circuit_breaker.is_available():
+            for i, waiter in enumerate(self._queue):
+                if client in waiter.providers:
+                    self._admit(i=i, client=client)
+                    return
+
+        self._running[client] -= 1
+
+        if self._queue:
+            # providers ejected by their circuit breaker are skipped, unless all the providers of the request are ejected
+            waiter = self._queue[0]
+            providers = [provider for provider in waiter.providers if provider.circuit_breaker.is_available()] or waiter.providers
+            available = [provider for provider in providers if self._is_available(provider=provider)]
+            if available:
+                client = waiter.choose(available)
+                self._running[client] += 1
+                self._admit(i=0, client=client)
+
+    def _admit(self, i: int, client: ModelClient) -> None:
+        waiter = self._queue.pop(i)
+        model_queue_depth.labels(model=self.name).set(len(self._queue))
+        waiter.future.set_result(client)
+
+    def _is_available(self, provider: ModelClient) -> bool:
+        return provider.max_concurrent_requests is None or self._running[provider] < provider.max_concurrent_requests
+
+    def _remove(self, waiter: _Waiter) -> None:
+        self._queue.remove(waiter)
+        waiter.future.cancel()
+        model_queue_depth.labels(model=self.name).set(len(self._queue))
+
+    def _get_retry_after(self) -> int:
+        return max(1, math.ceil(self._wait_time))
@@ -46,8 +46,7 @@ class AgentManager:
 
     async def get_llm_http_response(self, body: AgentsChatCompletionRequest):
         model = self.model_registry(model=body.model)
-        client = model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
-        http_llm_response = await client.forward_request(method="POST", json=body.model_dump())
+        http_llm_response = await model.forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json=body.model_dump())
 
         return http_llm_response
 
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import traceback
+from typing import List, Optional
+
+from coredis import ConnectionPool, Redis
+from sqlalchemy import select, update
+
+from app.schemas.auth import User
+from app.sql.models import User as UserTable
+from app.sql.session import get_db_session
+
+logger = logging.getLogger(__name__)
+
+# balance of the user, initialized with its budget stored in postgres if not in the ledger
+GET_SCRIPT = """
+local balance = redis.call('GET', KEYS[1])
+if not balance then
+    redis.call('SET', KEYS[1], ARGV[1])
+    balance = ARGV[1]
+end
+return balance
+"""
+
+# decrease the balance of the user by the cost of the request, without going below zero, and mark the user to be persisted in postgres
+DEBIT_SCRIPT = """
+local balance = redis.call('GET', KEYS[1])
+if not balance then
+    return false
+end
+balance = string.format('%.6f', math.max(tonumber(balance) - tonumber(ARGV[1]), 0))
+redis.call('SET', KEYS[1], balance)
+redis.call('SADD', KEYS[2], ARGV[2])
+return balance
+"""
+
+
+class BudgetLedger:
+    """
+    Ledger of the budgets of the users in Redis. The balance of a user is read by the access controller and decreased by the cost of each request
+    with atomic scripts, so that concurrent requests of a user never wait on a lock of its row in PostgreSQL. The balance is initialized from the
+    budget stored in PostgreSQL on first use, and the balances of the users with requests are written back in PostgreSQL in batches by a background
+    task, every flush interval.
+    """
+
+    KEY_PREFIX = "budget"
+    DIRTY_KEY = "budget:dirty"  # users whose balance is not yet written in postgres
+
+    def __init__(self, redis: ConnectionPool, flush_interval_ms: int = 5000, batch_size: int = 500) -> None:
+        self.redis = Redis(connection_pool=redis)
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+
+        self._get = self.redis.register_script(GET_SCRIPT)
+        self._debit = self.redis.register_script(DEBIT_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, user_id: int, budget: Optional[float]) -> Optional[float]:
+        """
+        Get the balance of a user.
+
+        Args:
+            user_id(int): The ID of the user.
+            budget(Optional[float]): The budget of the user stored in PostgreSQL, to initialize the balance if not in the ledger.
+
+        Returns:
+            Optional[float]: The balance of the user, None if the user has no budget.
+        """
+        if budget is None:
+            return None
+
+        try:
+            balance = await self._get(keys=[f"{self.KEY_PREFIX}:{user_id}"], args=[budget])
+            return float(balance)
+        except Exception:
+            logger.error(msg=f"Error while reading the budget of user {user_id}.")
+            logger.error(msg=traceback.format_exc())
+
+        return budget
+
+    async def refresh(self, users: List[User]) -> None:
+        """
+        Replace the budgets of the users read from PostgreSQL by their balance in the ledger, which may not be written in PostgreSQL yet.
+
+        Args:
+            users(List[User]): The users to refresh.
+        """
+        users = [user for user in users if user.budget is not None]
+        if not users:
+            return
+
+        try:
+            balances = await self.redis.mget(keys=[f"{self.KEY_PREFIX}:{user.id}" for user in users])
+        except Exception:
+            logger.error(msg="Error while reading the budgets of the users.")
+            logger.error(msg=traceback.format_exc())
+            return
+
+        for user, balance in zip(users, balances):
+            if balance is not None:
+                user.budget = float(balance)
+
+    async def set(self, user_id: int, budget: Optional[float]) -> None:
+        """
+        Replace the balance of a user after its budget is updated in PostgreSQL.
+
+        Args:
+            user_id(int): The ID of the user.
+            budget(Optional[float]): The new budget of the user, None if the user has no budget anymore.
+        """
+        key = f"{self.KEY_PREFIX}:{user_id}"
+        if budget is None:
+            await self.redis.delete(keys=[key])
+            return
+
+        await self.redis.set(key, budget)
+        # written again in postgres in case of a concurrent flush of the previous balance
+        await self.redis.sadd(self.DIRTY_KEY, [user_id])
+
+    async def debit(self, user_id: int, cost: float) -> Optional[float]:
+        """
+        Decrease the balance of a user by the cost of a request, without going below zero.
+
+        Args:
+            user_id(int): The ID of the user.
+            cost(float): The cost of the request.
+
+        Returns:
+            Optional[float]: The new balance of the user, None if the user has no budget.
+        """
+        keys = [f"{self.KEY_PREFIX}:{user_id}", self.DIRTY_KEY]
+        try:
+            balance = await self._debit(keys=keys, args=[cost, user_id])
+            if balance is None:
+                # balance not in the ledger (e.g. Redis restarted), it is initialized from postgres without locking the row of the user
+                async for session in get_db_session():
+                    budget = (await session.execute(select(UserTable.budget).where(UserTable.id == user_id))).scalar_one_or_none()
+                if budget is None:
+                    return None
+
+                await self._get(keys=keys[:1], args=[budget])
+                balance = await self._debit(keys=keys, args=[cost, user_id])
+
+            return float(balance)
+        except Exception:
+            logger.error(msg=f"Error while updating the budget of user {user_id}.")
+            logger.error(msg=traceback.format_exc())
+
+        return None
+
+    def start(self) -> None:
+        """
+        Start the background task writing the balances of the users in PostgreSQL.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stop the background task and write the remaining balances in PostgreSQL.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        await self._flush_all()
+
+    async def flush(self) -> int:
+        """
+        Write a batch of balances in PostgreSQL with a single bulk UPDATE.
+
+        Returns:
+            int: The number of users whose balance has been written.
+        """
+        try:
+            user_ids = [int(user_id) for user_id in await self.redis.spop(self.DIRTY_KEY, count=self.batch_size) or []]
+            if not user_ids:
+                return 0
+            balances = await self.redis.mget(keys=[f"{self.KEY_PREFIX}:{user_id}" for user_id in user_ids])
+        except Exception:
+            logger.error(msg="Error while reading the budgets of the users to write in PostgreSQL.")
+            logger.error(msg=traceback.format_exc())
+            return 0
+
+        # users without balance have been deleted or have no budget anymore
+        rows = [{"id": user_id, "budget": float(balance)} for user_id, balance in zip(user_ids, balances) if balance is not None]
+        if not rows:
+            return len(user_ids)
+
+        try:
+            async for session in get_db_session():
+                await session.execute(update(UserTable), rows)
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Failed to write the budgets of {len(rows)} users in PostgreSQL, retrying on next flush: {e}")
+            await self.redis.sadd(self.DIRTY_KEY, [row["id"] for row in rows])
+            return 0
+
+        return len(user_ids)
+
+    async def _flush_all(self) -> None:
+        try:
+            while await self.flush() == self.batch_size:
+                pass
+        except Exception:
+            logger.error(msg="Error while writing the budgets of the users in PostgreSQL.")
+            logger.error(msg=traceback.format_exc())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_all()
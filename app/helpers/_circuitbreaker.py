@@ -0,0 +1,120 @@
+from collections import deque
+from enum import Enum
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreakerState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a model provider, fed with the outcomes of the requests forwarded to the provider and of the health checks.
+
+    The circuit is opened (the provider is ejected from the routing) when the failure rate of the last requests exceeds a threshold. After a delay, or as
+    soon as a health check succeeds, the circuit is half-opened: a limited number of trial requests are routed to the provider. The circuit is closed if
+    all of them succeed, reopened otherwise.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        open_duration: float = 30.0,
+        half_open_requests: int = 3,
+        window: int = 20,
+        min_requests: int = 5,
+    ) -> None:
+        self.name = name
+        self.failure_rate = failure_rate
+        self.open_duration = open_duration
+        self.half_open_requests = half_open_requests
+        self.min_requests = min_requests
+
+        self._state = CircuitBreakerState.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._half_open_admitted = 0
+        self._half_open_successes = 0
+
+    @property
+    def state(self) -> CircuitBreakerState:
+        if self._state == CircuitBreakerState.OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._half_open()
+
+        return self._state
+
+    def is_available(self) -> bool:
+        """
+        Check if a request can be routed to the provider.
+
+        Returns:
+            bool: True if the circuit is closed, or half-opened with trial requests left.
+        """
+        state = self.state
+        if state == CircuitBreakerState.HALF_OPEN:
+            return self._half_open_admitted < self.half_open_requests
+
+        return state == CircuitBreakerState.CLOSED
+
+    def acquire(self) -> None:
+        """
+        Notify the circuit breaker that a request has been routed to the provider.
+        """
+        if self.state == CircuitBreakerState.HALF_OPEN:
+            self._half_open_admitted += 1
+
+    def record_success(self) -> None:
+        """
+        Record a successful request or health check.
+        """
+        state = self.state
+        if state == CircuitBreakerState.CLOSED:
+            self._outcomes.append(True)
+        elif state == CircuitBreakerState.OPEN:
+            self._half_open()
+        else:
+            self._half_open_successes += 1
+            if self._half_open_successes >= self.half_open_requests:
+                self._close()
+
+    def record_failure(self) -> None:
+        """
+        Record a failed request (timeout, connection error or server error) or health check.
+        """
+        state = self.state
+        if state == CircuitBreakerState.CLOSED:
+            self._outcomes.append(False)
+            if len(self._outcomes) >= self.min_requests and self._outcomes.count(False) / len(self._outcomes) >= self.failure_rate:
+                self._open()
+        elif state == CircuitBreakerState.HALF_OPEN:
+            self._open()
+
+    def eject(self) -> None:
+        """
+        Open the circuit whatever the outcomes of the last requests, e.g. when the provider failed a check.
+        """
+        if self.state != CircuitBreakerState.OPEN:
+            self._open()
+
+    def _open(self) -> None:
+        logger.warning(f"Circuit breaker of model provider {self.name} opened, the provider is ejected.")
+        self._state = CircuitBreakerState.OPEN
+        self._opened_at = time.monotonic()
+
+    def _half_open(self) -> None:
+        logger.info(f"Circuit breaker of model provider {self.name} half-opened, the provider is re-admitted for {self.half_open_requests} trial requests.")  # fmt: off
+        self._state = CircuitBreakerState.HALF_OPEN
+        self._half_open_admitted = 0
+        self._half_open_successes = 0
+
+    def _close(self) -> None:
+        logger.info(f"Circuit breaker of model provider {self.name} closed, the provider is re-admitted.")
+        self._state = CircuitBreakerState.CLOSED
+        self._outcomes.clear()
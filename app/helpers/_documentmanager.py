@@ -472,8 +472,8 @@ class DocumentManager:
         return chunks
 
     async def _create_embeddings(self, input: List[str]) -> list[float] | list[list[float]] | dict:
-        client = self.vector_store_model.get_client(endpoint=ENDPOINT__EMBEDDINGS)
-        response = await client.forward_request(
+        response = await self.vector_store_model.forward_request(
+            endpoint=ENDPOINT__EMBEDDINGS,
             method="POST",
             json={"input": input, "model": self.vector_store_model.name, "encoding_format": "float"},
         )
@@ -0,0 +1,167 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import HTTPException
+import httpx
+import orjson
+
+from app.schemas.core.context import RequestContext
+from app.schemas.usage import Detail, Usage
+from app.utils.context import generate_request_id, global_context, request_context
+from app.utils.variables import ENDPOINT__EMBEDDINGS
+
+
+class _Batch:
+    def __init__(self, method: str, params: dict) -> None:
+        self.method = method
+        self.params = params
+        self.inputs: List[str | List[int]] = list()
+        self.futures: List[asyncio.Future] = list()
+        self.sizes: List[int] = list()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class EmbeddingsBatcher:
+    """
+    Micro-batcher of the embeddings requests of a model: the inputs of the concurrent requests with the same parameters are collected during a short
+    delay, or until the maximum batch size is reached, and sent to a provider of the model in a single request. The embeddings are then scattered back
+    to each request, with its own usage: the prompt tokens of its inputs and its share of the cost and carbon footprint of the batch. If the provider
+    rejects the batch with a client error, the inputs of each request are sent again on their own, so that only the invalid requests fail.
+    """
+
+    def __init__(self, forward_request: Callable[..., Awaitable[httpx.Response]], max_size: int, max_wait: float) -> None:
+        self.forward_request = forward_request
+        self.max_size = max_size
+        self.max_wait = max_wait
+
+        self._batches: Dict[bytes, _Batch] = dict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, method: str, json: dict, additional_data: Dict[str, Any] = None) -> httpx.Response:
+        """
+        Add the inputs of an embeddings request to the current batch and wait for their embeddings.
+
+        Args:
+            method(str): The method to use for the request.
+            json(dict): The JSON body of the embeddings request.
+            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
+
+        Returns:
+            httpx.Response: The embeddings response of the request.
+        """
+        inputs = json["input"]
+        if isinstance(inputs, str) or isinstance(inputs[0], int):
+            inputs = [inputs]
+
+        # only the requests with the same parameters are batched together
+        params = {key: value for key, value in json.items() if key != "input"}
+        key = orjson.dumps(params, option=orjson.OPT_SORT_KEYS)
+
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(method=method, params=params)
+            batch.timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush, key, batch)
+
+        future = asyncio.get_running_loop().create_future()
+        batch.inputs.extend(inputs)
+        batch.futures.append(future)
+        batch.sizes.append(len(inputs))
+        if len(batch.inputs) >= self.max_size:
+            self._flush(key=key, batch=batch)
+
+        embeddings, model, detail = await future
+
+        data = {"object": "list", "data": [{"object": "embedding", "index": i, "embedding": embedding} for i, embedding in enumerate(embeddings)]}
+        data.update({"model": model, "id": generate_request_id()})
+
+        usage = request_context.get().usage
+        if usage is not None and detail is not None:
+            prompt_tokens = global_context.tokenizer.get_prompt_tokens(endpoint=ENDPOINT__EMBEDDINGS, body={"input": inputs})
+            share = prompt_tokens / detail.usage.prompt_tokens if detail.usage.prompt_tokens else 0.0
+            caller_detail = Detail(id=data["id"], model=detail.model)
+            caller_detail.usage.prompt_tokens = prompt_tokens
+            caller_detail.usage.total_tokens = prompt_tokens
+            caller_detail.usage.cost = round(detail.usage.cost * share, ndigits=6)
+
+            usage.details.append(caller_detail)
+            usage.prompt_tokens += caller_detail.usage.prompt_tokens
+            usage.total_tokens += caller_detail.usage.total_tokens
+            usage.cost += caller_detail.usage.cost
+
+            # carbon footprint of the batch is also shared between the requests
+            for unit in ["kWh", "kgCO2eq"]:
+                for bound in ["min", "max"]:
+                    value = getattr(getattr(detail.usage.carbon, unit), bound)
+                    if value is not None:
+                        setattr(getattr(caller_detail.usage.carbon, unit), bound, value * share)
+                        total = getattr(getattr(usage.carbon, unit), bound) or 0.0
+                        setattr(getattr(usage.carbon, unit), bound, total + value * share)
+            data["usage"] = usage.model_dump()
+
+        data.update(additional_data or {})
+
+        return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
+
+    def _flush(self, key: bytes, batch: _Batch) -> None:
+        if self._batches.get(key) is not batch:
+            return
+
+        del self._batches[key]
+        batch.timer.cancel()
+
+        task = asyncio.create_task(self._send(batch=batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: _Batch) -> None:
+        # the usage of the batch is computed in the context of this task, then split between the requests
+        request_context.set(RequestContext(id=generate_request_id(), usage=Usage()))
+
+        try:
+            response = await self.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method=batch.method, json={**batch.params, "input": batch.inputs})
+            data = orjson.loads(response.content)
+        except HTTPException as e:
+            if 400 <= e.status_code < 500 and e.status_code != 429 and len(batch.futures) > 1:
+                await asyncio.gather(*[self._send(batch=sub_batch) for sub_batch in self._split(batch=batch)])
+                return
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        embeddings = [item["embedding"] for item in sorted(data["data"], key=lambda item: item["index"])]
+        # the batch may have been split into sub-batches, its usage is the sum of the usage of all the requests sent to the providers
+        details = request_context.get().usage.details
+        detail = Detail(id=details[0].id, model=details[0].model) if details else None
+        for sub_detail in details:
+            detail.usage.prompt_tokens += sub_detail.usage.prompt_tokens
+            detail.usage.total_tokens += sub_detail.usage.total_tokens
+            detail.usage.cost += sub_detail.usage.cost
+            for unit in ["kWh", "kgCO2eq"]:
+                for bound in ["min", "max"]:
+                    value = getattr(getattr(sub_detail.usage.carbon, unit), bound)
+                    if value is not None:
+                        total = getattr(getattr(detail.usage.carbon, unit), bound) or 0.0
+                        setattr(getattr(detail.usage.carbon, unit), bound, total + value)
+
+        start = 0
+        for future, size in zip(batch.futures, batch.sizes):
+            if not future.done():
+                future.set_result((embeddings[start : start + size], data.get("model"), detail))
+            start += size
+
+    @staticmethod
+    def _split(batch: _Batch) -> List[_Batch]:
+        sub_batches, start = list(), 0
+        for future, size in zip(batch.futures, batch.sizes):
+            sub_batch = _Batch(method=batch.method, params=batch.params)
+            sub_batch.inputs, sub_batch.futures, sub_batch.sizes = batch.inputs[start : start + size], [future], [size]
+            sub_batches.append(sub_batch)
+            start += size
+
+        return sub_batches
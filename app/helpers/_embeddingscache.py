@@ -0,0 +1,112 @@
+from collections import OrderedDict
+import hashlib
+import logging
+from typing import List, Optional
+import unicodedata
+
+from coredis import ConnectionPool, Redis
+import orjson
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+embeddings_cache_hits = Counter(name="embeddings_cache_hits", documentation="Number of embeddings served from the cache.", labelnames=["model", "tier"])  # fmt: off
+embeddings_cache_misses = Counter(name="embeddings_cache_misses", documentation="Number of embeddings not found in the cache.", labelnames=["model"])
+
+
+class EmbeddingsCache:
+    """
+    Two-tier cache of the embeddings created by the model providers: an in-process LRU, backed by Redis to share the embeddings across the API workers.
+    Each input is cached individually, keyed by the model, the normalized input and the output format of the embeddings.
+    """
+
+    def __init__(self, redis: ConnectionPool, ttl: int, max_size: int = 1000) -> None:
+        self.redis = Redis(connection_pool=redis)
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._lru = OrderedDict()  # embeddings are stored serialized, as in redis, to reduce memory usage
+
+    @staticmethod
+    def get_key(model: str, input: str | List[int], encoding_format: Optional[str] = None, dimensions: Optional[int] = None) -> str:
+        """
+        Get the cache key of an input.
+
+        Args:
+            model(str): The name of the model.
+            input(str | List[int]): The input text or tokens.
+            encoding_format(Optional[str]): The format of the embeddings.
+            dimensions(Optional[int]): The number of dimensions of the embeddings.
+
+        Returns:
+            str: The cache key.
+        """
+        if isinstance(input, str):
+            input = unicodedata.normalize("NFC", input)
+        digest = hashlib.sha256(orjson.dumps([input, encoding_format, dimensions])).hexdigest()
+
+        return f"embeddings:{model}:{digest}"
+
+    async def get(self, model: str, keys: List[str]) -> List[Optional[list]]:
+        """
+        Get the cached embeddings of inputs, from the in-process cache first, then from Redis.
+
+        Args:
+            model(str): The name of the model, used for the metrics.
+            keys(List[str]): The cache keys of the inputs.
+
+        Returns:
+            List[Optional[list]]: The embeddings, in the order of the keys, None for the inputs not found in the cache.
+        """
+        values = [self._lru.get(key) for key in keys]
+        for key, value in zip(keys, values):
+            if value is not None:
+                self._lru.move_to_end(key)
+        memory_hits = sum(value is not None for value in values)
+
+        missing = [i for i, value in enumerate(values) if value is None]
+        redis_hits = 0
+        if missing:
+            try:
+                redis_values = await self.redis.mget(keys=[keys[i] for i in missing])
+            except Exception as e:
+                logger.warning(f"Failed to read cached embeddings in Redis: {e}")
+                redis_values = [None] * len(missing)
+
+            for i, value in zip(missing, redis_values):
+                if value is not None:
+                    values[i] = value
+                    self._set(key=keys[i], value=value)
+                    redis_hits += 1
+
+        embeddings_cache_hits.labels(model=model, tier="memory").inc(memory_hits)
+        embeddings_cache_hits.labels(model=model, tier="redis").inc(redis_hits)
+        embeddings_cache_misses.labels(model=model).inc(len(keys) - memory_hits - redis_hits)
+
+        return [orjson.loads(value) if value is not None else None for value in values]
+
+    async def set(self, keys: List[str], embeddings: List[list]) -> None:
+        """
+        Cache the embeddings of inputs, in the in-process cache and in Redis.
+
+        Args:
+            keys(List[str]): The cache keys of the inputs.
+            embeddings(List[list]): The embeddings, in the order of the keys.
+        """
+        values = [orjson.dumps(embedding) for embedding in embeddings]
+        for key, value in zip(keys, values):
+            self._set(key=key, value=value)
+
+        try:
+            pipeline = await self.redis.pipeline(transaction=False)
+            for key, value in zip(keys, values):
+                await pipeline.set(key, value, ex=self.ttl)
+            await pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Failed to cache embeddings in Redis: {e}")
+
+    def _set(self, key: str, value: bytes) -> None:
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
@@ -0,0 +1,122 @@
+import asyncio
+from collections import deque
+import logging
+from typing import Optional, Set
+
+from coredis import ConnectionPool, PureToken, Redis
+from prometheus_client import Counter, Gauge
+
+from app.schemas.core.metric import Metric
+
+logger = logging.getLogger(__name__)
+
+metrics_buffer_size = Gauge(name="metrics_buffer_size", documentation="Number of performance metric points waiting to be written in Redis.")
+metrics_buffer_written = Counter(name="metrics_buffer_written", documentation="Number of performance metric points written in Redis.")
+metrics_buffer_dropped = Counter(name="metrics_buffer_dropped", documentation="Number of performance metric points dropped.", labelnames=["reason"])
+
+
+class MetricsBuffer:
+    """
+    In-process buffer of the performance metrics of the model providers, written in Redis time series in batches with a single TS.MADD command,
+    every flush interval or as soon as the batch size is reached. The buffer is bounded: points are dropped (and counted) when it is full, or when
+    a write fails, so that a slow or unreachable Redis never slows down the requests.
+    """
+
+    def __init__(self, redis: ConnectionPool, retention_ms: int, flush_interval_ms: int = 500, batch_size: int = 1000, max_size: int = 10000) -> None:
+        self.redis = Redis(connection_pool=redis)
+        self.retention_ms = retention_ms
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+
+        self._points = deque(maxlen=max_size)
+        self._keys: Set[str] = set()  # time series already created
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, metric: Metric) -> None:
+        """
+        Add the points of a performance metric to the buffer, without waiting for them to be written.
+
+        Args:
+            metric(Metric): The performance metric.
+        """
+        timestamp = int(metric.timestamp.timestamp() * 1000)
+        points = list()
+        if metric.time_to_first_token_us is not None:
+            points.append((f"metrics_ts:time_to_first_token:{metric.model_name}:{metric.provider_url}", timestamp, metric.time_to_first_token_us))
+        if metric.latency_ms is not None:
+            points.append((f"metrics_ts:latency:{metric.model_name}:{metric.provider_url}", timestamp, metric.latency_ms))
+
+        for point in points:
+            if len(self._points) == self._points.maxlen:
+                metrics_buffer_dropped.labels(reason="full").inc()
+                continue
+            self._points.append(point)
+
+        metrics_buffer_size.set(len(self._points))
+        if len(self._points) >= self.batch_size:
+            self._full.set()
+
+        # the buffer is started on first use if not started by the application
+        if self._task is None:
+            self.start()
+
+    def start(self) -> None:
+        """
+        Start the background task writing the buffered points in Redis.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stop the background task and write the remaining points in Redis.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        while self._points:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Write a batch of buffered points in Redis.
+        """
+        batch = [self._points.popleft() for _ in range(min(self.batch_size, len(self._points)))]
+        metrics_buffer_size.set(len(self._points))
+        if not batch:
+            return
+
+        try:
+            # TS.MADD does not create the time series, unlike TS.ADD
+            for key in {key for key, _, _ in batch} - self._keys:
+                await self._create(key=key)
+
+            await self.redis.timeseries.madd(ktvs=batch)
+            metrics_buffer_written.inc(len(batch))
+        except Exception as e:
+            logger.warning(f"Failed to write {len(batch)} performance metric points in Redis: {e}")
+            metrics_buffer_dropped.labels(reason="error").inc(len(batch))
+            # time series may have been removed (e.g. Redis restarted), they are created again on next flush
+            self._keys.clear()
+
+    async def _create(self, key: str) -> None:
+        try:
+            await self.redis.timeseries.create(key=key, retention=self.retention_ms, duplicate_policy=PureToken.LAST)
+        except Exception as e:
+            if "key already exists" not in str(e):
+                raise
+        self._keys.add(key)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+            if len(self._points) >= self.batch_size:
+                self._full.set()
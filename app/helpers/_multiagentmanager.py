@@ -157,8 +157,8 @@ Réponse :
         return []
 
     async def _get_completion(self, prompt: str, temperature=0.2) -> str:
-        client = self.synthesis_model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
-        resp = await client.forward_request(
+        resp = await self.synthesis_model.forward_request(
+            endpoint=ENDPOINT__CHAT_COMPLETIONS,
             method="POST",
             json={"messages": [{"role": "user", "content": prompt}], "temperature": temperature, "max_tokens": 1024, "model": self.synthesis_model},
         )
@@ -169,9 +169,9 @@ Réponse :
         return await asyncio.gather(*tasks)
 
     async def _get_rank(self, prompt: str, inputs: List[str]) -> List[int]:
-        client = self.reranker_model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
         query = self.PROMPT_CHOICER.format(prompt=prompt, docs=inputs)
-        resp = await client.forward_request(
+        resp = await self.reranker_model.forward_request(
+            endpoint=ENDPOINT__CHAT_COMPLETIONS,
             method="POST",
             json={
                 "messages": [{"role": "user", "content": query}],
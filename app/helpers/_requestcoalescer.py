@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+import orjson
+from prometheus_client import Counter
+
+from app.schemas.usage import Detail, Usage
+from app.utils.context import generate_request_id, request_context
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS, ENDPOINT__EMBEDDINGS
+
+coalescing_upstream_requests = Counter(name="coalescing_upstream_requests", documentation="Number of coalescable requests forwarded to a model provider.", labelnames=["model", "endpoint"])  # fmt: off
+coalesced_requests = Counter(name="coalesced_requests", documentation="Number of requests served by an identical request already in flight.", labelnames=["model", "endpoint"])  # fmt: off
+
+
+class RequestCoalescer:
+    """
+    Single-flight of the identical requests to the models: concurrent identical embeddings requests and deterministic (temperature of 0) chat
+    completions requests share a single request to a provider of the model, and all receive its response. Each request is still counted in the usage
+    with the tokens and cost of the shared request, but only the request that started the shared request is counted with its carbon footprint since
+    the provider is called once.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, asyncio.Task] = dict()
+
+    @staticmethod
+    def get_key(model: str, endpoint: str, json: dict) -> Optional[str]:
+        """
+        Get the key of a request to coalesce identical requests.
+
+        Args:
+            model(str): The name of the model.
+            endpoint(str): The type of endpoint called.
+            json(dict): The JSON body of the request.
+
+        Returns:
+            Optional[str]: The key of the request, None if the request can not be coalesced.
+        """
+        if endpoint == ENDPOINT__CHAT_COMPLETIONS:
+            if json.get("temperature") != 0 or json.get("stream"):
+                return None
+        elif endpoint != ENDPOINT__EMBEDDINGS:
+            return None
+
+        digest = hashlib.sha256(orjson.dumps(json, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
+
+        return f"{model}:{endpoint}:{digest}"
+
+    async def forward(
+        self,
+        model: str,
+        endpoint: str,
+        key: str,
+        forward_request: Callable[[], Awaitable[httpx.Response]],
+        additional_data: Dict[str, Any] = None,
+    ) -> httpx.Response:
+        """
+        Forward a request to a provider of the model, or wait for the response of the identical request in flight.
+
+        Args:
+            model(str): The name of the model.
+            endpoint(str): The type of endpoint called.
+            key(str): The key of the request returned by get_key.
+            forward_request(Callable[[], Awaitable[httpx.Response]]): The function forwarding the request to a provider, without additional data.
+            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
+
+        Returns:
+            httpx.Response: The response of the request.
+        """
+        call = self._calls.get(key)
+        started = call is None
+        if started:
+            call = self._calls[key] = asyncio.create_task(self._call(forward_request=forward_request))
+            call.add_done_callback(lambda task: self._calls.pop(key) if self._calls.get(key) is task else None)
+            coalescing_upstream_requests.labels(model=model, endpoint=endpoint).inc()
+        else:
+            coalesced_requests.labels(model=model, endpoint=endpoint).inc()
+
+        # the shared request is not cancelled if one of the requests is cancelled
+        data, detail = await asyncio.shield(call)
+
+        data = {**data, "id": generate_request_id()}
+        usage = request_context.get().usage
+        if usage is not None and detail is not None:
+            shared_detail = Detail(id=data["id"], model=detail.model)
+            shared_detail.usage.prompt_tokens = detail.usage.prompt_tokens
+            shared_detail.usage.completion_tokens = detail.usage.completion_tokens
+            shared_detail.usage.total_tokens = detail.usage.total_tokens
+            shared_detail.usage.cost = detail.usage.cost
+            if started:
+                shared_detail.usage.carbon = detail.usage.carbon.model_copy(deep=True)
+
+            usage.details.append(shared_detail)
+            usage.prompt_tokens += shared_detail.usage.prompt_tokens
+            usage.completion_tokens += shared_detail.usage.completion_tokens
+            usage.total_tokens += shared_detail.usage.total_tokens
+            usage.cost += shared_detail.usage.cost
+
+            # carbon usage is added to the total usage as done by the model clients
+            for unit in ["kWh", "kgCO2eq"]:
+                for bound in ["min", "max"]:
+                    value = getattr(getattr(shared_detail.usage.carbon, unit), bound)
+                    if value is not None:
+                        setattr(getattr(usage.carbon, unit), bound, (getattr(getattr(usage.carbon, unit), bound) or 0.0) + value)
+
+            data["usage"] = usage.model_dump()
+
+        data.update(additional_data or {})
+
+        return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
+
+    async def _call(self, forward_request: Callable[[], Awaitable[httpx.Response]]) -> Tuple[dict, Optional[Detail]]:
+        # the usage of the shared request is computed in the context of this task, then added to the usage of each request. The other attributes are
+        # those of the request that started the shared request, so that it keeps its priority in the queue of the model
+        request_context.set(request_context.get().model_copy(update={"usage": Usage()}))
+
+        response = await forward_request()
+        data = orjson.loads(response.content)
+        data.pop("usage", None)
+
+        details = request_context.get().usage.details
+
+        return data, details[-1] if details else None
@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import time
+from typing import Dict, List, Optional
+
+from coredis import ConnectionPool, Redis
+import orjson
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+response_cache_hits = Counter(name="response_cache_hits", documentation="Number of chat completions served from the response cache.", labelnames=["model"])  # fmt: off
+response_cache_misses = Counter(name="response_cache_misses", documentation="Number of cacheable chat completions not found in the response cache.", labelnames=["model"])  # fmt: off
+
+
+class ResponseCache:
+    """
+    Exact-match cache of the chat completions, stored in Redis to be shared across the API workers. Only the requests with a temperature lower or
+    equal to the maximum temperature are cached, keyed by the model and the canonicalized request body (messages, sampling parameters, tools, etc.).
+    Streamed and non-streamed requests share the same cache entries.
+    """
+
+    IGNORED_FIELDS = ["model", "stream", "stream_options"]
+
+    def __init__(self, redis: ConnectionPool, ttl: int, max_temperature: float = 0.0, max_size: int = 1000000) -> None:
+        self.redis = Redis(connection_pool=redis)
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.max_size = max_size
+
+    def get_key(self, model: str, body: dict) -> Optional[str]:
+        """
+        Get the cache key of a chat completions request.
+
+        Args:
+            model(str): The name of the model.
+            body(dict): The JSON body of the request.
+
+        Returns:
+            Optional[str]: The cache key, None if the request is not cacheable.
+        """
+        temperature = body.get("temperature")
+        if temperature is None or temperature > self.max_temperature:
+            return None
+
+        body = {key: value for key, value in body.items() if key not in self.IGNORED_FIELDS}
+        try:
+            digest = hashlib.sha256(orjson.dumps(body, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        except TypeError:
+            return None
+
+        return f"chat_completions:{model}:{digest}"
+
+    async def get(self, model: str, key: str) -> Optional[dict]:
+        """
+        Get a cached chat completion.
+
+        Args:
+            model(str): The name of the model, used for the metrics.
+            key(str): The cache key of the request.
+
+        Returns:
+            Optional[dict]: The cached chat completion, None if not found.
+        """
+        try:
+            value = await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Failed to read cached chat completion in Redis: {e}")
+            value = None
+
+        if value is None:
+            response_cache_misses.labels(model=model).inc()
+            return None
+
+        response_cache_hits.labels(model=model).inc()
+
+        return orjson.loads(value)
+
+    async def set(self, key: str, completion: dict) -> None:
+        """
+        Cache a chat completion, unless it exceeds the maximum size.
+
+        Args:
+            key(str): The cache key of the request.
+            completion(dict): The chat completion.
+        """
+        value = orjson.dumps(completion)
+        if len(value) > self.max_size:
+            return
+
+        try:
+            await self.redis.set(key, value, ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Failed to cache chat completion in Redis: {e}")
+
+    @staticmethod
+    def get_chunks(completion: dict) -> List[dict]:
+        """
+        Split a cached chat completion into stream chunks: a chunk with the message of each choice, then a chunk with the finish reason of each choice.
+
+        Args:
+            completion(dict): The chat completion.
+
+        Returns:
+            List[dict]: The chunks of the stream.
+        """
+        chunk = {key: value for key, value in completion.items() if key not in ["choices", "usage"]}
+        chunk["object"] = "chat.completion.chunk"
+
+        chunks = list()
+        for choice in completion["choices"]:
+            delta = {key: value for key, value in choice["message"].items() if value is not None}
+            if delta.get("tool_calls"):
+                delta["tool_calls"] = [{"index": i, **tool_call} for i, tool_call in enumerate(delta["tool_calls"])]
+            chunks.append({**chunk, "choices": [{"index": choice["index"], "delta": delta, "finish_reason": None}]})
+        for choice in completion["choices"]:
+            chunks.append({**chunk, "choices": [{"index": choice["index"], "delta": {}, "finish_reason": choice["finish_reason"]}]})
+
+        return chunks
+
+
+class ChatCompletionStreamBuilder:
+    """
+    Rebuild a chat completion from the chunks of a stream, to cache streamed chat completions. Streams with tool calls are not rebuilt.
+    """
+
+    def __init__(self) -> None:
+        self.completion: Optional[dict] = None
+        self._choices: Dict[int, dict] = dict()
+        self._cacheable = True
+
+    def add(self, chunk: dict) -> None:
+        """
+        Add a chunk of the stream.
+
+        Args:
+            chunk(dict): The decoded chunk.
+        """
+        if self.completion is None:
+            self.completion = {key: value for key, value in chunk.items() if key not in ["choices", "usage"]}
+            self.completion.update({"object": "chat.completion", "created": chunk.get("created", int(time.time()))})
+
+        # the extra chunk added at the end of the stream holds the usage
+        if chunk.get("usage"):
+            self.completion["usage"] = chunk["usage"]
+
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            if delta.get("tool_calls"):
+                self._cacheable = False
+
+            message = self._choices.setdefault(choice["index"], {"index": choice["index"], "message": {"role": "assistant", "content": ""}, "finish_reason": None})  # fmt: off
+            message["message"]["content"] += delta.get("content") or ""
+            if choice.get("finish_reason"):
+                message["finish_reason"] = choice["finish_reason"]
+
+    def get_completion(self) -> Optional[dict]:
+        """
+        Get the rebuilt chat completion.
+
+        Returns:
+            Optional[dict]: The chat completion, None if the stream is incomplete or not cacheable.
+        """
+        if not self._cacheable or self.completion is None or not self._choices or "usage" not in self.completion:
+            return None
+        if any(choice["finish_reason"] is None for choice in self._choices.values()):
+            return None
+
+        return {**self.completion, "choices": [self._choices[index] for index in sorted(self._choices)]}
@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import List, Optional, Set, Tuple
+
+from coredis import ConnectionPool, Redis
+import orjson
+from prometheus_client import Counter
+
+from app.clients.vector_store import BaseVectorStoreClient as VectorStoreClient
+from app.schemas.chunks import Chunk
+from app.schemas.core.context import RequestContext
+from app.schemas.search import SearchMethod
+from app.schemas.usage import Usage
+from app.utils.context import generate_request_id, request_context
+from app.utils.variables import ENDPOINT__EMBEDDINGS
+
+logger = logging.getLogger(__name__)
+
+semantic_cache_hits = Counter(name="semantic_cache_hits", documentation="Number of chat completions served from the semantic cache.", labelnames=["model"])  # fmt: off
+semantic_cache_misses = Counter(name="semantic_cache_misses", documentation="Number of cacheable chat completions not found in the semantic cache.", labelnames=["model"])  # fmt: off
+semantic_cache_dropped = Counter(name="semantic_cache_dropped", documentation="Number of chat completions not cached because too many writes in the semantic cache are pending.")  # fmt: off
+semantic_cache_evicted = Counter(name="semantic_cache_evicted", documentation="Number of expired chat completions deleted from the semantic cache.")  # fmt: off
+
+
+class SemanticCache:
+    """
+    Semantic cache of the chat completions, stored in a dedicated collection of the vector store. The last user message of a request is embedded with
+    the vector store model and the completion of the most similar previous message is returned if its similarity score is above the threshold, and if
+    the model, the system prompt and the parameters of the request are the same.
+
+    Only the single-turn requests (system messages followed by a single text user message) are cached, since the last user message of a conversation
+    is not enough to identify the expected answer.
+
+    Each completion is stored as a document of one chunk identified by the prompt and its context, so that caching the same prompt again replaces the
+    previous completion. The creation times of the completions are indexed in Redis, the expired completions are deleted from the vector store when
+    new completions are cached.
+    """
+
+    COLLECTION_ID = 0  # collection IDs of the database start at 1
+    SEARCH_K = 10
+    EXPIRATION_KEY = "semantic_cache:created"
+    EVICTION_INTERVAL = 60  # seconds
+    EVICTION_BATCH_SIZE = 100
+    MAX_PENDING_WRITES = 100
+
+    def __init__(self, vector_store: VectorStoreClient, vector_store_model, redis: ConnectionPool, models: List[str], threshold: float, ttl: int) -> None:  # fmt: off
+        self.vector_store = vector_store
+        self.vector_store_model = vector_store_model
+        self.redis = Redis(connection_pool=redis)
+        self.models = models
+        self.threshold = threshold
+        self.ttl = ttl
+
+        self._writes: Set[asyncio.Task] = set()
+        self._evicted_at = 0.0
+
+    async def setup(self) -> None:
+        """
+        Create the collection of the semantic cache in the vector store if it does not exist.
+        """
+        if self.COLLECTION_ID not in await self.vector_store.get_collections():
+            await self.vector_store.create_collection(collection_id=self.COLLECTION_ID, vector_size=self.vector_store_model.vector_size)
+
+    def get_prompt(self, model: str, body: dict) -> Optional[str]:
+        """
+        Get the prompt of a chat completions request to look up in the semantic cache.
+
+        Args:
+            model(str): The name of the model.
+            body(dict): The JSON body of the request.
+
+        Returns:
+            Optional[str]: The last user message, None if the request is not cacheable.
+        """
+        if model not in self.models:
+            return None
+
+        messages = body.get("messages") or []
+        if not messages or messages[-1].get("role") != "user" or not isinstance(messages[-1].get("content"), str):
+            return None
+        if any(message.get("role") not in ["system", "developer"] for message in messages[:-1]):
+            return None
+
+        return messages[-1]["content"]
+
+    async def get(self, model: str, body: dict, prompt: str) -> Tuple[Optional[dict], Optional[list[float]]]:
+        """
+        Look up the completion of a similar prompt in the semantic cache.
+
+        Args:
+            model(str): The name of the model.
+            body(dict): The JSON body of the request.
+            prompt(str): The prompt returned by get_prompt.
+
+        Returns:
+            Tuple[Optional[dict], Optional[list[float]]]: The cached completion (None if not found) and the vector of the prompt, to cache the
+            completion of the request if not found (None if the lookup failed).
+        """
+        try:
+            # the prompt is vectorized in a task with its own context, its usage is not counted in the usage of the user
+            vector = await asyncio.create_task(self._get_vector(prompt=prompt))
+            searches = await self.vector_store.search(
+                method=SearchMethod.SEMANTIC,
+                collection_ids=[self.COLLECTION_ID],
+                query_prompt=prompt,
+                query_vector=vector,
+                k=self.SEARCH_K,
+                score_threshold=self.threshold,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to look up chat completion in the semantic cache: {e}")
+            return None, None
+
+        context, created = self._get_context(model=model, body=body), time.time() - self.ttl
+        for search in searches:
+            if search.chunk.metadata.get("context") == context and search.chunk.metadata.get("created", 0) >= created:
+                semantic_cache_hits.labels(model=model).inc()
+                return orjson.loads(search.chunk.content), vector
+
+        semantic_cache_misses.labels(model=model).inc()
+
+        return None, vector
+
+    def add(self, model: str, body: dict, vector: list[float], completion: dict) -> None:
+        """
+        Cache the completion of a request in the semantic cache in background, since the vector store may be slow to index. The completion is
+        dropped if too many writes are pending.
+
+        Args:
+            model(str): The name of the model.
+            body(dict): The JSON body of the request.
+            vector(list[float]): The vector of the prompt returned by get.
+            completion(dict): The chat completion.
+        """
+        if len(self._writes) >= self.MAX_PENDING_WRITES:
+            semantic_cache_dropped.inc()
+            return
+
+        task = asyncio.create_task(self.set(model=model, body=body, vector=vector, completion=completion))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def close(self) -> None:
+        """
+        Wait for the pending writes in the semantic cache.
+        """
+        await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def set(self, model: str, body: dict, vector: list[float], completion: dict) -> None:
+        """
+        Cache the completion of a request in the semantic cache, replacing the previous completion of the same prompt and context.
+
+        Args:
+            model(str): The name of the model.
+            body(dict): The JSON body of the request.
+            vector(list[float]): The vector of the prompt returned by get.
+            completion(dict): The chat completion.
+        """
+        context, created = self._get_context(model=model, body=body), int(time.time())
+        id = int(hashlib.sha256(f"{context}:{body['messages'][-1]['content']}".encode()).hexdigest()[:15], 16)
+        chunk = Chunk(id=id, content=orjson.dumps(completion).decode(), metadata={"document_id": id, "model": model, "context": context, "created": created})  # fmt: off
+        try:
+            await self.vector_store.delete_document(collection_id=self.COLLECTION_ID, document_id=id)
+            await self.vector_store.upsert(collection_id=self.COLLECTION_ID, chunks=[chunk], embeddings=[vector])
+            await self.redis.zadd(self.EXPIRATION_KEY, {str(id): created})
+        except Exception as e:
+            logger.warning(f"Failed to cache chat completion in the semantic cache: {e}")
+            return
+
+        if time.monotonic() - self._evicted_at >= self.EVICTION_INTERVAL:
+            self._evicted_at = time.monotonic()
+            await self.evict()
+
+    async def evict(self) -> int:
+        """
+        Delete a batch of expired completions from the vector store.
+
+        Returns:
+            int: The number of deleted completions.
+        """
+        try:
+            ids = await self.redis.zrangebyscore(
+                self.EXPIRATION_KEY, min_="-inf", max_=time.time() - self.ttl, offset=0, count=self.EVICTION_BATCH_SIZE
+            )
+            for id in ids:
+                await self.vector_store.delete_document(collection_id=self.COLLECTION_ID, document_id=int(id))
+            if ids:
+                await self.redis.zrem(self.EXPIRATION_KEY, ids)
+        except Exception as e:
+            logger.warning(f"Failed to delete expired chat completions from the semantic cache: {e}")
+            return 0
+
+        semantic_cache_evicted.inc(len(ids))
+
+        return len(ids)
+
+    async def _get_vector(self, prompt: str) -> list[float]:
+        request_context.set(RequestContext(id=generate_request_id(), usage=Usage()))
+        response = await self.vector_store_model.forward_request(
+            endpoint=ENDPOINT__EMBEDDINGS,
+            method="POST",
+            json={"input": [prompt], "model": self.vector_store_model.name, "encoding_format": "float"},
+        )
+
+        return response.json()["data"][0]["embedding"]
+
+    @staticmethod
+    def _get_context(model: str, body: dict) -> str:
+        # everything but the prompt must be the same: model, system prompt and parameters
+        context = {key: value for key, value in body.items() if key not in ["model", "messages", "stream", "stream_options"]}
+        context.update({"model": model, "messages": body["messages"][:-1]})
+
+        return hashlib.sha256(orjson.dumps(context, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
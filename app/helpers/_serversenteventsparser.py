@@ -0,0 +1,67 @@
+from typing import List, Optional
+
+
+class ServerSentEventsParser:
+    """
+    Incremental parser of a server-sent events stream (see https://html.spec.whatwg.org/multipage/server-sent-events.html).
+
+    Raw chunks read from the network are fed to the parser, which returns the complete events they contain. An event split across several
+    chunks is kept in an internal buffer until its end is received, so each event is framed exactly once whatever the network chunking.
+    """
+
+    SEPARATOR = b"\n\n"
+
+    def __init__(self) -> None:
+        self._buffer = b""
+        self._carriage_return = False  # trailing CR of the previous chunk, which may be the first half of a CRLF
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """
+        Feed a raw chunk of the stream to the parser.
+
+        Args:
+            chunk(bytes): The raw chunk read from the stream.
+
+        Returns:
+            List[bytes]: The complete events terminated in this chunk, with their trailing separator.
+        """
+        if self._carriage_return:
+            chunk, self._carriage_return = b"\r" + chunk, False
+        if chunk.endswith(b"\r"):
+            chunk, self._carriage_return = chunk[:-1], True
+        if b"\r" in chunk:
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        self._buffer += chunk
+        if self.SEPARATOR not in self._buffer:
+            return []
+
+        *events, self._buffer = self._buffer.split(self.SEPARATOR)
+
+        return [event + self.SEPARATOR for event in events if event]
+
+    def flush(self) -> Optional[bytes]:
+        """
+        Return the incomplete event remaining in the buffer at the end of the stream, if any.
+
+        Returns:
+            Optional[bytes]: The remaining event with a trailing separator, None if the buffer is empty.
+        """
+        event, self._buffer, self._carriage_return = self._buffer.strip(b"\n"), b"", False
+
+        return event + self.SEPARATOR if event else None
+
+    @staticmethod
+    def get_data(event: bytes) -> Optional[bytes]:
+        """
+        Extract the data field of an event. Multiple data lines are joined with a line feed.
+
+        Args:
+            event(bytes): The event returned by the parser.
+
+        Returns:
+            Optional[bytes]: The data of the event, None if the event has no data field (comment, keep-alive, etc.).
+        """
+        data = [line[5:].removeprefix(b" ") for line in event.split(b"\n") if line.startswith(b"data:")]
+
+        return b"\n".join(data) if data else None
@@ -1,13 +1,21 @@
+from datetime import datetime
 import json
 import logging
 import traceback
-from typing import AsyncIterator
+from typing import AsyncIterator, Optional
 
+import anyio
 from fastapi.responses import StreamingResponse
-from starlette.types import Send
+from prometheus_client import Counter
+from starlette.responses import ContentStream
+from starlette.types import Receive, Scope, Send
+
+from app.utils.configuration import configuration
 
 logger = logging.getLogger(__name__)
 
+streams_cancelled = Counter(name="streams_cancelled", documentation="Number of streamed responses interrupted because the client disconnected.")
+
 
 class StreamingResponseWithStatusCode(StreamingResponse):
     """
@@ -15,15 +23,67 @@ class StreamingResponseWithStatusCode(StreamingResponse):
     based on the return value of the content iterator (parameter `content`).
     Expects the content to yield either just str content as per the original `StreamingResponse`
     or else tuples of (`content`: `str`, `status_code`: `int`).
+
+    The first chunk is sent at once, the next chunks received within the coalescing window (or up to the coalescing byte budget) are sent in a
+    single write. Chunks are never split, so the framing of the server-sent events is preserved. The background task is run at the end of the
+    stream, including when the client disconnects.
+
+    After the first chunk, the content iterator is read by a single task into a memory stream, from which the chunks are coalesced. If the content
+    iterator exposes the stream of its provider (`provider_stream`, see ModelStream), the next chunks are read from it directly.
     """
 
+    BUFFER_SIZE = 64  # chunks read ahead of the client
+
     body_iterator: AsyncIterator[str | bytes]
     response_started: bool = False
+    response_completed: bool = False
+    first_chunk_at: Optional[datetime] = None
+
+    def __init__(
+        self,
+        content: ContentStream,
+        *args,
+        coalescing_window_ms: Optional[int] = None,
+        coalescing_max_bytes: Optional[int] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(content, *args, **kwargs)
+        self.coalescing_window = (configuration.settings.streaming_coalescing_window_ms if coalescing_window_ms is None else coalescing_window_ms) / 1000  # fmt: off
+        self.coalescing_max_bytes = configuration.settings.streaming_coalescing_max_bytes if coalescing_max_bytes is None else coalescing_max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # the client disconnection is listened whatever the ASGI spec version, so that the stream is interrupted as soon as the client is gone
+        try:
+            async with anyio.create_task_group() as task_group:
+
+                async def stream() -> None:
+                    try:
+                        await self.stream_response(send)
+                        self.response_completed = True
+                    except OSError:  # client disconnected while sending a chunk
+                        pass
+                    task_group.cancel_scope.cancel()
+
+                task_group.start_soon(stream)
+                await self.listen_for_disconnect(receive)
+                task_group.cancel_scope.cancel()
+        finally:
+            if not self.response_completed:
+                streams_cancelled.inc()
+
+            # the content iterator is closed at once, which closes the request to the model provider so that it stops the generation
+            with anyio.CancelScope(shield=True):
+                if hasattr(self.body_iterator, "aclose"):
+                    await self.body_iterator.aclose()
+
+                if self.background is not None:
+                    await self.background()
 
     async def stream_response(self, send: Send) -> None:
         more_body = True
         try:
             first_chunk = await self.body_iterator.__anext__()
+            self.first_chunk_at = datetime.now()
             if isinstance(first_chunk, tuple):
                 first_chunk_content, self.status_code = first_chunk
             else:
@@ -37,23 +97,46 @@ class StreamingResponseWithStatusCode(StreamingResponse):
             self.response_started = True
             await send({"type": "http.response.body", "body": first_chunk_content, "more_body": more_body})
 
-            async for chunk in self.body_iterator:
-                if isinstance(chunk, tuple):
-                    content, status_code = chunk
-                    if status_code // 100 != 2:
-                        # an error occurred mid-stream
-                        if not isinstance(content, bytes):
-                            content = content.encode(self.charset)
-                        more_body = False
-                        await send({"type": "http.response.body", "body": content, "more_body": more_body})
-                        return
-                else:
-                    content = chunk
+            chunks = getattr(self.body_iterator, "provider_stream", None) or self.body_iterator
+            send_stream, receive_stream = anyio.create_memory_object_stream(max_buffer_size=self.BUFFER_SIZE)
 
-                if isinstance(content, str):
-                    content = content.encode(self.charset)
-                more_body = True
-                await send({"type": "http.response.body", "body": content, "more_body": more_body})
+            async def read_chunks() -> None:
+                async with send_stream:
+                    async for chunk in chunks:
+                        await send_stream.send(chunk)
+
+            async with anyio.create_task_group() as task_group, receive_stream:
+                task_group.start_soon(read_chunks)
+                async for chunk in receive_stream:
+                    # the chunks received until the end of the coalescing window or up to the byte budget are sent in a single write
+                    buffer, size = list(), 0
+                    with anyio.move_on_after(self.coalescing_window):
+                        while True:
+                            content, status_code = chunk if isinstance(chunk, tuple) else (chunk, 200)
+                            if isinstance(content, str):
+                                content = content.encode(self.charset)
+                            buffer.append(content)
+                            size += len(content)
+
+                            if status_code // 100 != 2:
+                                # an error occurred mid-stream, the buffered chunks are sent before the error
+                                self.status_code = status_code
+                                more_body = False
+                                break
+                            if size >= self.coalescing_max_bytes or not self.coalescing_window:
+                                break
+                            try:
+                                try:
+                                    chunk = receive_stream.receive_nowait()
+                                except anyio.WouldBlock:
+                                    chunk = await receive_stream.receive()
+                            except anyio.EndOfStream:
+                                break
+
+                    await send({"type": "http.response.body", "body": b"".join(buffer), "more_body": more_body})
+                    if not more_body:
+                        task_group.cancel_scope.cancel()
+                        return
 
         except Exception:
             logger.error(traceback.format_exc())
@@ -61,7 +144,8 @@ class StreamingResponseWithStatusCode(StreamingResponse):
             error_resp = {"error": {"message": "Internal Server Error"}}
             error_event = f"event: error\ndata: {json.dumps(error_resp)}\n\n".encode(self.charset)
             if not self.response_started:
-                await send({"type": "http.response.start", "status": 500, "headers": self.raw_headers})
+                self.status_code = 500
+                await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
             await send({"type": "http.response.body", "body": error_event, "more_body": more_body})
         if more_body:
             await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,118 @@
+import asyncio
+from collections import deque
+import logging
+import time
+from typing import Optional
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import insert
+
+from app.sql.models import Usage
+from app.sql.session import get_db_session
+
+logger = logging.getLogger(__name__)
+
+usage_buffer_size = Gauge(name="usage_buffer_size", documentation="Number of usage logs waiting to be written in PostgreSQL.")
+usage_buffer_written = Counter(name="usage_buffer_written", documentation="Number of usage logs written in PostgreSQL.")
+usage_buffer_dropped = Counter(name="usage_buffer_dropped", documentation="Number of usage logs dropped.", labelnames=["reason"])
+usage_buffer_lag_seconds = Gauge(name="usage_buffer_lag_seconds", documentation="Time waited in the buffer by the oldest usage log of the last batch written in PostgreSQL.")  # fmt: off
+
+USAGE_COLUMNS = [column.key for column in Usage.__table__.columns if not column.primary_key]
+
+
+class UsageBuffer:
+    """
+    In-process buffer of the usage logs, written in PostgreSQL in batches with a single multi-row INSERT, every flush interval or as soon as the
+    batch size is reached, so that logging the usage of a request does not cost a database connection and a round-trip. A failed write is
+    retried with an exponential backoff, then the batch is dropped (and counted). The buffer is bounded: usage logs are dropped when it is full.
+    """
+
+    def __init__(self, flush_interval_ms: int = 1000, batch_size: int = 500, max_size: int = 10000, max_retries: int = 3, retry_backoff: float = 0.5) -> None:  # fmt: off
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._rows = deque(maxlen=max_size)  # (time added in the buffer, row)
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, usage: Usage) -> None:
+        """
+        Add a usage log to the buffer, without waiting for it to be written.
+
+        Args:
+            usage(Usage): The usage log of a request.
+        """
+        if len(self._rows) == self._rows.maxlen:
+            usage_buffer_dropped.labels(reason="full").inc()
+            return
+
+        self._rows.append((time.monotonic(), {key: getattr(usage, key) for key in USAGE_COLUMNS}))
+
+        usage_buffer_size.set(len(self._rows))
+        if len(self._rows) >= self.batch_size:
+            self._full.set()
+
+        # the buffer is started on first use if not started by the application
+        if self._task is None:
+            self.start()
+
+    def start(self) -> None:
+        """
+        Start the background task writing the buffered usage logs in PostgreSQL.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stop the background task and write the remaining usage logs in PostgreSQL.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        while self._rows:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Write a batch of buffered usage logs in PostgreSQL.
+        """
+        batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+        usage_buffer_size.set(len(self._rows))
+        if not batch:
+            return
+
+        rows = [row for _, row in batch]
+        for attempt in range(self.max_retries + 1):
+            try:
+                async for session in get_db_session():
+                    await session.execute(insert(Usage), rows)
+                    await session.commit()
+            except Exception as e:
+                if attempt < self.max_retries:
+                    logger.debug(f"Failed to write {len(rows)} usage logs in PostgreSQL, retrying: {e}")
+                    await asyncio.sleep(self.retry_backoff * 2**attempt)
+                    continue
+
+                logger.error(f"Failed to write {len(rows)} usage logs in PostgreSQL: {e}")
+                usage_buffer_dropped.labels(reason="error").inc(len(rows))
+                return
+
+            usage_buffer_written.inc(len(rows))
+            usage_buffer_lag_seconds.set(time.monotonic() - batch[0][0])
+            return
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+            if len(self._rows) >= self.batch_size:
+                self._full.set()
@@ -1,14 +1,22 @@
+from collections import OrderedDict
+import hashlib
 import logging
-from typing import List, Union
+from typing import Dict, Optional, Union
 
+from prometheus_client import Counter, Gauge
 import tiktoken
-from app.schemas.chat import ChatCompletionChunk, ChatCompletion
 
+from app.schemas.chat import ChatCompletion
 from app.schemas.core.configuration import Tokenizer
+from app.utils.context import request_context
 from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS, ENDPOINT__EMBEDDINGS, ENDPOINT__OCR, ENDPOINT__RERANK, ENDPOINT__SEARCH
 
 logger = logging.getLogger(__name__)
 
+usage_tokenizer_cache_hits = Counter(name="usage_tokenizer_cache_hits", documentation="Number of token counts found in the token counts cache of the usage tokenizer.")  # fmt: off
+usage_tokenizer_cache_misses = Counter(name="usage_tokenizer_cache_misses", documentation="Number of token counts not found in the token counts cache of the usage tokenizer, the contents are tokenized.")  # fmt: off
+usage_tokenizer_cache_size_bytes = Gauge(name="usage_tokenizer_cache_size_bytes", documentation="Approximate memory size of the token counts cache of the usage tokenizer.")  # fmt: off
+
 
 class UsageTokenizer:
     USAGE_COMPLETION_ENDPOINTS = {
@@ -19,7 +27,11 @@ class UsageTokenizer:
         ENDPOINT__SEARCH: False,
     }
 
-    def __init__(self, tokenizer: Tokenizer):
+    cache: Optional["TokenCountsCache"] = None
+
+    def __init__(self, tokenizer: Tokenizer, cache_max_bytes: int = 0):
+        self.cache = TokenCountsCache(max_bytes=cache_max_bytes) if cache_max_bytes > 0 else None
+
         if tokenizer == Tokenizer.TIKTOKEN_O200K_BASE:
             self.tokenizer = tiktoken.get_encoding("o200k_base")
         elif tokenizer == Tokenizer.TIKTOKEN_P50K_BASE:
@@ -34,22 +46,32 @@ class UsageTokenizer:
             self.tokenizer = tiktoken.get_encoding("gpt2")
 
     def get_prompt_tokens(self, endpoint: str, body: dict) -> int:
+        """
+        Get the prompt tokens for the given endpoint and body. The token counts are memoized per content in the request context, so that a prompt
+        counted by the access controller, the model router and the model client is tokenized once per request. When the content of a message
+        changes (e.g. augmented by the retrieval augmentation generation), only this message is tokenized again. Across requests, the token counts
+        are cached by content hash if the cache is enabled, so that the messages of a conversation sent in the previous turns are not tokenized again.
+
+        Args:
+            endpoint (str): The endpoint to get the prompt tokens for.
+            body (dict): The body of the request.
+        """
         try:
             if endpoint == ENDPOINT__CHAT_COMPLETIONS:
                 contents = [message.get("content") for message in body["messages"] if message.get("content")]
-                prompt_tokens = sum([len(self.tokenizer.encode(content)) for content in contents])
+                prompt_tokens = sum([self._count_tokens(text=content) for content in contents])
 
             elif endpoint == ENDPOINT__EMBEDDINGS:
-                prompt_tokens = sum([len(self.tokenizer.encode(str(input))) for input in body.get("input", [])])
+                prompt_tokens = sum([self._count_tokens(text=str(input)) for input in body.get("input", [])])
 
             elif endpoint == ENDPOINT__RERANK:
-                prompt_tokens = sum([len(self.tokenizer.encode(str(input))) for input in body.get("input", [])])
+                prompt_tokens = sum([self._count_tokens(text=str(input)) for input in body.get("input", [])])
 
             elif endpoint == ENDPOINT__SEARCH:
-                prompt_tokens = len(self.tokenizer.encode(str(body.get("prompt", ""))))
+                prompt_tokens = self._count_tokens(text=str(body.get("prompt", "")))
 
             elif endpoint == ENDPOINT__OCR:
-                prompt_tokens = len(self.tokenizer.encode(str(body.get("prompt", ""))))
+                prompt_tokens = self._count_tokens(text=str(body.get("prompt", "")))
 
             else:
                 raise ValueError(f"Endpoint {endpoint} not supported")
@@ -58,32 +80,52 @@ class UsageTokenizer:
 
         return prompt_tokens
 
-    def get_completion_tokens(self, endpoint: str, response: Union[dict, List[dict]], stream: bool = False) -> int:
+    def _count_tokens(self, text: str) -> int:
+        context = request_context.get()
+        if context.id is None:  # outside of a request
+            return self._encode(text=text)
+
+        if context.token_counts is None:
+            context.token_counts = dict()
+
+        tokens = context.token_counts.get(text)
+        if tokens is None:
+            tokens = context.token_counts[text] = self._encode(text=text)
+
+        return tokens
+
+    def _encode(self, text: str) -> int:
+        if self.cache is None:
+            return len(self.tokenizer.encode(text))
+
+        key = self.cache.get_key(text=text)
+        tokens = self.cache.get(key=key)
+        if tokens is None:
+            tokens = len(self.tokenizer.encode(text))
+            self.cache.set(key=key, tokens=tokens)
+
+        return tokens
+
+    def get_stream_accumulator(self) -> "StreamUsageAccumulator":
+        """
+        Get an accumulator to count the completion tokens of a streamed response as the chunks arrive.
+        """
+        return StreamUsageAccumulator(tokenizer=self)
+
+    def get_completion_tokens(self, endpoint: str, response: Union[dict, "StreamUsageAccumulator"], stream: bool = False) -> int:
         """
         Get the completion tokens for the given endpoint and body.
 
         Args:
             endpoint (str): The endpoint to get the completion tokens for.
-            response (Union[dict, List[dict]]): The response of the request (must be a ChatCompletion or a list of ChatCompletionChunk).
+            response (Union[dict, StreamUsageAccumulator]): The response of the request (must be a ChatCompletion or, if stream, the accumulator fed with the chunks of the stream).
             stream (bool): Whether the request is a stream.
         """
         completion_tokens = 0
 
         if endpoint == ENDPOINT__CHAT_COMPLETIONS:
             if stream:
-                contents = dict()
-                for chunk in response:
-                    chunk = ChatCompletionChunk(**chunk)
-                    for choice in chunk.choices:
-                        index = choice.index
-                        delta = choice.delta
-                        if index not in contents:
-                            contents[index] = ""
-                        content = delta.content
-                        if content:
-                            contents[index] += content
-
-                completion_tokens = sum([len(self.tokenizer.encode(contents[index])) for index in contents.keys()])
+                completion_tokens = response.completion_tokens
 
             else:
                 response = ChatCompletion(**response)
@@ -98,3 +140,130 @@ class UsageTokenizer:
             raise ValueError(f"Endpoint {endpoint} not supported")
 
         return completion_tokens
+
+
+class TokenCountsCache:
+    """
+    Bounded LRU cache of the token counts of the contents, keyed by a hash of the content. The cache is bounded by its approximate memory size,
+    the least recently used token counts are evicted first. Hits and misses are exposed as Prometheus metrics to follow the hit rate.
+    """
+
+    ENTRY_SIZE = 200  # approximate memory size of an entry: hash of the content, token count and node of the ordered dict
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._counts: OrderedDict[bytes, int] = OrderedDict()
+
+    @staticmethod
+    def get_key(text: str) -> bytes:
+        """
+        Get the key of a content in the cache.
+
+        Args:
+            text(str): The content.
+
+        Returns:
+            bytes: The hash of the content.
+        """
+        return hashlib.blake2b(text.encode("utf-8", errors="replace"), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[int]:
+        """
+        Get the token count of a content.
+
+        Args:
+            key(bytes): The key of the content returned by get_key.
+
+        Returns:
+            Optional[int]: The token count of the content, None if not in the cache.
+        """
+        tokens = self._counts.get(key)
+        if tokens is None:
+            self.misses += 1
+            usage_tokenizer_cache_misses.inc()
+            return None
+
+        self._counts.move_to_end(key)
+        self.hits += 1
+        usage_tokenizer_cache_hits.inc()
+
+        return tokens
+
+    def set(self, key: bytes, tokens: int) -> None:
+        """
+        Cache the token count of a content, evicting the least recently used token counts if the cache is full.
+
+        Args:
+            key(bytes): The key of the content returned by get_key.
+            tokens(int): The token count of the content.
+        """
+        if key not in self._counts:
+            self.size += self.ENTRY_SIZE
+        self._counts[key] = tokens
+        self._counts.move_to_end(key)
+
+        while self.size > self.max_bytes and self._counts:
+            self._counts.popitem(last=False)
+            self.size -= self.ENTRY_SIZE
+
+        usage_tokenizer_cache_size_bytes.set(self.size)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+
+        return self.hits / total if total else 0.0
+
+
+class StreamUsageAccumulator:
+    """
+    Count the completion tokens of a streamed chat completion incrementally, per choice, as the content deltas arrive. The stream is never
+    buffered: only the first chunk ID, the last chunk (to conserve the chunk structure) and a token count per choice are kept.
+
+    If the model sends its own usage in the stream (e.g. vLLM with `stream_options.include_usage`), its completion tokens are trusted.
+    """
+
+    def __init__(self, tokenizer: UsageTokenizer) -> None:
+        self.tokenizer = tokenizer
+        self.id = None
+        self.last_chunk = None
+        self.upstream_usage = None
+        self.choices_completion_tokens: Dict[int, int] = dict()
+
+    def add(self, chunk: dict) -> int:
+        """
+        Add a chunk of the stream to the accumulator.
+
+        Args:
+            chunk(dict): The decoded chunk (ChatCompletionChunk format).
+
+        Returns:
+            int: The number of completion tokens of the content deltas of the chunk.
+        """
+        self.id = chunk.get("id") if self.id is None else self.id
+        self.last_chunk = chunk
+
+        if chunk.get("usage"):
+            self.upstream_usage = chunk["usage"]
+
+        completion_tokens = 0
+        for choice in chunk.get("choices") or []:
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                tokens = len(self.tokenizer.tokenizer.encode(content))
+                index = choice.get("index", 0)
+                self.choices_completion_tokens[index] = self.choices_completion_tokens.get(index, 0) + tokens
+                completion_tokens += tokens
+
+        return completion_tokens
+
+    @property
+    def completion_tokens(self) -> int:
+        upstream_completion_tokens: Optional[int] = self.upstream_usage.get("completion_tokens") if self.upstream_usage else None
+        if upstream_completion_tokens is not None:
+            return upstream_completion_tokens
+
+        return sum(self.choices_completion_tokens.values())
@@ -46,8 +46,8 @@ Ne donne pas d'explications, ne mets pas de guillemets, réponds uniquement avec
 
     async def get_web_query(self, prompt: str) -> str:
         prompt = self.GET_WEB_QUERY_PROMPT.format(prompt=prompt)
-        client = self.query_model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
-        response = await client.forward_request(
+        response = await self.query_model.forward_request(
+            endpoint=ENDPOINT__CHAT_COMPLETIONS,
             method="POST",
             json={"messages": [{"role": "user", "content": prompt}], "model": self.query_model.name, "temperature": 0.2, "stream": False},
         )
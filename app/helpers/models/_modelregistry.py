@@ -12,14 +12,23 @@ class ModelRegistry:
         self.aliases = dict()
 
         for model in routers:
-            if "name" not in model.__dict__:  # no clients available
-                continue
+            self.add_router(router=model)
 
-            self.__dict__[model.name] = model
-            self.models.append(model.name)
+    def add_router(self, router: ModelRouter) -> None:
+        """
+        Add a model to the registry.
 
-            for alias in model.aliases:
-                self.aliases[alias] = model.name
+        Args:
+            router(ModelRouter): The model to add.
+        """
+        if "name" not in router.__dict__:  # no clients available
+            return
+
+        self.__dict__[router.name] = router
+        self.models.append(router.name)
+
+        for alias in router.aliases:
+            self.aliases[alias] = router.name
 
     def __call__(self, model: str) -> ModelRouter:
         model = self.aliases.get(model, model)
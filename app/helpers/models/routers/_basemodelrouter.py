@@ -1,4 +1,5 @@
-from abc import ABC, abstractmethod
+from abc import ABC
+import asyncio
 from itertools import cycle
 import time
 
@@ -15,9 +16,31 @@ class BaseModelRouter(ABC):
         aliases: list[str],
         routing_strategy: str,
         providers: list[ModelClient],
+        max_retries: int = 1,
+        retry_backoff: float = 0.1,
         *args,
         **kwargs,
     ) -> None:
+        # set attributes of the model (returned by /v1/models endpoint)
+        self.name = name
+        self.type = type
+        self.owned_by = owned_by
+        self.created = round(time.time())
+        self.aliases = aliases
+
+        self._routing_strategy = routing_strategy
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._latencies = dict()
+        self._set_providers(providers=providers)
+
+    def _set_providers(self, providers: list[ModelClient]) -> None:
+        """
+        Set the providers of the model and the attributes computed from them.
+
+        Args:
+            providers(list[ModelClient]): The providers of the model.
+        """
         vector_sizes, max_context_lengths, costs_prompt_tokens, costs_completion_tokens = list(), list(), list(), list()
 
         for provider in providers:
@@ -29,7 +52,8 @@ class BaseModelRouter(ABC):
         # consistency checks
         assert len(set(vector_sizes)) < 2, "All embeddings models in the same model group must have the same vector size."
 
-        # if there are several models with different max_context_length, it will return the minimal value for consistency of /v1/models response
+        # if there are several models with different max_context_length, it will return the minimal value for consistency of /v1/models response,
+        # the max_context_length of each provider is used by the router to route long requests to the providers that can fit them
         max_context_lengths = [value for value in max_context_lengths if value is not None]
         max_context_length = min(max_context_lengths) if max_context_lengths else None
 
@@ -37,30 +61,60 @@ class BaseModelRouter(ABC):
         prompt_tokens = max(costs_prompt_tokens)
         completion_tokens = max(costs_completion_tokens)
 
-        # set attributes of the model (returned by /v1/models endpoint)
-        self.name = name
-        self.type = type
-        self.owned_by = owned_by
-        self.created = round(time.time())
-        self.aliases = aliases
+        # embeddings and rerank requests are split into sub-batches that fit in all the providers, since any provider may serve a sub-batch
+        max_batch_sizes = [provider.max_batch_size for provider in providers if provider.max_batch_size is not None]
+
         self.max_context_length = max_context_length
         self.cost_prompt_tokens = prompt_tokens
         self.cost_completion_tokens = completion_tokens
 
         self._vector_size = vector_sizes[0]
-        self._routing_strategy = routing_strategy
+        self._max_batch_size = min(max_batch_sizes) if max_batch_sizes else None
         self._cycle = cycle(providers)
         self._providers = providers
 
-    @abstractmethod
-    def get_client(self, endpoint: str) -> ModelClient:
+    def add_provider(self, provider: ModelClient) -> None:
+        """
+        Add a provider to the model, for providers available after the creation of the model.
+
+        Args:
+            provider(ModelClient): The provider to add.
+        """
+        self._set_providers(providers=self._providers + [provider])
+
+    async def check(self, timeout: float) -> None:
+        """
+        Check the health of the model providers concurrently, the results are recorded in their circuit breakers.
+
+        Args:
+            timeout(float): The timeout of the health checks in seconds.
+        """
+        await asyncio.gather(*[provider.check(timeout=timeout) for provider in self._providers])
+
+    async def refresh_latencies(self) -> None:
         """
-        Get a client to handle the request
+        Refresh the recent latencies of the model providers from the metrics stored in Redis. For text generation models, the time to first token is
+        used since the latency depends on the number of generated tokens.
+        """
+        metric = "time_to_first_token" if self.type in [ModelType.TEXT_GENERATION, ModelType.IMAGE_TEXT_TO_TEXT] else "latency"
+        providers = self._providers
+        latencies = await asyncio.gather(*[provider.get_latency(metric=metric) for provider in providers])
+
+        self._latencies = dict(zip(providers, latencies))
+
+    async def share_inflight_requests(self, worker_id: str, ttl: int) -> None:
+        """
+        Share the in-flight requests of the model providers with the other API workers through Redis.
 
         Args:
-            endpoint(str): The type of endpoint called
+            worker_id(str): The unique identifier of the worker.
+            ttl(int): The time to live of the counters in seconds.
+        """
+        await asyncio.gather(*[provider.share_inflight_requests(worker_id=worker_id, ttl=ttl) for provider in self._providers])
 
-        Returns:
-            BaseModelClient: The available client
+    async def close(self) -> None:
+        """
+        Close the connection pools of the model providers.
         """
-        pass
+        for provider in self._providers:
+            await provider.close()
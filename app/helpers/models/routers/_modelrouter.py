@@ -1,21 +1,93 @@
+import asyncio
+from functools import partial
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+import httpx
+import orjson
+
 from app.clients.model import BaseModelClient as ModelClient
-from app.helpers.models.routers.strategies import RoundRobinRoutingStrategy, ShuffleRoutingStrategy
+from app.helpers._admissioncontroller import AdmissionController
+from app.helpers._embeddingsbatcher import EmbeddingsBatcher
+from app.helpers._responsecache import ChatCompletionStreamBuilder, ResponseCache
+from app.helpers._serversenteventsparser import ServerSentEventsParser
+from app.helpers.models.routers.strategies import LatencyRoutingStrategy, LeastBusyRoutingStrategy, RoundRobinRoutingStrategy, ShuffleRoutingStrategy
 from app.schemas.core.configuration import RoutingStrategy
 from app.schemas.models import ModelType
-from app.utils.exceptions import WrongModelTypeException
-from app.utils.variables import ENDPOINT__AUDIO_TRANSCRIPTIONS, ENDPOINT__CHAT_COMPLETIONS, ENDPOINT__EMBEDDINGS, ENDPOINT__OCR, ENDPOINT__RERANK
+from app.schemas.usage import Detail, Usage
+from app.utils.context import generate_request_id, global_context, request_context
+from app.utils.exceptions import ContextLengthExceededException, WrongModelTypeException
+from app.utils.variables import (
+    ENDPOINT__AUDIO_TRANSCRIPTIONS,
+    ENDPOINT__CHAT_COMPLETIONS,
+    ENDPOINT__COMPLETIONS,
+    ENDPOINT__EMBEDDINGS,
+    ENDPOINT__OCR,
+    ENDPOINT__RERANK,
+)
 
 from ._basemodelrouter import BaseModelRouter
 
+logger = logging.getLogger(__name__)
+
+
+class ModelStream:
+    """
+    Stream of a request forwarded to a provider of a model, as (chunk, status code) tuples. The provider is chosen when the first chunk is read, then
+    the stream of the provider is exposed as `provider_stream`, so that the next chunks can be read from it without another layer per chunk. Closing
+    the stream closes the stream of the provider and releases the provider.
+    """
+
+    def __init__(self, router: "ModelRouter", **kwargs) -> None:
+        self.provider_stream: Optional[AsyncIterator[Tuple[bytes, int]]] = None
+        self._router = router
+        self._kwargs = kwargs
+        self._client: Optional[ModelClient] = None
+        self._opened = False
+
+    def __aiter__(self) -> "ModelStream":
+        return self
+
+    async def __anext__(self) -> Tuple[bytes, int]:
+        if not self._opened:
+            self._opened = True
+            opened = await self._router._open_stream(**self._kwargs)
+            if opened is None:
+                raise StopAsyncIteration
+            chunk, self.provider_stream, self._client = opened
+            return chunk
+
+        if self.provider_stream is None:
+            raise StopAsyncIteration
+        try:
+            return await anext(self.provider_stream)
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def aclose(self) -> None:
+        self._opened = True
+        if self.provider_stream is not None:
+            stream, self.provider_stream = self.provider_stream, None
+            try:
+                await stream.aclose()
+            finally:
+                self._router._release_client(client=self._client)
+
 
 class ModelRouter(BaseModelRouter):
     ENDPOINT_MODEL_TYPE_TABLE = {
         ENDPOINT__AUDIO_TRANSCRIPTIONS: [ModelType.AUTOMATIC_SPEECH_RECOGNITION],
         ENDPOINT__CHAT_COMPLETIONS: [ModelType.TEXT_GENERATION, ModelType.IMAGE_TEXT_TO_TEXT],
+        ENDPOINT__COMPLETIONS: [ModelType.TEXT_GENERATION],
         ENDPOINT__EMBEDDINGS: [ModelType.TEXT_EMBEDDINGS_INFERENCE],
         ENDPOINT__OCR: [ModelType.IMAGE_TEXT_TO_TEXT],
         ENDPOINT__RERANK: [ModelType.TEXT_CLASSIFICATION],
     }
+    RETRY_STATUS_CODES = [500, 502, 503, 504]
 
     def __init__(
         self,
@@ -25,21 +97,557 @@ class ModelRouter(BaseModelRouter):
         aliases: list[str],
         routing_strategy: str,
         providers: list[ModelClient],
+        max_retries: int = 1,
+        retry_backoff: float = 0.1,
+        embeddings_batch_size: Optional[int] = None,
+        embeddings_batch_wait: float = 0.005,
+        queue_size: int = 100,
+        queue_timeout: float = 30.0,
+        queue_priorities: Optional[Dict[str, int]] = None,
         *args,
         **kwargs,
     ) -> None:
-        super().__init__(name=name, type=type, owned_by=owned_by, aliases=aliases, routing_strategy=routing_strategy, providers=providers)
+        super().__init__(
+            name=name,
+            type=type,
+            owned_by=owned_by,
+            aliases=aliases,
+            routing_strategy=routing_strategy,
+            providers=providers,
+            max_retries=max_retries,
+            retry_backoff=retry_backoff,
+        )
+
+        # requests wait in the queue of the model if all the providers have reached their maximum number of concurrent requests
+        self._admission_controller = AdmissionController(name=name, queue_size=queue_size, queue_timeout=queue_timeout, priorities=queue_priorities or {})  # fmt: off
+
+        # concurrent embeddings requests are sent to the providers in batches
+        self._embeddings_batcher = None
+        if embeddings_batch_size and self.type == ModelType.TEXT_EMBEDDINGS_INFERENCE:
+            self._embeddings_batcher = EmbeddingsBatcher(forward_request=self._forward_split_request, max_size=embeddings_batch_size, max_wait=embeddings_batch_wait)  # fmt: off
+
+    async def _acquire_client(self, endpoint: str, exclude: Optional[List[ModelClient]] = None, context_length: Optional[int] = None) -> ModelClient:
+        """
+        Get a provider of the model for a request through the admission controller: the request waits in the queue of the model if all the providers
+        have reached their maximum number of concurrent requests. _release_client must be called when the request is finished.
+
+        Args:
+            endpoint(str): The type of endpoint called.
+            exclude(Optional[List[ModelClient]]): The providers that already failed for the request.
+            context_length(Optional[int]): The context length required by the request.
 
-    def get_client(self, endpoint: str) -> ModelClient:
+        Returns:
+            ModelClient: The provider to send the request to.
+        """
+        providers = self._get_providers(endpoint=endpoint, exclude=exclude, context_length=context_length)
+        priority = self._admission_controller.get_priority(role=request_context.get().role_name)
+        client = await self._admission_controller.acquire(providers=providers, priority=priority, choose=self._choose_client)
+        client.circuit_breaker.acquire()
+        client.endpoint = endpoint
+
+        return client
+
+    def _release_client(self, client: ModelClient) -> None:
+        self._admission_controller.release(client=client)
+
+    def _get_providers(self, endpoint: str, exclude: Optional[List[ModelClient]] = None, context_length: Optional[int] = None) -> List[ModelClient]:
         if endpoint and self.type not in self.ENDPOINT_MODEL_TYPE_TABLE[endpoint]:
             raise WrongModelTypeException()
 
+        # providers with a context too short for the request are never used
+        providers = self._providers
+        if context_length:
+            providers = [provider for provider in providers if provider.max_context_length is None or provider.max_context_length >= context_length]
+
+        # providers ejected by their circuit breaker are skipped, unless all providers are ejected
+        providers = [provider for provider in providers if provider.circuit_breaker.is_available()] or providers
+
+        # providers that already failed for the request are skipped, unless there is no other provider
+        if exclude:
+            providers = [provider for provider in providers if provider not in exclude] or providers
+
+        return providers
+
+    def _choose_client(self, providers: List[ModelClient]) -> ModelClient:
         if self._routing_strategy == RoutingStrategy.ROUND_ROBIN:
-            strategy = RoundRobinRoutingStrategy(self._providers, self._cycle)
+            strategy = RoundRobinRoutingStrategy(providers, self._cycle)
+        elif self._routing_strategy == RoutingStrategy.LATENCY:
+            strategy = LatencyRoutingStrategy(providers, self._latencies)
+        elif self._routing_strategy == RoutingStrategy.LEAST_BUSY:
+            strategy = LeastBusyRoutingStrategy(providers)
         else:  # ROUTER_STRATEGY__SHUFFLE
-            strategy = ShuffleRoutingStrategy(self._providers)
+            strategy = ShuffleRoutingStrategy(providers)
 
-        client = strategy.choose_model_client()
-        client.endpoint = endpoint
+        return strategy.choose_model_client()
 
-        return client
+    def _get_context_length(self, endpoint: str, json: Optional[dict]) -> Optional[int]:
+        """
+        Get the context length required by a chat completions request: the tokens of the prompt and the maximum number of completion tokens.
+
+        Args:
+            endpoint(str): The type of endpoint called.
+            json(Optional[dict]): The JSON body of the request.
+
+        Returns:
+            Optional[int]: The context length required by the request, None if it is not a chat completions request or if the context lengths of the
+            providers are unknown.
+        """
+        if endpoint != ENDPOINT__CHAT_COMPLETIONS or not json:
+            return None
+
+        max_context_lengths = [provider.max_context_length for provider in self._providers]
+        if all(max_context_length is None for max_context_length in max_context_lengths):
+            return None
+
+        prompt_tokens = global_context.tokenizer.get_prompt_tokens(endpoint=endpoint, body=json)
+        context_length = prompt_tokens + (json.get("max_completion_tokens") or json.get("max_tokens") or 0)
+
+        # the request is rejected before being sent to a provider if it does not fit in any of them
+        if None not in max_context_lengths and context_length > max(max_context_lengths):
+            detail = f"Prompt ({prompt_tokens} tokens) and max completion tokens exceed the maximum context length of the model ({max(max_context_lengths)} tokens)."  # fmt: off
+            raise ContextLengthExceededException(detail=detail)
+
+        return context_length
+
+    async def _wait_before_retry(self, client: ModelClient, status_code: int, attempt: int) -> None:
+        logger.warning(f"Request to model provider {client.name} ({client.url}) failed ({status_code}), retry {attempt + 1}/{self._max_retries}.")
+        await asyncio.sleep(random.uniform(0, self._retry_backoff * 2**attempt))
+
+    async def forward_request(
+        self,
+        endpoint: str,
+        method: str,
+        json: Optional[dict] = None,
+        files: Optional[dict] = None,
+        data: Optional[dict] = None,
+        additional_data: Dict[str, Any] = None,
+    ) -> httpx.Response:
+        """
+        Forward a request to a provider of the model. If the provider fails (timeout, connection error or server error), the request is retried on
+        another provider, up to the maximum number of retries of the model. Usage and metrics are computed by the provider that served the request.
+
+        Embeddings requests go through the embeddings cache and the embeddings batcher and chat completions requests through the response and semantic
+        caches, if enabled. Embeddings and rerank requests with more inputs than the maximum batch size of the providers are split into sub-batches.
+        Identical embeddings and deterministic chat completions requests in flight are coalesced into a single request, if enabled.
+
+        Args:
+            endpoint(str): The type of endpoint called.
+            method(str): The method to use for the request.
+            json(Optional[dict]): The JSON body to use for the request.
+            files(Optional[dict]): The files to use for the request.
+            data(Optional[dict]): The data to use for the request.
+            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
+
+        Returns:
+            httpx.Response: The response from the API.
+        """
+        if endpoint == ENDPOINT__EMBEDDINGS and global_context.embeddings_cache is not None and json:
+            return await self._forward_embeddings_request(method=method, json=json, additional_data=additional_data)
+
+        if endpoint == ENDPOINT__EMBEDDINGS and json:
+            return await self._forward_embeddings(method=method, json=json, additional_data=additional_data)
+
+        if endpoint == ENDPOINT__RERANK and json:
+            return await self._forward_split_request(endpoint=endpoint, method=method, json=json, additional_data=additional_data)
+
+        if endpoint == ENDPOINT__CHAT_COMPLETIONS and json:
+            key, prompt = self._get_cache_keys(json=json, additional_data=additional_data)
+            if key or prompt:
+                return await self._forward_cached_request(method=method, json=json, key=key, prompt=prompt, additional_data=additional_data)
+
+        return await self._forward_request(endpoint=endpoint, method=method, json=json, files=files, data=data, additional_data=additional_data)
+
+    async def _forward_request(
+        self,
+        endpoint: str,
+        method: str,
+        json: Optional[dict] = None,
+        files: Optional[dict] = None,
+        data: Optional[dict] = None,
+        additional_data: Dict[str, Any] = None,
+    ) -> httpx.Response:
+        # concurrent identical requests share a single request to a provider
+        coalescer = global_context.request_coalescer
+        key = coalescer.get_key(model=self.name, endpoint=endpoint, json=json) if coalescer is not None and json and not files and not data else None
+        if key:
+            forward_request = partial(self._forward_retried_request, endpoint=endpoint, method=method, json=json)
+            return await coalescer.forward(model=self.name, endpoint=endpoint, key=key, forward_request=forward_request, additional_data=additional_data)  # fmt: off
+
+        return await self._forward_retried_request(
+            endpoint=endpoint, method=method, json=json, files=files, data=data, additional_data=additional_data
+        )
+
+    async def _forward_retried_request(
+        self,
+        endpoint: str,
+        method: str,
+        json: Optional[dict] = None,
+        files: Optional[dict] = None,
+        data: Optional[dict] = None,
+        additional_data: Dict[str, Any] = None,
+    ) -> httpx.Response:
+        context_length = self._get_context_length(endpoint=endpoint, json=json)
+        failed_clients = list()
+        for attempt in range(self._max_retries + 1):
+            client = await self._acquire_client(endpoint=endpoint, exclude=failed_clients, context_length=context_length)
+            try:
+                return await client.forward_request(method=method, json=json, files=files, data=data, additional_data=additional_data)
+            except HTTPException as e:
+                if e.status_code not in self.RETRY_STATUS_CODES or attempt == self._max_retries:
+                    raise
+                failed_clients.append(client)
+                status_code = e.status_code
+            finally:
+                self._release_client(client=client)
+
+            await self._wait_before_retry(client=client, status_code=status_code, attempt=attempt)
+
+    async def _forward_embeddings(self, method: str, json: dict, additional_data: Dict[str, Any] = None) -> httpx.Response:
+        if self._embeddings_batcher is not None:
+            return await self._embeddings_batcher.submit(method=method, json=json, additional_data=additional_data)
+
+        return await self._forward_split_request(endpoint=ENDPOINT__EMBEDDINGS, method=method, json=json, additional_data=additional_data)
+
+    async def _forward_split_request(self, endpoint: str, method: str, json: dict, additional_data: Dict[str, Any] = None) -> httpx.Response:
+        """
+        Forward an embeddings or rerank request, split into sub-batches if it has more inputs than the maximum batch size of the providers of the
+        model. The sub-batches are sent in parallel, as many at a time as there are providers, and their results are reassembled in the order of
+        the inputs with the usage of all the sub-batches.
+
+        Args:
+            endpoint(str): The type of endpoint called.
+            method(str): The method to use for the request.
+            json(dict): The JSON body of the embeddings or rerank request.
+            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
+
+        Returns:
+            httpx.Response: The response of the request.
+        """
+        inputs = json.get("input")
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        batch_size = self._max_batch_size
+        if batch_size is None or not inputs or len(inputs) <= batch_size:
+            return await self._forward_request(endpoint=endpoint, method=method, json=json, additional_data=additional_data)
+
+        semaphore = asyncio.Semaphore(len(self._providers))
+
+        async def forward(start: int) -> Tuple[dict, list]:
+            async with semaphore:
+                response = await self._forward_request(endpoint=endpoint, method=method, json={**json, "input": inputs[start : start + batch_size]})
+            data = orjson.loads(response.content)
+            return data, [{**item, "index": item["index"] + start} for item in data["data"]]
+
+        # the usage of each sub-batch is added to the usage of the request by the provider that served it
+        tasks = [asyncio.create_task(forward(start=start)) for start in range(0, len(inputs), batch_size)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        items = [item for _, batch_items in results for item in batch_items]
+        if endpoint == ENDPOINT__RERANK:
+            items.sort(key=lambda item: item["score"], reverse=True)
+        else:
+            items.sort(key=lambda item: item["index"])
+
+        data = {**results[0][0], "id": generate_request_id(), "data": items}
+        data.pop("usage", None)
+        usage = request_context.get().usage
+        if usage is not None:
+            data["usage"] = usage.model_dump()
+        data.update(additional_data or {})
+
+        return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
+
+    async def _forward_embeddings_request(self, method: str, json: dict, additional_data: Dict[str, Any] = None) -> httpx.Response:
+        """
+        Forward an embeddings request through the embeddings cache: only the inputs not found in the cache are sent to a provider of the model, in a
+        single request, and the embeddings are merged back in the order of the inputs. Cached inputs are not counted in the usage since they are not
+        sent to a provider.
+
+        Args:
+            method(str): The method to use for the request.
+            json(dict): The JSON body of the embeddings request.
+            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
+
+        Returns:
+            httpx.Response: The embeddings response.
+        """
+        if self.type not in self.ENDPOINT_MODEL_TYPE_TABLE[ENDPOINT__EMBEDDINGS]:
+            raise WrongModelTypeException()
+
+        cache = global_context.embeddings_cache
+        inputs = json["input"]
+        if isinstance(inputs, str) or isinstance(inputs[0], int):
+            inputs = [inputs]
+
+        keys = [cache.get_key(model=self.name, input=input, encoding_format=json.get("encoding_format"), dimensions=json.get("dimensions")) for input in inputs]  # fmt: off
+        embeddings = {key: embedding for key, embedding in zip(keys, await cache.get(model=self.name, keys=keys)) if embedding is not None}
+
+        # inputs not found in the cache, duplicated inputs are sent once
+        missing = {key: input for key, input in zip(keys, inputs) if key not in embeddings}
+
+        if missing:
+            response = await self._forward_embeddings(method=method, json={**json, "input": list(missing.values())}, additional_data=additional_data)
+            data = orjson.loads(response.content)
+            created = [item["embedding"] for item in sorted(data["data"], key=lambda item: item["index"])]
+            await cache.set(keys=list(missing), embeddings=created)
+            embeddings.update(zip(missing, created))
+        else:
+            usage = request_context.get().usage
+            data = {"object": "list", "model": self.name, "id": generate_request_id()}
+            if usage:
+                data["usage"] = usage.model_dump()
+            data.update(additional_data or {})
+
+        data["data"] = [{"object": "embedding", "index": i, "embedding": embeddings[key]} for i, key in enumerate(keys)]
+
+        return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
+
+    def forward_stream(
+        self,
+        endpoint: str,
+        method: str,
+        json: Optional[dict] = None,
+        files: Optional[dict] = None,
+        data: Optional[dict] = None,
+        additional_data: Dict[str, Any] = None,
+    ) -> AsyncIterator[Tuple[bytes, int]]:
+        """
+        Forward a stream request to a provider of the model. If the provider fails before sending the first chunk (timeout, connection error or server
+        error), the request is retried on another provider, up to the maximum number of retries of the model. Once the first chunk is sent to the
+        user, the stream is not retried anymore.
+
+        Chat completions requests go through the response and semantic caches if enabled, cached completions are replayed as a stream.
+
+        Args:
+            endpoint(str): The type of endpoint called.
+            method(str): The method to use for the request.
+            json(Optional[dict]): The JSON body to use for the request.
+            files(Optional[dict]): The files to use for the request.
+            data(Optional[dict]): The data to use for the request.
+            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
+        """
+        if endpoint == ENDPOINT__CHAT_COMPLETIONS and json:
+            key, prompt = self._get_cache_keys(json=json, additional_data=additional_data)
+            if key or prompt:
+                return self._forward_cached_stream(method=method, json=json, key=key, prompt=prompt, additional_data=additional_data)
+
+        return ModelStream(router=self, endpoint=endpoint, method=method, json=json, files=files, data=data, additional_data=additional_data)
+
+    async def _open_stream(
+        self,
+        endpoint: str,
+        method: str,
+        json: Optional[dict] = None,
+        files: Optional[dict] = None,
+        data: Optional[dict] = None,
+        additional_data: Dict[str, Any] = None,
+    ) -> Optional[Tuple[Tuple[bytes, int], AsyncIterator[Tuple[bytes, int]], ModelClient]]:
+        """
+        Open a stream on a provider of the model and read its first chunk. If the provider fails before sending it, the request is retried on another
+        provider, up to the maximum number of retries of the model.
+
+        Returns:
+            Optional[Tuple[Tuple[bytes, int], AsyncIterator[Tuple[bytes, int]], ModelClient]]: The first chunk, the stream of the provider and the
+            provider, which must be released when the stream is closed. None if the stream is empty.
+        """
+        context_length = self._get_context_length(endpoint=endpoint, json=json)
+        failed_clients = list()
+        for attempt in range(self._max_retries + 1):
+            client = await self._acquire_client(endpoint=endpoint, exclude=failed_clients, context_length=context_length)
+            stream = client.forward_stream(method=method, json=json, files=files, data=data, additional_data=additional_data)
+            try:
+                chunk, status_code = await anext(stream, (None, None))
+                if chunk is not None and (status_code not in self.RETRY_STATUS_CODES or attempt == self._max_retries):
+                    return (chunk, status_code), stream, client
+            except BaseException:
+                await stream.aclose()
+                self._release_client(client=client)
+                raise
+
+            await stream.aclose()
+            self._release_client(client=client)
+            if chunk is None:
+                return None
+
+            failed_clients.append(client)
+            await self._wait_before_retry(client=client, status_code=status_code, attempt=attempt)
+
+    def _get_cache_keys(self, json: dict, additional_data: Dict[str, Any] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Get the keys of a chat completions request in the response cache and in the semantic cache. The semantic cache is shared by all the users, so
+        the requests augmented with search results are not cached in it: the prompt contains chunks of the collections of the user, and a similar
+        prompt of another user would be answered with them.
+
+        Args:
+            json(dict): The JSON body of the chat completions request.
+            additional_data(Dict[str, Any]): The additional data to add to the response, with the search results of the request if any.
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: The key of the request in the response cache and its prompt in the semantic cache, None if the cache
+            is disabled or if the request is not cacheable.
+        """
+        key = global_context.response_cache.get_key(model=self.name, body=json) if global_context.response_cache else None
+        prompt = None
+        if global_context.semantic_cache and not (additional_data or {}).get("search_results"):
+            prompt = global_context.semantic_cache.get_prompt(model=self.name, body=json)
+
+        return key, prompt
+
+    async def _get_cached_completion(self, json: dict, key: Optional[str], prompt: Optional[str]) -> Tuple[Optional[dict], Optional[list[float]]]:
+        """
+        Look up the completion of a chat completions request in the response cache, then in the semantic cache.
+
+        Args:
+            json(dict): The JSON body of the chat completions request.
+            key(Optional[str]): The key of the request in the response cache.
+            prompt(Optional[str]): The prompt of the request in the semantic cache.
+
+        Returns:
+            Tuple[Optional[dict], Optional[list[float]]]: The cached completion (None if not found) and the vector of the prompt in the semantic cache
+            (None if the completion is found in the response cache).
+        """
+        completion, vector = None, None
+        if key:
+            completion = await global_context.response_cache.get(model=self.name, key=key)
+        if completion is None and prompt:
+            completion, vector = await global_context.semantic_cache.get(model=self.name, body=json, prompt=prompt)
+
+        return completion, vector
+
+    async def _set_cached_completion(self, json: dict, key: Optional[str], vector: Optional[list[float]], completion: dict) -> None:
+        if key:
+            await global_context.response_cache.set(key=key, completion=completion)
+        if vector is not None:
+            # the vector store may be slow to index, the response is not delayed
+            global_context.semantic_cache.add(model=self.name, body=json, vector=vector, completion=completion)
+
+    async def _forward_cached_request(
+        self, method: str, json: dict, key: Optional[str], prompt: Optional[str], additional_data: Dict[str, Any] = None
+    ) -> httpx.Response:
+        """
+        Forward a chat completions request through the response and semantic caches: a cached completion is returned without calling a provider of the
+        model, otherwise the completion of the provider is cached.
+
+        Args:
+            method(str): The method to use for the request.
+            json(dict): The JSON body of the chat completions request.
+            key(Optional[str]): The key of the request in the response cache.
+            prompt(Optional[str]): The prompt of the request in the semantic cache.
+            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
+
+        Returns:
+            httpx.Response: The chat completions response.
+        """
+        if additional_data is None:
+            additional_data = {}
+
+        completion, vector = await self._get_cached_completion(json=json, key=key, prompt=prompt)
+        if completion is None:
+            response = await self._forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method=method, json=json, additional_data=additional_data)
+            completion = {field: value for field, value in orjson.loads(response.content).items() if field not in additional_data}
+            await self._set_cached_completion(json=json, key=key, vector=vector, completion=completion)
+            return response
+
+        data = self._format_cached_completion(completion=completion, json=json if vector is not None else None)
+        data.update(additional_data)
+
+        return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
+
+    async def _forward_cached_stream(
+        self, method: str, json: dict, key: Optional[str], prompt: Optional[str], additional_data: Dict[str, Any] = None
+    ) -> AsyncIterator[Tuple[bytes, int]]:
+        """
+        Forward a chat completions stream request through the response and semantic caches: a cached completion is replayed as a stream without calling
+        a provider of the model, otherwise the completion is rebuilt from the stream of the provider and cached.
+
+        Args:
+            method(str): The method to use for the request.
+            json(dict): The JSON body of the chat completions request.
+            key(Optional[str]): The key of the request in the response cache.
+            prompt(Optional[str]): The prompt of the request in the semantic cache.
+            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
+        """
+        if additional_data is None:
+            additional_data = {}
+
+        completion, vector = await self._get_cached_completion(json=json, key=key, prompt=prompt)
+        if completion is not None:
+            data = self._format_cached_completion(completion=completion, json=json if vector is not None else None)
+            chunks = ResponseCache.get_chunks(completion=data)
+
+            # extra chunk with usage data, as sent at the end of the streams of the providers
+            extra_chunk = {**chunks[-1], "choices": []}
+            if "usage" in data:
+                extra_chunk["usage"] = data["usage"]
+            extra_chunk.update(additional_data)
+
+            yield b"".join(b"data: " + orjson.dumps(chunk) + b"\n\n" for chunk in chunks + [extra_chunk]) + b"data: [DONE]\n\n", 200
+            return
+
+        parser, builder, cacheable = ServerSentEventsParser(), ChatCompletionStreamBuilder(), True
+        stream = ModelStream(router=self, endpoint=ENDPOINT__CHAT_COMPLETIONS, method=method, json=json, additional_data=additional_data)
+        try:
+            async for chunk, status_code in stream:
+                if status_code != 200:
+                    cacheable = False
+                if cacheable:
+                    for event in parser.feed(chunk=chunk):
+                        event_data = parser.get_data(event=event)
+                        if event_data and event_data != b"[DONE]":
+                            try:
+                                builder.add(chunk=orjson.loads(event_data))
+                            except orjson.JSONDecodeError:
+                                pass
+                yield chunk, status_code
+        finally:
+            await stream.aclose()
+
+        completion = builder.get_completion() if cacheable else None
+        if completion is not None:
+            await self._set_cached_completion(json=json, key=key, vector=vector, completion=completion)
+
+    def _format_cached_completion(self, completion: dict, json: Optional[dict] = None) -> dict:
+        """
+        Prepare a cached chat completion to be returned: tokens and cost of the original completion are added to the usage of the request, as if the
+        completion was created again, but not its carbon footprint since no provider is called. A completion of the semantic cache answers another
+        prompt, so the prompt tokens are those of the request and the cost is computed again from them.
+
+        Args:
+            completion(dict): The cached chat completion.
+            json(Optional[dict]): The JSON body of the request, if the completion was found in the semantic cache.
+
+        Returns:
+            dict: The chat completion with a new ID and the usage of the request.
+        """
+        usage: Optional[Usage] = request_context.get().usage
+        cached_details = completion.get("usage", {}).get("details") or []
+
+        detail = Detail(id=generate_request_id(), model=completion.get("model", self.name))
+        if cached_details:
+            cached_usage = cached_details[-1]["usage"]
+            detail.usage.prompt_tokens = cached_usage["prompt_tokens"]
+            detail.usage.completion_tokens = cached_usage["completion_tokens"]
+            detail.usage.total_tokens = cached_usage["total_tokens"]
+            detail.usage.cost = cached_usage["cost"]
+        if json is not None:
+            detail.usage.prompt_tokens = global_context.tokenizer.get_prompt_tokens(endpoint=ENDPOINT__CHAT_COMPLETIONS, body=json)
+            detail.usage.total_tokens = detail.usage.prompt_tokens + detail.usage.completion_tokens
+            detail.usage.cost = round(detail.usage.prompt_tokens / 1000000 * self.cost_prompt_tokens + detail.usage.completion_tokens / 1000000 * self.cost_completion_tokens, ndigits=6)  # fmt: off
+
+        data = {**completion, "id": detail.id, "created": int(time.time())}
+        data.pop("usage", None)
+        if usage is not None:
+            usage.details.append(detail)
+            usage.prompt_tokens += detail.usage.prompt_tokens
+            usage.completion_tokens += detail.usage.completion_tokens
+            usage.total_tokens += detail.usage.total_tokens
+            usage.cost += detail.usage.cost
+            data["usage"] = usage.model_dump()
+
+        return data
@@ -1,5 +1,7 @@
 from ._baserountingstrategy import BaseRoutingStrategy
+from ._latencyroutingstrategy import LatencyRoutingStrategy
+from ._leastbusyroutingstrategy import LeastBusyRoutingStrategy
 from ._roundrobinroutingstrategy import RoundRobinRoutingStrategy
 from ._shuffleroutingstrategy import ShuffleRoutingStrategy
 
-__all__ = ["BaseRoutingStrategy", "RoundRobinRoutingStrategy", "ShuffleRoutingStrategy"]
+__all__ = ["BaseRoutingStrategy", "LatencyRoutingStrategy", "LeastBusyRoutingStrategy", "RoundRobinRoutingStrategy", "ShuffleRoutingStrategy"]
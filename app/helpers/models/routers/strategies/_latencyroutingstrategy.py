@@ -0,0 +1,25 @@
+import random
+from typing import Dict, List, Optional
+
+from app.clients.model import BaseModelClient as ModelClient
+from app.helpers.models.routers.strategies import BaseRoutingStrategy
+
+
+class LatencyRoutingStrategy(BaseRoutingStrategy):
+    """
+    Power of two choices routing: two clients are drawn at random and the one with the lowest recent latency is chosen. A client without recent latency
+    is preferred, so that it receives traffic to measure its latency.
+    """
+
+    def __init__(self, clients: List[ModelClient], latencies: Dict[ModelClient, Optional[float]]) -> None:
+        super().__init__(clients)
+        self.latencies = latencies
+
+    def choose_model_client(self) -> ModelClient:
+        if len(self.clients) == 1:
+            return self.clients[0]
+
+        clients = random.sample(self.clients, k=2)
+        latencies = [self.latencies.get(client) or 0.0 for client in clients]
+
+        return clients[0] if latencies[0] <= latencies[1] else clients[1]
@@ -0,0 +1,21 @@
+import random
+from typing import List
+
+from app.clients.model import BaseModelClient as ModelClient
+from app.helpers.models.routers.strategies import BaseRoutingStrategy
+
+
+class LeastBusyRoutingStrategy(BaseRoutingStrategy):
+    """
+    Least outstanding requests routing: the client with the fewest in-flight requests is chosen, ties are broken at random. The in-flight requests of
+    the other API workers are counted if they are shared through Redis.
+    """
+
+    def __init__(self, clients: List[ModelClient]) -> None:
+        super().__init__(clients)
+
+    def choose_model_client(self) -> ModelClient:
+        inflight_requests = {client: client.inflight_requests + client.shared_inflight_requests for client in self.clients}
+        minimum = min(inflight_requests.values())
+
+        return random.choice([client for client, value in inflight_requests.items() if value == minimum])
@@ -10,4 +10,7 @@ class RoundRobinRoutingStrategy(BaseRoutingStrategy):
         self.cycle = cycle
 
     def choose_model_client(self) -> ModelClient:
-        return next(self.cycle)
+        # the cycle iterates over all the clients of the model, the clients not in the list are skipped
+        for client in self.cycle:
+            if client in self.clients:
+                return client
@@ -93,6 +93,8 @@ class ModelProviderType(str, Enum):
 
 
 class RoutingStrategy(str, Enum):
+    LATENCY = "latency"
+    LEAST_BUSY = "least_busy"
     ROUND_ROBIN = "round_robin"
     SHUFFLE = "shuffle"
 
@@ -109,6 +111,13 @@ class ModelProvider(ConfigBaseModel):
     url: Optional[constr(strip_whitespace=True, min_length=1)] = Field(default=None, required=False, description="Model provider API url. The url must only contain the domain name (without `/v1` suffix for example). Depends of the model provider type, the url can be optional (Albert, OpenAI).", examples=["https://api.openai.com"])  # fmt: off
     key: Optional[constr(strip_whitespace=True, min_length=1)] = Field(default=None, required=False, description="Model provider API key.", examples=["sk-1234567890"])  # fmt: off
     timeout: int = Field(default=DEFAULT_TIMEOUT, required=False, description="Timeout for the model provider requests, after user receive an 500 error (model is too busy).", examples=[10])  # fmt: off
+    connect_timeout: Optional[int] = Field(default=None, ge=1, required=False, description="Timeout to establish a connection with the model provider. If not provided, the `timeout` value is used.", examples=[5])  # fmt: off
+    max_connections: int = Field(default=100, ge=1, required=False, description="Maximum number of concurrent connections kept in the connection pool of the model provider.", examples=[100])  # fmt: off
+    max_keepalive_connections: int = Field(default=20, ge=0, required=False, description="Maximum number of idle connections kept alive in the connection pool of the model provider.", examples=[20])  # fmt: off
+    keepalive_expiry: float = Field(default=5.0, ge=0.0, required=False, description="Time in seconds after which an idle connection of the model provider connection pool is closed.", examples=[5.0])  # fmt: off
+    http2: bool = Field(default=False, required=False, description="If true, HTTP/2 is used to communicate with the model provider (if supported by the model provider).", examples=[True])  # fmt: off
+    max_batch_size: Optional[int] = Field(default=None, ge=1, required=False, description="Maximum number of inputs sent to the model provider in a single embeddings or rerank request. Larger requests are split into sub-batches of the smallest `max_batch_size` of the providers of the model, sent in parallel to all the providers and reassembled in order. If not provided, the requests are not split for this provider.", examples=[32])  # fmt: off
+    max_concurrent_requests: Optional[int] = Field(default=None, ge=1, required=False, description="Maximum number of concurrent requests sent to the model provider by each worker of the API. Other requests wait in the queue of the model (see `queue_size`). If not provided, the requests are not limited for this provider.", examples=[32])  # fmt: off
     model_name: constr(strip_whitespace=True, min_length=1) = Field(required=True, description="Model name from the model provider.", examples=["gpt-4o"])  # fmt: off
     model_cost_prompt_tokens: float = Field(default=0.0, required=False, ge=0.0, description="Model costs prompt tokens for user budget computation. The cost is by 1M tokens.", examples=[0.1])  # fmt: off
     model_cost_completion_tokens: float = Field(default=0.0, required=False, ge=0.0, description="Model costs completion tokens for user budget computation. The cost is by 1M tokens.", examples=[0.1])  # fmt: off
@@ -156,6 +165,13 @@ class Model(ConfigBaseModel):
     aliases: List[constr(strip_whitespace=True, min_length=1, max_length=64)] = Field(default_factory=list, required=False, description="Aliases of the model. It will be used to identify the model by users.", examples=[["model-alias", "model-alias-2"]])  # fmt: off
     owned_by: constr(strip_whitespace=True, min_length=1, max_length=64) = Field(default=DEFAULT_APP_NAME, required=False, description="Owner of the model displayed in `/v1/models` endpoint.", examples=["my-app"])  # fmt: off
     routing_strategy: RoutingStrategy = Field(default=RoutingStrategy.SHUFFLE, required=False, description="Routing strategy for load balancing between providers of the model. It will be used to identify the model type.", examples=["round_robin"])  # fmt: off
+    max_retries: int = Field(default=1, ge=0, required=False, description="Maximum number of retries of a request on another provider of the model if a provider fails (timeout, connection error or server error). Only embeddings, rerank and chat completions requests are retried, streamed chat completions only if the provider fails before sending the first chunk.", examples=[2])  # fmt: off
+    retry_backoff: float = Field(default=0.1, ge=0.0, required=False, description="Base delay in seconds before retrying a request on another provider. The delay is drawn at random between 0 and `retry_backoff * 2^attempt`.", examples=[0.1])  # fmt: off
+    embeddings_batch_size: Optional[int] = Field(default=None, ge=1, required=False, description="Maximum number of inputs of concurrent embeddings requests sent to a provider in a single request. Inputs are collected during `embeddings_batch_wait` seconds or until this number is reached, then the embeddings are scattered back to each request. Only for `text-embeddings-inference` models, if not provided, the requests are not batched.", examples=[64])  # fmt: off
+    embeddings_batch_wait: float = Field(default=0.005, gt=0.0, required=False, description="Maximum delay in seconds to collect the inputs of concurrent embeddings requests before sending them in a single request. Only used if `embeddings_batch_size` is provided.", examples=[0.005])  # fmt: off
+    queue_size: int = Field(default=100, ge=0, required=False, description="Maximum number of requests waiting for a provider of the model when all the providers have reached their `max_concurrent_requests`. Beyond, requests are rejected with a 429 error and a `Retry-After` header. The queue is counted by each worker of the API.", examples=[100])  # fmt: off
+    queue_timeout: float = Field(default=30.0, gt=0.0, required=False, description="Maximum time in seconds a request waits in the queue of the model before being rejected with a 429 error and a `Retry-After` header.", examples=[30.0])  # fmt: off
+    queue_priorities: Dict[str, int] = Field(default_factory=dict, required=False, description="Priority of the requests of each role (by role name) in the queue of the model, the lower the value, the higher the priority. Roles not listed and internal requests have a priority of 0. For example, give a positive value to the roles used for bulk ingestion so that interactive requests are served first.", examples=[{"ingestion": 10}])  # fmt: off
     providers: List[ModelProvider] = Field(required=True, description="API providers of the model. If there are multiple providers, the model will be load balanced between them according to the routing strategy. The different models have to the same type.")  # fmt: off
 
     @model_validator(mode="after")
@@ -368,12 +384,42 @@ class Tokenizer(str, Enum):
 class Settings(ConfigBaseModel):
     # other
     disabled_routers: List[Routers] = Field(default_factory=list, description="Disabled routers to limits services of the API.", examples=[["agents", "embeddings"]])  # fmt: off
+    validated_routers: List[Routers] = Field(default_factory=list, description="Routers whose model responses are validated against the API schemas before being returned. By default, model responses are returned as is, without being parsed again by the API.", examples=[["embeddings", "rerank"]])  # fmt: off
+
+    # models
+    models_startup_timeout: int = Field(default=60, ge=1, required=False, description="Maximum time in seconds to wait for the model providers at startup. The model providers are checked concurrently, those not available after this delay are added in background as soon as they come up.")  # fmt: off
+    models_cache_ttl: int = Field(default=86400, ge=0, required=False, description="Time to live in seconds of the model provider attributes (vector size, max context length) cached in Redis. At startup, a model provider found in the cache is added immediately and is checked in background: if it is not available, it is ejected by its circuit breaker until a health check succeeds. Set to 0 to disable the cache.")  # fmt: off
+    models_health_check_interval: int = Field(default=10, ge=0, required=False, description="Interval in seconds between two health checks of the model providers. The model providers not available at startup are checked again at each health check and added as soon as they come up. Set to 0 to disable the health checks, the circuit breakers of the model providers are then only fed by the forwarded requests and the model providers not available at startup are not added.")  # fmt: off
+    models_circuit_breaker_failure_rate: float = Field(default=0.5, gt=0.0, le=1.0, required=False, description="Failure rate (timeouts, connection errors and server errors) over the last requests and health checks of a model provider above which the provider is ejected from the routing of its model. If all the providers of a model are ejected, requests are routed to all of them.")  # fmt: off
+    models_circuit_breaker_open_duration: int = Field(default=30, ge=1, required=False, description="Time in seconds during which an ejected model provider does not receive requests, unless a health check succeeds before. After this delay, the provider is re-admitted for trial requests.")  # fmt: off
+    models_circuit_breaker_half_open_requests: int = Field(default=3, ge=1, required=False, description="Number of trial requests routed to an ejected model provider to re-admit it. The provider is re-admitted if all of them succeed, ejected again otherwise.")  # fmt: off
+    models_routing_refresh_interval: int = Field(default=5, ge=1, required=False, description="Interval in seconds between two refreshes of the routing statistics of the model providers: the recent latencies for the `latency` routing strategy, read from the metrics stored in Redis over the `metrics_retention_ms` window, and the in-flight requests of the other API workers for the `least_busy` routing strategy if `models_least_busy_shared` is true.")  # fmt: off
+    models_least_busy_shared: bool = Field(default=False, required=False, description="If true, the in-flight requests of the model providers are shared across the API workers through Redis for the `least_busy` routing strategy. Otherwise, each worker only counts its own in-flight requests.")  # fmt: off
+    models_request_coalescing: bool = Field(default=True, required=False, description="If true, concurrent identical embeddings requests and chat completions requests with a temperature of 0 (not streamed) share a single request to a provider of the model. Each request is still counted in the usage of its user.")  # fmt: off
+
+    # streaming
+    streaming_coalescing_window_ms: int = Field(default=10, ge=0, required=False, description="Time window in milliseconds during which the chunks of a streamed response are merged into a single write to the client, after the first chunk which is sent at once. Chunks are never split, so the server-sent events are sent whole. Set to 0 to send each chunk as soon as it is received.")  # fmt: off
+    streaming_coalescing_max_bytes: int = Field(default=16384, ge=1, required=False, description="Maximum size in bytes of the merged chunks of a streamed response, the merged chunks are sent to the client as soon as this size is reached, before the end of the `streaming_coalescing_window_ms` window.")  # fmt: off
 
     # metrics
     metrics_retention_ms: int = Field(default=40000, ge=1, description="Retention time for metrics in milliseconds.")  # fmt: off
+    metrics_flush_interval_ms: int = Field(default=500, ge=1, required=False, description="Interval in milliseconds between two writes of the buffered performance metrics of the model providers in Redis.")  # fmt: off
+    metrics_flush_batch_size: int = Field(default=1000, ge=1, required=False, description="Maximum number of performance metric points written in Redis in a single command. The buffer is written before the end of the flush interval as soon as this size is reached.")  # fmt: off
+    metrics_buffer_max_size: int = Field(default=10000, ge=1, required=False, description="Maximum number of performance metric points buffered in memory. When the buffer is full, new points are dropped.")  # fmt: off
+
+    # cache
+    embeddings_cache_ttl: int = Field(default=0, ge=0, required=False, description="Time to live in seconds of the embeddings cached in Redis. Embeddings are cached by model and input, only the inputs not found in the cache are sent to the model providers. The inputs served from the cache are not counted in the usage (tokens, cost and carbon footprint) and the budget of the user. Set to 0 to disable the embeddings cache.")  # fmt: off
+    embeddings_cache_max_size: int = Field(default=1000, ge=0, required=False, description="Maximum number of embeddings cached in memory by each API worker, in front of the Redis cache.")  # fmt: off
+    chat_completions_cache_ttl: int = Field(default=0, ge=0, required=False, description="Time to live in seconds of the chat completions cached in Redis. Identical chat completions requests (same model, messages and parameters, streamed or not) with a temperature lower or equal to `chat_completions_cache_max_temperature` are served from the cache, and counted in the usage and the budget of the user as the original completion. Set to 0 to disable the response cache.")  # fmt: off
+    chat_completions_cache_max_temperature: float = Field(default=0.0, ge=0.0, required=False, description="Maximum temperature of the chat completions requests cached by the response cache. Requests without temperature are not cached.")  # fmt: off
+    chat_completions_cache_max_size: int = Field(default=1000000, ge=1, required=False, description="Maximum size in bytes of a chat completion cached by the response cache, larger completions are not cached.")  # fmt: off
+    chat_completions_semantic_cache_models: List[str] = Field(default_factory=list, required=False, description="Models whose chat completions are cached by the semantic cache, requires a vector store. Single-turn requests (system messages and a single user message) are served with the completion of a similar previous user message, if the similarity score is above `chat_completions_semantic_cache_threshold` and if the system prompt and the parameters of the requests are the same. The cache is shared by all the users, requests augmented with search results (`search` parameter) are not cached. The user messages are vectorized with the `vector_store_model`, this request is not counted in the usage of the user.")  # fmt: off
+    chat_completions_semantic_cache_threshold: float = Field(default=0.95, ge=0.0, le=1.0, required=False, description="Minimum similarity score between two user messages to serve a completion from the semantic cache.")  # fmt: off
+    chat_completions_semantic_cache_ttl: int = Field(default=86400, ge=1, required=False, description="Time in seconds during which a completion of the semantic cache can be served. Expired completions are deleted from the vector store in background.")  # fmt: off
 
     # usage tokenizer
     usage_tokenizer: Tokenizer = Field(default=Tokenizer.TIKTOKEN_GPT2, required=False, description="Tokenizer used to compute usage of the API.")  # fmt: off
+    usage_tokenizer_cache_max_bytes: int = Field(default=16777216, ge=0, required=False, description="Maximum memory size in bytes of the cache of the token counts of the messages, by hash of their content. The messages of a conversation sent again at each turn are not tokenized again, the least recently used token counts are evicted first. The hit rate is exposed by the `usage_tokenizer_cache_hits` and `usage_tokenizer_cache_misses` Prometheus metrics. Set to 0 to disable the cache.")  # fmt: off
 
     # logging
     log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = Field(default="INFO", required=False, description="Logging level of the API.")  # fmt: off
@@ -398,12 +444,18 @@ class Settings(ConfigBaseModel):
     # auth
     auth_master_key: constr(strip_whitespace=True, min_length=1) = Field(default="changeme", required=False, description="Master key for the API. This key has all permissions and cannot be modified or deleted. This key is used to create the first role and the first user. This key is also used to encrypt user tokens, watch out if you modify the master key, you'll need to update all user API keys.")  # fmt: off
     auth_max_token_expiration_days: Optional[int] = Field(default=None, ge=1, description="Maximum number of days for a token to be valid.")  # fmt: off
+    auth_budget_flush_interval_ms: int = Field(default=5000, ge=1, required=False, description="Interval in milliseconds between two writes in the PostgreSQL database of the budgets of the users. Budgets are decreased by the cost of the requests in Redis and written back in PostgreSQL in batches, the budgets returned by the users endpoints are read from Redis.")  # fmt: off
+    auth_budget_flush_batch_size: int = Field(default=500, ge=1, required=False, description="Maximum number of user budgets written in the PostgreSQL database in a single UPDATE.")  # fmt: off
 
     # rate_limiting
     rate_limiting_strategy: LimitingStrategy = Field(default=LimitingStrategy.FIXED_WINDOW, required=False, description="Rate limiting strategy for the API.")  # fmt: off
 
     # monitoring
     monitoring_postgres_enabled: bool = Field(default=True, required=False, description="If true, the log usage will be written in the PostgreSQL database.")  # fmt: off
+    monitoring_postgres_flush_interval_ms: int = Field(default=1000, ge=1, required=False, description="Interval in milliseconds between two writes of the buffered usage logs in the PostgreSQL database.")  # fmt: off
+    monitoring_postgres_flush_batch_size: int = Field(default=500, ge=1, required=False, description="Maximum number of usage logs written in the PostgreSQL database in a single INSERT. The buffer is written before the end of the flush interval as soon as this size is reached.")  # fmt: off
+    monitoring_postgres_buffer_max_size: int = Field(default=10000, ge=1, required=False, description="Maximum number of usage logs buffered in memory. When the buffer is full, new usage logs are dropped.")  # fmt: off
+    monitoring_postgres_max_retries: int = Field(default=3, ge=0, required=False, description="Maximum number of retries of a failed write of usage logs in the PostgreSQL database, with an exponential backoff. The usage logs are dropped after the last retry.")  # fmt: off
     monitoring_prometheus_enabled: bool = Field(default=True, required=False, description="If true, Prometheus metrics will be exposed in the `/metrics` endpoint.")  # fmt: off
 
     # vector store
@@ -458,6 +510,11 @@ class ConfigFile(ConfigBaseModel):
             assert values.settings.vector_store_model in models["all"], "Vector store model must be defined in models section."
             assert values.settings.vector_store_model in models[ModelType.TEXT_EMBEDDINGS_INFERENCE.value], f"The vector store model must have type {ModelType.TEXT_EMBEDDINGS_INFERENCE}."  # fmt: off
 
+        if values.settings.chat_completions_semantic_cache_models:
+            assert values.dependencies.vector_store, "Vector store must be defined in dependencies section to use the semantic cache."
+            for model in values.settings.chat_completions_semantic_cache_models:
+                assert model in models[ModelType.IMAGE_TEXT_TO_TEXT.value] + models[ModelType.TEXT_GENERATION.value], f"Semantic cache model {model} must be defined in models section with type {ModelType.TEXT_GENERATION} or {ModelType.IMAGE_TEXT_TO_TEXT}."  # fmt: off
+
         if values.dependencies.web_search_engine:
             assert values.settings.search_web_query_model, "Web search query model must be defined in settings section."
             assert values.settings.search_web_query_model in models["all"], "Web search query model must be defined in models section."
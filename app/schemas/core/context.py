@@ -1,4 +1,4 @@
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 
 from pydantic import BaseModel, ConfigDict
 
@@ -9,12 +9,19 @@ class GlobalContext(BaseModel):
     model_config = ConfigDict(extra="allow")
 
     agent_manager: Optional[Any] = None
+    budget_ledger: Optional[Any] = None
     document_manager: Optional[Any] = None
+    embeddings_cache: Optional[Any] = None
     identity_access_manager: Optional[Any] = None
     limiter: Optional[Any] = None
+    metrics_buffer: Optional[Any] = None
     model_registry: Optional[Any] = None
     parser_manager: Optional[Any] = None
+    request_coalescer: Optional[Any] = None
+    response_cache: Optional[Any] = None
+    semantic_cache: Optional[Any] = None
     tokenizer: Optional[Any] = None
+    usage_buffer: Optional[Any] = None
 
 
 class RequestContext(BaseModel):
@@ -23,8 +30,12 @@ class RequestContext(BaseModel):
     id: Optional[str] = None
     user_id: Optional[int] = None
     role_id: Optional[int] = None
+    role_name: Optional[str] = None
     token_id: Optional[int] = None
     method: Optional[str] = None
     endpoint: Optional[str] = None
     client: Optional[str] = None
     usage: Optional[Usage] = None
+    raw_body: Optional[bytes] = None
+    body: Optional[dict] = None
+    token_counts: Optional[Dict[str, int]] = None
@@ -10,9 +10,9 @@ class TestModels:
         router = global_context.model_registry(model="albert-small")
 
         # With roundrobin client should be different at each call
-        client_1 = router.get_client(endpoint="")
-        client_2 = router.get_client(endpoint="")
-        client_3 = router.get_client(endpoint="")
+        client_1 = router._choose_client(providers=router._providers)
+        client_2 = router._choose_client(providers=router._providers)
+        client_3 = router._choose_client(providers=router._providers)
 
         assert client_1.timeout != client_2.timeout
         assert client_1.timeout == client_3.timeout
@@ -0,0 +1,155 @@
+import asyncio
+from typing import Callable, Optional
+from unittest.mock import AsyncMock, MagicMock
+
+from coredis import ConnectionPool
+import httpx
+import pytest
+
+from app.clients.model import BaseModelClient
+from app.helpers._circuitbreaker import CircuitBreaker
+from app.helpers._usagetokenizer import UsageTokenizer
+from app.schemas.core.context import RequestContext
+from app.schemas.usage import Detail, Usage
+from app.sql.session import set_get_db_func
+from app.utils.context import global_context, request_context
+
+
+class WhitespaceEncoding:
+    """Encoding with one token per word, to count the tokens without loading a real encoding."""
+
+    def __init__(self) -> None:
+        self.encoded = list()
+
+    def encode(self, text: str) -> list:
+        self.encoded.append(text)
+        return text.split()
+
+
+class FakeModelClient:
+    """Model provider with the attributes read by the model routers, its requests are answered by the forward_request mock."""
+
+    def __init__(self, url: str, vector_size: Optional[int], max_context_length: Optional[int], max_batch_size: Optional[int], max_concurrent_requests: Optional[int]) -> None:  # fmt: off
+        self.name = "my-model"
+        self.url = url
+        self.vector_size = vector_size
+        self.max_context_length = max_context_length
+        self.max_batch_size = max_batch_size
+        self.max_concurrent_requests = max_concurrent_requests
+        self.cost_prompt_tokens = 0.0
+        self.cost_completion_tokens = 0.0
+        self.circuit_breaker = CircuitBreaker(name=url)
+        self.inputs = list()
+        self.forward_request = AsyncMock()
+        self.load = AsyncMock()
+        self.close = AsyncMock()
+
+
+@pytest.fixture
+def context():
+    request_context.set(RequestContext(id="request-1", usage=Usage()))
+
+    return request_context.get()
+
+
+@pytest.fixture
+def tokenizer():
+    global_context.tokenizer = UsageTokenizer.__new__(UsageTokenizer)
+    global_context.tokenizer.tokenizer = WhitespaceEncoding()
+
+    yield global_context.tokenizer
+
+    global_context.tokenizer = None
+
+
+@pytest.fixture
+def session():
+    session = AsyncMock()
+
+    async def get_db():
+        yield session
+
+    set_get_db_func(get_db)
+    yield session
+    set_get_db_func(None)
+
+
+@pytest.fixture
+def model_client() -> Callable[..., FakeModelClient]:
+    """
+    Factory of fake model providers, the response of their requests is set on the forward_request mock.
+    """
+
+    def model_client(url: str = "http://localhost:8000", vector_size: int = None, max_context_length: int = None, max_batch_size: int = None, max_concurrent_requests: int = None) -> FakeModelClient:  # fmt: off
+        return FakeModelClient(url=url, vector_size=vector_size, max_context_length=max_context_length, max_batch_size=max_batch_size, max_concurrent_requests=max_concurrent_requests)  # fmt: off
+
+    return model_client
+
+
+@pytest.fixture
+def embeddings_model_client(model_client) -> Callable[..., FakeModelClient]:
+    """
+    Factory of fake embeddings and rerank providers. The embedding of an input is its length, the input sent to the providers are recorded in their
+    inputs attribute, and each request adds a usage detail of one token per word to the usage of the request context.
+    """
+
+    def embeddings_model_client(url: str = "http://localhost:8000", cost: float = 1.0, latency: float = 0.0, **kwargs) -> FakeModelClient:
+        client = model_client(url=url, vector_size=1, **kwargs)
+
+        async def forward_request(method: str, json: dict, **kwargs) -> httpx.Response:
+            client.inputs.append(json["input"])
+            await asyncio.sleep(latency)
+
+            detail = Detail(id="request-1", model="my-model")
+            detail.usage.prompt_tokens = detail.usage.total_tokens = sum(len(input.split()) for input in json["input"])
+            detail.usage.cost = detail.usage.prompt_tokens * cost
+            usage = request_context.get().usage
+            usage.details.append(detail)
+            usage.prompt_tokens += detail.usage.prompt_tokens
+            usage.total_tokens += detail.usage.total_tokens
+            usage.cost += detail.usage.cost
+
+            if "prompt" in json:  # rerank: score is the length of the input
+                data = sorted([{"object": "rerank", "index": i, "score": len(input)} for i, input in enumerate(json["input"])], key=lambda item: -item["score"])  # fmt: off
+            else:
+                data = [{"object": "embedding", "index": i, "embedding": [float(len(input))]} for i, input in enumerate(json["input"])]
+            return httpx.Response(status_code=200, json={"object": "list", "data": data, "model": "my-model", "id": "request-1", "usage": usage.model_dump()})  # fmt: off
+
+        client.forward_request = AsyncMock(side_effect=forward_request)
+
+        return client
+
+    return embeddings_model_client
+
+
+@pytest.fixture
+def http_model_client() -> Callable[..., BaseModelClient]:
+    """
+    Factory of model clients sending their requests to a handler instead of the network, the endpoint is the one set by the model routers.
+    """
+
+    def http_model_client(handler: Callable[[httpx.Request], httpx.Response], endpoint: str, client_class: type = BaseModelClient) -> BaseModelClient:
+        client = client_class.__new__(client_class)
+        BaseModelClient.__init__(
+            client,
+            url="http://localhost:8000",
+            key=None,
+            timeout=10,
+            model_name="my-model",
+            model_carbon_footprint_zone="WOR",
+            model_carbon_footprint_total_params=None,
+            model_carbon_footprint_active_params=None,
+            model_cost_prompt_tokens=0.0,
+            model_cost_completion_tokens=0.0,
+            redis=ConnectionPool(),
+            metrics_retention_ms=1000,
+        )
+        client.async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler=handler))
+        client._log_performance_metric = MagicMock()
+        client.endpoint = endpoint
+        if client.ENDPOINT_TABLE[endpoint] is None:
+            client.ENDPOINT_TABLE = {**client.ENDPOINT_TABLE, endpoint: f"/v1{endpoint}"}
+
+        return client
+
+    return http_model_client
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.helpers._admissioncontroller import AdmissionController
+from app.utils.exceptions import ModelOverloadedException
+
+
+def _choose(providers: list):
+    return providers[0]
+
+
+class TestAdmissionController:
+    @pytest.mark.asyncio
+    async def test_requests_wait_for_a_free_slot_and_are_rejected_when_queue_is_full(self, model_client):
+        provider = model_client(max_concurrent_requests=1)
+        controller = AdmissionController(name="my-model", queue_size=1, queue_timeout=5.0, priorities={})
+
+        assert await controller.acquire(providers=[provider], priority=0, choose=_choose) is provider
+        waiting = asyncio.create_task(controller.acquire(providers=[provider], priority=0, choose=_choose))
+        await asyncio.sleep(0)
+
+        with pytest.raises(ModelOverloadedException) as exception:
+            await controller.acquire(providers=[provider], priority=0, choose=_choose)
+        assert exception.value.status_code == 429
+        assert exception.value.headers["Retry-After"] == "1"
+
+        # the slot of the finished request is given to the waiting request
+        controller.release(client=provider)
+        assert await waiting is provider
+        controller.release(client=provider)
+        assert await controller.acquire(providers=[provider], priority=0, choose=_choose) is provider
+
+    @pytest.mark.asyncio
+    async def test_waiting_requests_are_admitted_by_priority(self, model_client):
+        provider = model_client(max_concurrent_requests=1)
+        controller = AdmissionController(name="my-model", queue_size=10, queue_timeout=5.0, priorities={"ingestion": 10})
+        await controller.acquire(providers=[provider], priority=0, choose=_choose)
+
+        admitted = list()
+
+        async def request(name: str, role: str) -> None:
+            await controller.acquire(providers=[provider], priority=controller.get_priority(role=role), choose=_choose)
+            admitted.append(name)
+            controller.release(client=provider)
+
+        bulk = asyncio.create_task(request(name="bulk", role="ingestion"))
+        await asyncio.sleep(0)
+        chat = asyncio.create_task(request(name="chat", role=None))
+        await asyncio.sleep(0)
+
+        controller.release(client=provider)
+        await asyncio.gather(bulk, chat)
+
+        assert admitted == ["chat", "bulk"]
+
+    @pytest.mark.asyncio
+    async def test_requests_are_rejected_after_queue_timeout(self, model_client):
+        provider = model_client(max_concurrent_requests=1)
+        controller = AdmissionController(name="my-model", queue_size=10, queue_timeout=0.01, priorities={})
+        await controller.acquire(providers=[provider], priority=0, choose=_choose)
+
+        with pytest.raises(ModelOverloadedException):
+            await controller.acquire(providers=[provider], priority=0, choose=_choose)
+
+        # the queue is empty again, the slot is not given to the rejected request
+        controller.release(client=provider)
+        assert await controller.acquire(providers=[provider], priority=0, choose=_choose) is provider
+
+    @pytest.mark.asyncio
+    async def test_slot_of_an_ejected_provider_is_not_given_to_waiting_requests(self, model_client):
+        sick, healthy = model_client(url="http://sick", max_concurrent_requests=1), model_client(url="http://healthy", max_concurrent_requests=1)
+        controller = AdmissionController(name="my-model", queue_size=10, queue_timeout=5.0, priorities={})
+        await controller.acquire(providers=[sick], priority=0, choose=_choose)
+        await controller.acquire(providers=[healthy], priority=0, choose=_choose)
+
+        waiting = asyncio.create_task(controller.acquire(providers=[sick, healthy], priority=0, choose=_choose))
+        await asyncio.sleep(0)
+
+        sick.circuit_breaker.eject()
+        controller.release(client=sick)
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        assert controller._running[sick] == 0
+
+        controller.release(client=healthy)
+        assert await waiting is healthy
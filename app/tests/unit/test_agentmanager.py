@@ -7,6 +7,7 @@ import pytest
 from app.helpers._agentmanager import AgentManager
 from app.schemas.agents import AgentsTool
 from app.utils.exceptions import ToolNotFoundException
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
 
 
 class TestMCPBody(SimpleNamespace):
@@ -26,7 +27,7 @@ class TestMCPLoop:
     @pytest.fixture
     def mock_llm_registry(self, mock_llm_client):
         mock_llm_registry = MagicMock()
-        mock_llm_registry.return_value = SimpleNamespace(get_client=lambda endpoint: mock_llm_client)
+        mock_llm_registry.return_value = mock_llm_client
         return mock_llm_registry
 
     @pytest.fixture
@@ -139,6 +140,7 @@ class TestMCPLoop:
                     ],
                 },
                 "method": "POST",
+                "endpoint": ENDPOINT__CHAT_COMPLETIONS,
             }
             assert mock_llm_client.forward_request.call_count == number_of_rounds
 
@@ -190,6 +192,7 @@ class TestMCPLoop:
                     ],
                 },
                 "method": "POST",
+                "endpoint": ENDPOINT__CHAT_COMPLETIONS,
             }
             assert mock_llm_client.forward_request.call_count == number_of_rounds
 
@@ -222,6 +225,7 @@ class TestMCPLoop:
             assert llm_client_arguments_called == {
                 "json": {"messages": [{"content": "Je veux que tu fasses une action", "role": "user"}], "model": "albert-large"},
                 "method": "POST",
+                "endpoint": ENDPOINT__CHAT_COMPLETIONS,
             }
             assert mock_mcp_bridge.get_tool_list.call_count == 0
 
@@ -271,5 +275,6 @@ class TestMCPLoop:
                     "tool_choice": agents_choice,
                 },
                 "method": "POST",
+                "endpoint": ENDPOINT__CHAT_COMPLETIONS,
             }
             assert mock_llm_client.forward_request.call_count == number_of_rounds
@@ -0,0 +1,42 @@
+from unittest.mock import AsyncMock, MagicMock
+
+from coredis import ConnectionPool
+import pytest
+
+from app.helpers._budgetledger import BudgetLedger
+
+
+class TestBudgetLedger:
+    @pytest.mark.asyncio
+    async def test_budget_ledger_writes_balances_in_a_single_update(self, session):
+        ledger = BudgetLedger(redis=ConnectionPool(), batch_size=10)
+        ledger.redis = AsyncMock()
+        ledger.redis.spop.return_value = {b"1", b"2", b"3"}
+        ledger.redis.mget.side_effect = lambda keys: [{"budget:1": b"9.5", "budget:2": None, "budget:3": b"0.000000"}[key] for key in keys]
+
+        assert await ledger.flush() == 3
+
+        session.execute.assert_awaited_once()
+        rows = session.execute.call_args.args[1]
+        assert sorted(rows, key=lambda row: row["id"]) == [{"id": 1, "budget": 9.5}, {"id": 3, "budget": 0.0}]
+        session.commit.assert_awaited_once()
+
+        # balances are written again on next flush if the update fails
+        session.execute.side_effect = ConnectionError("PostgreSQL is not reachable.")
+        assert await ledger.flush() == 0
+        assert sorted(ledger.redis.sadd.call_args.args[1]) == [1, 3]
+
+    @pytest.mark.asyncio
+    async def test_budget_ledger_initializes_missing_balance_from_postgres(self, session):
+        ledger = BudgetLedger(redis=ConnectionPool())
+        ledger._get, ledger._debit = AsyncMock(), AsyncMock(side_effect=[None, b"9.500000"])
+        session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=10.0))
+
+        assert await ledger.debit(user_id=1, cost=0.5) == 9.5
+        ledger._get.assert_awaited_once_with(keys=["budget:1"], args=[10.0])
+
+        # users without budget are not debited
+        assert await ledger.get(user_id=1, budget=None) is None
+        ledger._debit.side_effect = [None]
+        session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=None))
+        assert await ledger.debit(user_id=2, cost=0.5) is None
@@ -0,0 +1,71 @@
+from app.helpers._circuitbreaker import CircuitBreaker, CircuitBreakerState
+from app.helpers.models.routers import ModelRouter
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
+
+
+class TestCircuitBreaker:
+    def test_circuit_breaker_opens_above_failure_rate(self):
+        circuit_breaker = CircuitBreaker(name="my-model", failure_rate=0.5, min_requests=4)
+
+        for _ in range(3):
+            circuit_breaker.record_success()
+        circuit_breaker.record_failure()
+        assert circuit_breaker.state == CircuitBreakerState.CLOSED
+
+        circuit_breaker.record_failure()
+        circuit_breaker.record_failure()
+        assert circuit_breaker.state == CircuitBreakerState.OPEN
+        assert not circuit_breaker.is_available()
+
+    def test_circuit_breaker_readmits_provider_after_trial_requests(self):
+        circuit_breaker = CircuitBreaker(name="my-model", open_duration=0.0, half_open_requests=2, min_requests=1)
+        circuit_breaker.record_failure()
+
+        assert circuit_breaker.state == CircuitBreakerState.HALF_OPEN
+        for _ in range(2):
+            assert circuit_breaker.is_available()
+            circuit_breaker.acquire()
+        assert not circuit_breaker.is_available()
+
+        circuit_breaker.record_success()
+        circuit_breaker.record_success()
+        assert circuit_breaker.state == CircuitBreakerState.CLOSED
+
+    def test_circuit_breaker_reopens_on_trial_failure(self):
+        circuit_breaker = CircuitBreaker(name="my-model", open_duration=3600.0, min_requests=1)
+        circuit_breaker.record_failure()
+        assert circuit_breaker.state == CircuitBreakerState.OPEN
+
+        # a successful health check half-opens the circuit before the end of the open duration
+        circuit_breaker.record_success()
+        assert circuit_breaker.state == CircuitBreakerState.HALF_OPEN
+
+        circuit_breaker.record_failure()
+        assert circuit_breaker.state == CircuitBreakerState.OPEN
+
+    def test_circuit_breaker_eject_until_health_check_succeeds(self):
+        circuit_breaker = CircuitBreaker(name="my-model")
+        circuit_breaker.eject()
+
+        assert circuit_breaker.state == CircuitBreakerState.OPEN
+        assert not circuit_breaker.is_available()
+
+        circuit_breaker.record_success()
+        assert circuit_breaker.state == CircuitBreakerState.HALF_OPEN
+
+    def test_model_router_skips_ejected_providers(self, model_client):
+        healthy, sick = model_client(url="http://healthy"), model_client(url="http://sick")
+        for provider in [healthy, sick]:
+            provider.circuit_breaker = CircuitBreaker(name=provider.url, min_requests=2)
+        router = ModelRouter(name="my-model", type="text-generation", owned_by="me", aliases=[], routing_strategy="round_robin", providers=[healthy, sick])  # fmt: off
+
+        sick.circuit_breaker.record_failure()
+        sick.circuit_breaker.record_failure()
+
+        assert all(router._choose_client(providers=router._get_providers(endpoint=ENDPOINT__CHAT_COMPLETIONS)) is healthy for _ in range(4))
+
+        # if all providers are ejected, requests are routed to all of them
+        healthy.circuit_breaker.record_failure()
+        healthy.circuit_breaker.record_failure()
+
+        assert {router._choose_client(providers=router._get_providers(endpoint=ENDPOINT__CHAT_COMPLETIONS)) for _ in range(4)} == {healthy, sick}
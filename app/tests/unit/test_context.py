@@ -0,0 +1,46 @@
+from unittest.mock import patch
+
+from fastapi import Request
+import pytest
+
+from app.schemas.core.context import RequestContext
+from app.utils.context import get_request_body, request_context
+
+
+def _request(body: bytes, content_type: str = "application/json") -> Request:
+    async def receive() -> dict:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {"type": "http", "method": "POST", "path": "/v1/chat/completions", "headers": [(b"content-type", content_type.encode())], "query_string": b""}  # fmt: off
+    return Request(scope=scope, receive=receive)
+
+
+class TestContext:
+    @pytest.mark.asyncio
+    async def test_request_body_is_parsed_once(self):
+        request_context.set(RequestContext(id="request-1"))
+        request = _request(body=b'{"model": "my-model", "messages": []}')
+
+        # body already decoded by FastAPI
+        request._json = await request.json()
+
+        with patch("app.utils.context.orjson.loads") as loads:
+            body = await get_request_body(request=request)
+            assert await get_request_body(request=_request(body=b"{}")) is body
+
+        assert body is request._json
+        loads.assert_not_called()
+        assert request_context.get().raw_body == b'{"model": "my-model", "messages": []}'
+
+    @pytest.mark.asyncio
+    async def test_invalid_request_body_is_parsed_as_empty(self):
+        request_context.set(RequestContext(id="request-1"))
+        assert await get_request_body(request=_request(body=b"not json")) == {}
+
+        request_context.set(RequestContext(id="request-2"))
+        assert await get_request_body(request=_request(body=b'{"model": "caf\xe9"}')) == {"model": "caf�"}
+
+        request_context.set(RequestContext(id="request-3"))
+        assert await get_request_body(request=_request(body=b"model=my-model", content_type="application/x-www-form-urlencoded")) == {
+            "model": "my-model"
+        }
@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+
+from fastapi import HTTPException
+import pytest
+
+from app.helpers.models.routers import ModelRouter
+from app.schemas.core.context import RequestContext
+from app.schemas.usage import Usage
+from app.utils.context import request_context
+from app.utils.variables import ENDPOINT__EMBEDDINGS
+
+
+async def _embed(router: ModelRouter, input: str | list) -> tuple[dict, Usage]:
+    request_context.set(RequestContext(id="request", usage=Usage()))
+    response = await router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json={"model": "my-model", "input": input})
+
+    return response.json(), request_context.get().usage
+
+
+def _run(router: ModelRouter, input: str | list) -> asyncio.Task:
+    # each request has its own context, as in the API
+    return asyncio.create_task(_embed(router=router, input=input), context=contextvars.Context())
+
+
+class TestEmbeddingsBatcher:
+    @pytest.fixture
+    def router(self, tokenizer, embeddings_model_client):
+        return ModelRouter(
+            name="my-model",
+            type="text-embeddings-inference",
+            owned_by="me",
+            aliases=[],
+            routing_strategy="round_robin",
+            providers=[embeddings_model_client()],
+            embeddings_batch_size=4,
+            embeddings_batch_wait=0.01,
+        )
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_are_sent_in_one_batch(self, router):
+        results = await asyncio.gather(_run(router, input="a b"), _run(router, input=["ccc", "dd"]))
+
+        assert router._providers[0].inputs == [["a b", "ccc", "dd"]]
+
+        (first, first_usage), (second, second_usage) = results
+        assert [item["embedding"] for item in first["data"]] == [[3.0]]
+        assert [item["embedding"] for item in second["data"]] == [[3.0], [2.0]]
+
+        # each request is billed for its own tokens
+        assert first["usage"]["prompt_tokens"] == first_usage.prompt_tokens == 2
+        assert first_usage.cost == 2.0
+        assert second_usage.prompt_tokens == 2
+        assert second_usage.cost == 2.0
+        assert first["id"] != second["id"]
+
+    @pytest.mark.asyncio
+    async def test_batch_is_sent_when_full(self, router):
+        await asyncio.gather(_run(router, input=["a", "b", "c"]), _run(router, input=["d", "e"]), _run(router, input=["f"]))
+
+        assert router._providers[0].inputs == [["a", "b", "c", "d", "e"], ["f"]]
+
+    @pytest.mark.asyncio
+    async def test_requests_with_different_parameters_are_not_batched(self, router, context):
+        await asyncio.gather(
+            router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json={"model": "my-model", "input": "a"}),
+            router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json={"model": "my-model", "input": "b", "dimensions": 1}),
+        )
+
+        assert sorted(router._providers[0].inputs) == [["a"], ["b"]]
+
+    @pytest.mark.asyncio
+    async def test_requests_are_billed_for_all_sub_batches(self, router, embeddings_model_client):
+        router.add_provider(provider=embeddings_model_client(url="http://localhost:8001", cost=3.0))
+        router._max_batch_size = 2  # batch is split into sub-batches of 2 inputs, one per provider
+
+        results = await asyncio.gather(_run(router, input=["a", "b", "c"]), _run(router, input="d"))
+
+        assert [provider.inputs for provider in router._providers] == [[["a", "b"]], [["c", "d"]]]
+
+        # cost of the batch (2 * 1.0 + 2 * 3.0) is shared by token
+        (_, first_usage), (_, second_usage) = results
+        assert first_usage.prompt_tokens == 3
+        assert first_usage.cost == 6.0
+        assert second_usage.prompt_tokens == 1
+        assert second_usage.cost == 2.0
+
+    @pytest.mark.asyncio
+    async def test_only_the_invalid_request_fails_when_the_batch_is_rejected(self, router):
+        client = router._providers[0]
+        forward_request = client.forward_request.side_effect
+
+        async def reject_invalid_input(method: str, json: dict, **kwargs):
+            if "bad" in json["input"]:
+                client.inputs.append(json["input"])
+                raise HTTPException(status_code=422, detail="Invalid input.")
+            return await forward_request(method=method, json=json, **kwargs)
+
+        client.forward_request.side_effect = reject_invalid_input
+        first, bad, second = await asyncio.gather(_run(router, input="a"), _run(router, input="bad"), _run(router, input=["b", "cc"]), return_exceptions=True)  # fmt: off
+
+        # the rejected batch is sent again request by request
+        assert client.inputs == [["a", "bad", "b", "cc"], ["a"], ["bad"], ["b", "cc"]]
+        assert isinstance(bad, HTTPException) and bad.status_code == 422
+        assert [item["embedding"] for item in first[0]["data"]] == [[1.0]]
+        assert [item["embedding"] for item in second[0]["data"]] == [[1.0], [2.0]]
+        assert second[1].prompt_tokens == 2
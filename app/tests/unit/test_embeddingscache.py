@@ -0,0 +1,60 @@
+from unittest.mock import AsyncMock
+
+from coredis import ConnectionPool
+import orjson
+import pytest
+
+from app.helpers._embeddingscache import EmbeddingsCache
+from app.helpers.models.routers import ModelRouter
+from app.schemas.core.context import RequestContext
+from app.schemas.usage import Usage
+from app.utils.context import global_context, request_context
+from app.utils.variables import ENDPOINT__EMBEDDINGS
+
+
+class TestEmbeddingsCache:
+    @pytest.fixture
+    def router(self, context, embeddings_model_client):
+        global_context.embeddings_cache = EmbeddingsCache(redis=ConnectionPool(), ttl=60, max_size=10)
+        global_context.embeddings_cache.redis = AsyncMock()
+        global_context.embeddings_cache.redis.mget.side_effect = lambda keys: [None] * len(keys)
+
+        yield ModelRouter(name="my-model", type="text-embeddings-inference", owned_by="me", aliases=[], routing_strategy="round_robin", providers=[embeddings_model_client()])  # fmt: off
+
+        global_context.embeddings_cache = None
+
+    @pytest.mark.asyncio
+    async def test_only_missing_embeddings_are_sent_to_provider(self, router):
+        client = router._providers[0]
+
+        await router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json={"model": "my-model", "input": ["a", "bb"]})
+        request_context.set(RequestContext(id="request-2", usage=Usage()))
+        response = await router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json={"model": "my-model", "input": ["ccc", "a", "ccc", "bb"]})  # fmt: off
+
+        # cached and duplicated inputs are not sent again
+        assert client.inputs == [["a", "bb"], ["ccc"]]
+
+        data = response.json()["data"]
+        assert [item["index"] for item in data] == [0, 1, 2, 3]
+        assert [item["embedding"] for item in data] == [[3.0], [1.0], [3.0], [2.0]]
+        assert response.json()["usage"]["prompt_tokens"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cached_embeddings_are_served_without_provider(self, router):
+        client = router._providers[0]
+        cache = global_context.embeddings_cache
+        await cache.set(keys=[cache.get_key(model="my-model", input="hello", encoding_format="float")], embeddings=[[0.5, 0.25]])
+        cache._lru.clear()
+
+        # embeddings evicted from the in-process cache are read from redis
+        cache.redis.mget.side_effect = lambda keys: [orjson.dumps([0.5, 0.25])] * len(keys)
+        response = await router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json={"model": "my-model", "input": "hello", "encoding_format": "float"})  # fmt: off
+
+        assert client.inputs == []
+        assert response.json()["data"] == [{"object": "embedding", "index": 0, "embedding": [0.5, 0.25]}]
+        assert response.json()["model"] == "my-model"
+
+    def test_embeddings_cache_key_depends_on_format_and_normalized_input(self):
+        assert EmbeddingsCache.get_key(model="my-model", input="café") == EmbeddingsCache.get_key(model="my-model", input="café")
+        assert EmbeddingsCache.get_key(model="my-model", input="hello") != EmbeddingsCache.get_key(model="my-model", input="hello", dimensions=256)
+        assert EmbeddingsCache.get_key(model="my-model", input="hello") != EmbeddingsCache.get_key(model="other-model", input="hello")
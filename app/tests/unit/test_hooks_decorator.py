@@ -0,0 +1,43 @@
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+import pytest
+from starlette.background import BackgroundTask
+
+from app.schemas.core.context import RequestContext
+from app.utils.context import global_context, request_context
+from app.utils.hooks_decorator import hooks
+
+
+class TestHooks:
+    @pytest.fixture
+    def budget_ledger(self):
+        global_context.budget_ledger = AsyncMock()
+        global_context.usage_buffer = MagicMock()
+        global_context.model_registry = MagicMock(aliases={})
+
+        yield global_context.budget_ledger
+
+        global_context.budget_ledger = global_context.usage_buffer = global_context.model_registry = None
+
+    @pytest.mark.asyncio
+    async def test_usage_is_logged_in_the_background_task_of_the_response(self, budget_ledger):
+        request_context.set(RequestContext(id="request-1", user_id=1, endpoint="/v1/embeddings", method="POST", body={"model": "my-model"}))
+        endpoint_task = AsyncMock()
+
+        @hooks
+        async def endpoint(request: Request) -> JSONResponse:
+            return JSONResponse(content={"model": "my-model", "usage": {"total_tokens": 2, "cost": 0.5}}, background=BackgroundTask(endpoint_task))
+
+        response = await endpoint(request=Request(scope={"type": "http", "headers": []}))
+
+        # nothing is logged before the response is sent
+        global_context.usage_buffer.add.assert_not_called()
+        budget_ledger.debit.assert_not_awaited()
+
+        await response.background()
+
+        endpoint_task.assert_awaited_once()
+        assert global_context.usage_buffer.add.call_args.kwargs["usage"].total_tokens == 2
+        budget_ledger.debit.assert_awaited_once_with(user_id=1, cost=0.5)
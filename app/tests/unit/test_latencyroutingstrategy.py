@@ -0,0 +1,45 @@
+from unittest.mock import AsyncMock
+
+from coredis import ConnectionPool
+import pytest
+
+from app.clients.model import BaseModelClient
+from app.helpers.models.routers.strategies import LatencyRoutingStrategy
+
+
+class TestLatencyRoutingStrategy:
+    def test_latency_strategy_chooses_fastest_client(self):
+        fast, slow = object(), object()
+        strategy = LatencyRoutingStrategy(clients=[fast, slow], latencies={fast: 100.0, slow: 2000.0})
+
+        assert all(strategy.choose_model_client() is fast for _ in range(10))
+
+    def test_latency_strategy_prefers_client_without_latency(self):
+        known, unknown = object(), object()
+        strategy = LatencyRoutingStrategy(clients=[known, unknown], latencies={known: 100.0})
+
+        assert all(strategy.choose_model_client() is unknown for _ in range(10))
+
+    @pytest.mark.asyncio
+    async def test_get_latency_returns_percentile_of_recent_values(self):
+        client = BaseModelClient(
+            url="http://localhost:8000",
+            key=None,
+            timeout=10,
+            model_name="my-model",
+            model_carbon_footprint_zone="WOR",
+            model_carbon_footprint_total_params=None,
+            model_carbon_footprint_active_params=None,
+            model_cost_prompt_tokens=0.0,
+            model_cost_completion_tokens=0.0,
+            redis=ConnectionPool(),
+            metrics_retention_ms=1000,
+        )
+        client.redis = AsyncMock()
+        client.redis.timeseries.range.return_value = tuple((timestamp, float(value)) for timestamp, value in enumerate(range(10, 0, -1)))
+
+        assert await client.get_latency(metric="latency", percentile=0.5) == 6.0
+        assert client.redis.timeseries.range.call_args.kwargs["key"] == "metrics_ts:latency:my-model:http://localhost:8000"
+
+        client.redis.timeseries.range.return_value = ()
+        assert await client.get_latency(metric="latency") is None
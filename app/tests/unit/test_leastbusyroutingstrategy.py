@@ -0,0 +1,60 @@
+import time
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+
+from app.helpers.models.routers.strategies import LeastBusyRoutingStrategy
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
+
+
+class TestLeastBusyRoutingStrategy:
+    def test_least_busy_strategy_chooses_client_with_fewest_inflight_requests(self, http_model_client):
+        idle, busy = (
+            http_model_client(handler=None, endpoint=ENDPOINT__CHAT_COMPLETIONS),
+            http_model_client(handler=None, endpoint=ENDPOINT__CHAT_COMPLETIONS),
+        )
+        idle.inflight_requests, idle.shared_inflight_requests = 1, 1
+        busy.inflight_requests, busy.shared_inflight_requests = 0, 3
+
+        strategy = LeastBusyRoutingStrategy(clients=[idle, busy])
+
+        assert all(strategy.choose_model_client() is idle for _ in range(10))
+
+    @pytest.mark.asyncio
+    async def test_inflight_requests_are_released_when_stream_is_interrupted(self, http_model_client, tokenizer, context):
+        class EndlessStream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                while True:
+                    yield b'data: {"id": "1", "choices": [{"index": 0, "delta": {"content": "hello"}}]}\n\n'
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(status_code=200, headers={"Content-Type": "text/event-stream"}, stream=EndlessStream())
+
+        client = http_model_client(handler=handler, endpoint=ENDPOINT__CHAT_COMPLETIONS)
+        stream = client.forward_stream(method="POST", json={"model": "my-model", "messages": []})
+
+        await stream.__anext__()
+        assert client.inflight_requests == 1
+
+        # client disconnection closes the generator
+        await stream.aclose()
+        assert client.inflight_requests == 0
+
+    @pytest.mark.asyncio
+    async def test_share_inflight_requests_counts_other_live_workers(self, http_model_client):
+        client = http_model_client(handler=None, endpoint=ENDPOINT__CHAT_COMPLETIONS)
+        client.inflight_requests = 2
+        client.redis = AsyncMock()
+        now = int(time.time())
+        client.redis.hgetall.return_value = {
+            b"worker-1": f"2:{now}".encode(),
+            b"worker-2": f"5:{now}".encode(),
+            b"worker-3": f"7:{now - 60}".encode(),
+        }
+
+        await client.share_inflight_requests(worker_id="worker-1", ttl=15)
+
+        assert client.shared_inflight_requests == 5
+        assert client.redis.hset.call_args.kwargs["field_values"]["worker-1"].startswith("2:")
+        client.redis.hdel.assert_awaited_once_with(key="inflight_requests:my-model:http://localhost:8000", fields=["worker-3"])
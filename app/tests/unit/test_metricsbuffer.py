@@ -0,0 +1,51 @@
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+from coredis import ConnectionPool
+import pytest
+
+from app.helpers._metricsbuffer import MetricsBuffer
+from app.schemas.core.metric import Metric
+
+
+def _metric(latency_ms: int) -> Metric:
+    return Metric(
+        timestamp=datetime.now(), time_to_first_token_us=1000, latency_ms=latency_ms, model_name="my-model", provider_url="http://localhost:8000"
+    )
+
+
+class TestMetricsBuffer:
+    @pytest.mark.asyncio
+    async def test_metrics_buffer_writes_points_in_a_single_command(self):
+        buffer = MetricsBuffer(redis=ConnectionPool(), retention_ms=1000, flush_interval_ms=3_600_000)
+        buffer.redis = AsyncMock()
+
+        buffer.add(metric=_metric(latency_ms=10))
+        buffer.add(metric=_metric(latency_ms=20))
+        await buffer.close()
+
+        buffer.redis.timeseries.madd.assert_awaited_once()
+        points = buffer.redis.timeseries.madd.call_args.kwargs["ktvs"]
+        assert [value for key, _, value in points if key == "metrics_ts:latency:my-model:http://localhost:8000"] == [10, 20]
+        assert len(points) == 4
+
+        # time series are created once
+        assert buffer.redis.timeseries.create.await_count == 2
+        buffer.add(metric=_metric(latency_ms=30))
+        await buffer.close()
+        assert buffer.redis.timeseries.create.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_metrics_buffer_is_bounded(self):
+        buffer = MetricsBuffer(redis=ConnectionPool(), retention_ms=1000, flush_interval_ms=3_600_000, batch_size=2, max_size=3)
+        buffer.redis = AsyncMock()
+        buffer.redis.timeseries.madd.side_effect = ConnectionError("Redis is not reachable.")
+
+        buffer.add(metric=_metric(latency_ms=10))
+        buffer.add(metric=_metric(latency_ms=20))
+        assert len(buffer._points) == 3
+
+        # failed writes are dropped, the buffer does not grow
+        await buffer.close()
+        assert len(buffer._points) == 0
+        assert buffer.redis.timeseries.madd.await_count == 2
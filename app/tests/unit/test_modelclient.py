@@ -0,0 +1,68 @@
+import httpx
+import orjson
+import pytest
+
+from app.clients.model._teimodelclient import TeiModelClient
+from app.schemas.embeddings import Embeddings
+from app.schemas.rerank import Reranks
+from app.utils.context import request_context
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS, ENDPOINT__EMBEDDINGS, ENDPOINT__RERANK
+
+
+@pytest.mark.usefixtures("tokenizer", "context")
+class TestModelClient:
+    @pytest.mark.asyncio
+    async def test_forward_request_returns_formatted_json_content(self, http_model_client):
+        def handler(request: httpx.Request) -> httpx.Response:
+            data = {"object": "list", "model": "upstream", "data": [{"object": "embedding", "index": 0, "embedding": [0.1, 0.2]}]}
+            return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
+
+        client = http_model_client(handler=handler, endpoint=ENDPOINT__EMBEDDINGS)
+
+        response = await client.forward_request(method="POST", json={"model": "my-model", "input": ["hello world"]})
+        data = orjson.loads(response.content)
+
+        assert response.headers["Content-Type"] == "application/json"
+        assert data["model"] == "my-model"
+        assert data["usage"]["prompt_tokens"] == 2
+        assert data["data"][0]["embedding"] == [0.1, 0.2]
+        assert Embeddings(**data).model_dump() == data
+
+    @pytest.mark.asyncio
+    async def test_tei_rerank_response_matches_rerank_schema(self, http_model_client):
+        def handler(request: httpx.Request) -> httpx.Response:
+            data = [{"index": 1, "score": 0.9}, {"index": 0, "score": 0.1}]
+            return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
+
+        client = http_model_client(handler=handler, endpoint=ENDPOINT__RERANK, client_class=TeiModelClient)
+
+        response = await client.forward_request(method="POST", json={"model": "my-model", "prompt": "query", "input": ["a", "b"]})
+        data = orjson.loads(response.content)
+
+        assert data["data"][0] == {"object": "rerank", "score": 0.9, "index": 1}
+        assert Reranks(**data).model_dump() == data
+
+    @pytest.mark.asyncio
+    async def test_interrupted_stream_counts_usage_of_produced_tokens(self, http_model_client):
+        chunk = {"id": "request-1", "object": "chat.completion.chunk", "created": 0, "model": "my-model"}
+        events = [b"data: " + orjson.dumps({**chunk, "choices": [{"index": 0, "delta": {"content": content}}]}) + b"\n\n" for content in ["hello world", "again"]]  # fmt: off
+
+        class NetworkStream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                for event in events + [b"data: [DONE]\n\n"]:
+                    yield event
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(status_code=200, headers={"Content-Type": "text/event-stream"}, stream=NetworkStream())
+
+        client = http_model_client(handler=handler, endpoint=ENDPOINT__CHAT_COMPLETIONS)
+
+        # client disconnection after the first chunk
+        stream = client.forward_stream(method="POST", json={"model": "my-model", "messages": [{"role": "user", "content": "hi"}]})
+        await anext(stream)
+        await stream.aclose()
+
+        usage = request_context.get().usage
+        assert usage.prompt_tokens == 1
+        assert usage.completion_tokens == 2
+        assert client.inflight_requests == 0
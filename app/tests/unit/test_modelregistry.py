@@ -0,0 +1,128 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import orjson
+import pytest
+
+from app.helpers.models import ModelRegistry
+from app.helpers.models.routers import ModelRouter
+from app.schemas.core.configuration import Model
+from app.utils.lifespan import _setup_model_provider
+
+
+class TestModelRegistry:
+    @pytest.fixture
+    def model(self):
+        return Model(
+            name="my-model", type="text-embeddings-inference", providers=[{"type": "tei", "url": "http://localhost:8000", "model_name": "my-model"}]
+        )
+
+    @pytest.fixture
+    def provider(self, model_client):
+        provider = model_client(url="http://a")
+        provider.circuit_breaker = MagicMock()
+
+        return provider
+
+    def test_add_provider_updates_model_attributes(self, model_client):
+        router = ModelRouter(
+            name="my-model",
+            type="text-generation",
+            owned_by="me",
+            aliases=[],
+            routing_strategy="shuffle",
+            providers=[model_client(url="http://a", max_context_length=8192)],
+        )
+
+        router.add_provider(provider=model_client(url="http://b", max_context_length=4096))
+
+        assert router.max_context_length == 4096
+        assert len(router._providers) == 2
+
+    def test_add_provider_rejects_different_vector_size(self, model_client):
+        router = ModelRouter(
+            name="my-model",
+            type="text-embeddings-inference",
+            owned_by="me",
+            aliases=[],
+            routing_strategy="shuffle",
+            providers=[model_client(url="http://a", vector_size=1024)],
+        )
+
+        with pytest.raises(AssertionError):
+            router.add_provider(provider=model_client(url="http://b", vector_size=768))
+
+        assert len(router._providers) == 1
+
+    @pytest.mark.asyncio
+    async def test_setup_model_provider_loads_and_caches_attributes(self, model, provider):
+        redis = AsyncMock()
+        redis.get.return_value = None
+        registry = ModelRegistry(routers=[])
+        provider.vector_size, provider.max_context_length = 1024, 512
+
+        await _setup_model_provider(model=model, provider=provider, model_registry=registry, redis=redis, cache_ttl=60, tasks=set(), unavailable_providers=[])  # fmt: off
+
+        provider.load.assert_awaited_once()
+        assert registry.models == ["my-model"]
+        assert registry(model="my-model")._vector_size == 1024
+        assert orjson.loads(redis.set.call_args.args[1]) == {"vector_size": 1024, "max_context_length": 512}
+
+    @pytest.mark.asyncio
+    async def test_setup_model_provider_uses_cached_attributes(self, model, provider):
+        redis = AsyncMock()
+        redis.get.return_value = orjson.dumps({"vector_size": 1024, "max_context_length": 512})
+        registry = ModelRegistry(routers=[])
+        provider.load.side_effect = AssertionError("Failed to get models list (503).")
+        tasks = set()
+
+        await _setup_model_provider(model=model, provider=provider, model_registry=registry, redis=redis, cache_ttl=60, tasks=tasks, unavailable_providers=[])  # fmt: off
+
+        # provider is added before being checked in background
+        redis.set.assert_not_awaited()
+        assert registry(model="my-model")._vector_size == 1024
+        assert registry(model="my-model").max_context_length == 512
+        assert len(tasks) == 1
+
+        await asyncio.gather(*tasks)
+
+        provider.load.assert_awaited_once()
+        provider.circuit_breaker.eject.assert_called_once()
+        assert registry.models == ["my-model"]
+
+    @pytest.mark.asyncio
+    async def test_setup_model_provider_refreshes_cached_attributes(self, model, provider):
+        redis = AsyncMock()
+        redis.get.return_value = orjson.dumps({"vector_size": 1024, "max_context_length": 512})
+        registry = ModelRegistry(routers=[])
+
+        async def load():
+            provider.max_context_length = 1024
+
+        provider.load.side_effect = load
+        tasks = set()
+
+        await _setup_model_provider(model=model, provider=provider, model_registry=registry, redis=redis, cache_ttl=60, tasks=tasks, unavailable_providers=[])  # fmt: off
+        await asyncio.gather(*tasks)
+
+        provider.circuit_breaker.eject.assert_not_called()
+        assert registry(model="my-model").max_context_length == 1024
+        assert orjson.loads(redis.set.call_args.args[1]) == {"vector_size": 1024, "max_context_length": 1024}
+
+    @pytest.mark.asyncio
+    async def test_setup_model_provider_keeps_unavailable_provider(self, model, provider):
+        registry = ModelRegistry(routers=[])
+        provider.load.side_effect = AssertionError("Model not found (my-model).")
+        unavailable_providers = []
+
+        await _setup_model_provider(model=model, provider=provider, model_registry=registry, redis=AsyncMock(), cache_ttl=0, tasks=set(), unavailable_providers=unavailable_providers)  # fmt: off
+
+        provider.close.assert_not_awaited()
+        assert registry.models == []
+        assert unavailable_providers == [(model, provider)]
+
+        # provider is added as soon as it comes up
+        provider.load.side_effect = None
+        await _setup_model_provider(model=model, provider=provider, model_registry=registry, redis=AsyncMock(), cache_ttl=0, tasks=set(), unavailable_providers=[])  # fmt: off
+
+        assert registry.models == ["my-model"]
@@ -0,0 +1,159 @@
+import asyncio
+
+from fastapi import HTTPException
+import pytest
+
+from app.helpers.models.routers import ModelRouter
+from app.schemas.core.context import RequestContext
+from app.schemas.usage import Usage
+from app.utils.context import request_context
+from app.utils.exceptions import ContextLengthExceededException
+from app.utils.variables import (
+    ENDPOINT__AUDIO_TRANSCRIPTIONS,
+    ENDPOINT__CHAT_COMPLETIONS,
+    ENDPOINT__COMPLETIONS,
+    ENDPOINT__EMBEDDINGS,
+    ENDPOINT__RERANK,
+)
+
+
+def _router(providers: list, type: str = "text-embeddings-inference", max_retries: int = 1) -> ModelRouter:
+    return ModelRouter(name="my-model", type=type, owned_by="me", aliases=[], routing_strategy="round_robin", providers=providers, max_retries=max_retries, retry_backoff=0.0)  # fmt: off
+
+
+class TestModelRouter:
+    @pytest.mark.asyncio
+    async def test_forward_request_fails_over_to_another_provider(self, model_client):
+        sick, healthy = model_client(url="http://sick"), model_client(url="http://healthy")
+        sick.forward_request.side_effect = HTTPException(status_code=504, detail="Request timed out, model is too busy.")
+        healthy.forward_request.return_value = "response"
+
+        router = _router(providers=[sick, healthy])
+
+        assert await router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json={"input": ["hello"]}) == "response"
+        sick.forward_request.assert_awaited_once()
+        healthy.forward_request.assert_awaited_once()
+
+    @pytest.mark.parametrize(
+        "type, endpoint, kwargs",
+        [
+            ("text-generation", ENDPOINT__COMPLETIONS, {"json": {"prompt": "hello"}}),
+            ("automatic-speech-recognition", ENDPOINT__AUDIO_TRANSCRIPTIONS, {"files": {"file": ("audio.mp3", b"", "audio/mpeg")}, "data": {}}),
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_forward_request_fails_over_for_all_endpoints(self, type, endpoint, kwargs, model_client):
+        sick, healthy = model_client(url="http://sick"), model_client(url="http://healthy")
+        sick.forward_request.side_effect = HTTPException(status_code=503, detail="Service unavailable.")
+        healthy.forward_request.return_value = "response"
+
+        router = _router(providers=[sick, healthy], type=type)
+
+        assert await router.forward_request(endpoint=endpoint, method="POST", **kwargs) == "response"
+        assert healthy.endpoint == endpoint
+
+    @pytest.mark.asyncio
+    async def test_forward_request_goes_through_admission_control_for_all_endpoints(self, model_client):
+        provider = model_client(url="http://a", max_concurrent_requests=1)
+        released = asyncio.Event()
+
+        async def forward_request(**kwargs):
+            await released.wait()
+            return "response"
+
+        provider.forward_request.side_effect = forward_request
+        router = ModelRouter(name="my-model", type="automatic-speech-recognition", owned_by="me", aliases=[], routing_strategy="round_robin", providers=[provider], queue_size=0)  # fmt: off
+        kwargs = {"endpoint": ENDPOINT__AUDIO_TRANSCRIPTIONS, "method": "POST", "files": {"file": ("audio.mp3", b"", "audio/mpeg")}, "data": {}}
+
+        running = asyncio.create_task(router.forward_request(**kwargs))
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as exception:
+            await router.forward_request(**kwargs)
+        assert exception.value.status_code == 429
+
+        released.set()
+        assert await running == "response"
+
+    @pytest.mark.asyncio
+    async def test_forward_request_does_not_retry_client_errors(self, model_client):
+        provider, other = model_client(url="http://a"), model_client(url="http://b")
+        provider.forward_request.side_effect = HTTPException(status_code=400, detail="Bad request.")
+
+        router = _router(providers=[provider, other])
+
+        with pytest.raises(HTTPException) as exception:
+            await router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json={"input": ["hello"]})
+        assert exception.value.status_code == 400
+        other.forward_request.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_forward_request_respects_retry_budget(self, model_client):
+        providers = [model_client(url=f"http://{i}") for i in range(3)]
+        for provider in providers:
+            provider.forward_request.side_effect = HTTPException(status_code=502, detail="Bad gateway.")
+
+        router = _router(providers=providers, max_retries=1)
+
+        with pytest.raises(HTTPException):
+            await router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json={"input": ["hello"]})
+        assert sum(provider.forward_request.await_count for provider in providers) == 2
+
+    @pytest.mark.asyncio
+    async def test_forward_stream_fails_over_before_first_chunk(self, model_client):
+        sick, healthy = model_client(url="http://sick"), model_client(url="http://healthy")
+
+        async def sick_stream(**kwargs):
+            yield b'{"detail": "Request timed out, model is too busy."}', 504
+
+        async def healthy_stream(**kwargs):
+            yield b"data: hello\n\n", 200
+            yield b"data: [DONE]\n\n", 200
+
+        sick.forward_stream, healthy.forward_stream = sick_stream, healthy_stream
+        router = _router(providers=[sick, healthy], type="text-generation")
+
+        chunks = [chunk async for chunk in router.forward_stream(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json={"messages": []})]
+
+        assert chunks == [(b"data: hello\n\n", 200), (b"data: [DONE]\n\n", 200)]
+
+    @pytest.mark.asyncio
+    async def test_large_requests_are_split_across_providers(self, embeddings_model_client, context):
+        providers = [embeddings_model_client(url="http://a", max_batch_size=2), embeddings_model_client(url="http://b", max_batch_size=3)]
+        router = _router(providers=providers)
+        inputs = ["a" * i for i in range(1, 6)]
+
+        response = await router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json={"input": inputs}, additional_data={"extra": 1})
+        data = response.json()
+
+        # sub-batches fit in the smallest batch size and are served by all the providers
+        assert sorted(providers[0].inputs + providers[1].inputs) == [["a", "aa"], ["aaa", "aaaa"], ["aaaaa"]]
+        assert all(provider.inputs for provider in providers)
+        assert [item["index"] for item in data["data"]] == [0, 1, 2, 3, 4]
+        assert [item["embedding"] for item in data["data"]] == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+        assert data["usage"]["prompt_tokens"] == 5
+        assert len(data["usage"]["details"]) == 3
+        assert data["extra"] == 1
+
+        request_context.set(RequestContext(id="request-2", usage=Usage()))
+        router = _router(providers=providers, type="text-classification")
+        response = await router.forward_request(endpoint=ENDPOINT__RERANK, method="POST", json={"prompt": "a", "input": inputs})
+
+        assert [item["index"] for item in response.json()["data"]] == [4, 3, 2, 1, 0]
+
+    @pytest.mark.asyncio
+    async def test_long_requests_are_routed_to_providers_with_enough_context(self, model_client, tokenizer):
+        short, long = model_client(url="http://short", max_context_length=10), model_client(url="http://long", max_context_length=100)
+        router = _router(providers=[short, long], type="text-generation")
+
+        json = {"messages": [{"role": "user", "content": "hello " * 8}], "max_tokens": 10}
+        for _ in range(3):
+            await router.forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json=json)
+
+        assert short.forward_request.await_count == 0
+        assert long.forward_request.await_count == 3
+
+        # requests that do not fit in any provider are rejected before any upstream request
+        with pytest.raises(ContextLengthExceededException):
+            await router.forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json={**json, "max_tokens": 95})
+        assert long.forward_request.await_count == 3
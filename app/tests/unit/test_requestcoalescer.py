@@ -0,0 +1,76 @@
+import asyncio
+import contextvars
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.helpers._requestcoalescer import RequestCoalescer
+from app.helpers.models.routers import ModelRouter
+from app.schemas.core.context import RequestContext
+from app.schemas.usage import Usage
+from app.utils.context import global_context, request_context
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS, ENDPOINT__EMBEDDINGS
+
+
+async def _embed(router: ModelRouter, input: list, additional_data: dict, role_name: str = None) -> tuple[dict, Usage]:
+    request_context.set(RequestContext(id="request", role_name=role_name, usage=Usage()))
+    json = {"model": "my-model", "input": input}
+    response = await router.forward_request(endpoint=ENDPOINT__EMBEDDINGS, method="POST", json=json, additional_data=additional_data)
+
+    return response.json(), request_context.get().usage
+
+
+def _run(router: ModelRouter, input: list, additional_data: dict = None, role_name: str = None) -> asyncio.Task:
+    # each request has its own context, as in the API
+    return asyncio.create_task(_embed(router=router, input=input, additional_data=additional_data, role_name=role_name), context=contextvars.Context())  # fmt: off
+
+
+class TestRequestCoalescer:
+    @pytest.fixture
+    def router(self, embeddings_model_client):
+        global_context.request_coalescer = RequestCoalescer()
+
+        yield ModelRouter(name="my-model", type="text-embeddings-inference", owned_by="me", aliases=[], routing_strategy="round_robin", providers=[embeddings_model_client(cost=0.5, latency=0.01)])  # fmt: off
+
+        global_context.request_coalescer = None
+
+    @pytest.mark.asyncio
+    async def test_identical_requests_share_one_upstream_request(self, router):
+        results = await asyncio.gather(_run(router, input=["a", "b"], additional_data={"caller": 1}), _run(router, input=["a", "b"]))
+
+        assert router._providers[0].forward_request.await_count == 1
+
+        (first, first_usage), (second, second_usage) = results
+        assert first["data"] == second["data"]
+        assert first["id"] != second["id"]
+        assert first["caller"] == 1 and "caller" not in second
+
+        # each request is counted in its own usage
+        for data, usage in results:
+            assert usage.prompt_tokens == data["usage"]["prompt_tokens"] == 2
+            assert usage.cost == 1.0
+            assert len(usage.details) == 1
+
+        # different requests are not coalesced
+        await asyncio.gather(_run(router, input=["a", "b"]), _run(router, input=["a", "c"]))
+        assert router._providers[0].forward_request.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_shared_request_keeps_the_priority_of_its_request(self, router):
+        router._admission_controller.priorities = {"admin": -1}
+        router._admission_controller.get_priority = MagicMock(wraps=router._admission_controller.get_priority)
+
+        await asyncio.gather(_run(router, input=["a"], role_name="admin"), _run(router, input=["a"]))
+
+        assert router._providers[0].forward_request.await_count == 1
+        router._admission_controller.get_priority.assert_called_once_with(role="admin")
+
+    def test_only_deterministic_requests_are_coalesced(self):
+        messages = [{"role": "user", "content": "hi"}]
+
+        assert RequestCoalescer.get_key(model="my-model", endpoint=ENDPOINT__CHAT_COMPLETIONS, json={"messages": messages, "temperature": 0})
+        assert (
+            RequestCoalescer.get_key(model="my-model", endpoint=ENDPOINT__CHAT_COMPLETIONS, json={"messages": messages, "temperature": 0.7}) is None
+        )
+        assert RequestCoalescer.get_key(model="my-model", endpoint=ENDPOINT__CHAT_COMPLETIONS, json={"messages": messages}) is None
+        assert RequestCoalescer.get_key(model="my-model", endpoint=ENDPOINT__CHAT_COMPLETIONS, json={"messages": messages, "temperature": 0, "stream": True}) is None  # fmt: off
@@ -0,0 +1,102 @@
+from unittest.mock import AsyncMock, MagicMock
+
+from coredis import ConnectionPool
+import httpx
+import orjson
+import pytest
+
+from app.helpers._responsecache import ResponseCache
+from app.helpers._serversenteventsparser import ServerSentEventsParser
+from app.helpers.models.routers import ModelRouter
+from app.schemas.core.context import RequestContext
+from app.schemas.usage import Usage
+from app.utils.context import global_context, request_context
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
+
+USAGE = {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5, "cost": 0.5, "details": [{"id": "request-1", "model": "my-model", "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5, "cost": 0.5}}]}  # fmt: off
+
+
+async def _forward_request(method: str, json: dict, additional_data: dict = None, **kwargs) -> httpx.Response:
+    message = {"role": "assistant", "content": "hello world"}
+    data = {"id": "request-1", "object": "chat.completion", "created": 0, "model": "my-model", "choices": [{"index": 0, "message": message, "finish_reason": "stop"}], "usage": USAGE}  # fmt: off
+    data.update(additional_data or {})
+    return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
+
+
+async def _forward_stream(method: str, json: dict, **kwargs):
+    chunk = {"id": "request-1", "object": "chat.completion.chunk", "created": 0, "model": "my-model"}
+    yield b"data: " + orjson.dumps({**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "content": "hello"}, "finish_reason": None}]}) + b"\n\n", 200  # fmt: off
+    yield b"data: " + orjson.dumps({**chunk, "choices": [{"index": 0, "delta": {"content": " world"}, "finish_reason": "stop"}]}) + b"\n\n", 200  # fmt: off
+    yield b"data: " + orjson.dumps({**chunk, "choices": [], "usage": USAGE}) + b"\n\ndata: [DONE]\n\n", 200
+
+
+def _get_chunks(stream: bytes) -> list:
+    parser = ServerSentEventsParser()
+    return [parser.get_data(event=event) for event in parser.feed(chunk=stream)]
+
+
+class TestResponseCache:
+    @pytest.fixture
+    def router(self, context, model_client):
+        values = dict()
+        global_context.response_cache = ResponseCache(redis=ConnectionPool(), ttl=60, max_temperature=0.2)
+        global_context.response_cache.redis = AsyncMock()
+        global_context.response_cache.redis.get.side_effect = lambda key: values.get(key)
+        global_context.response_cache.redis.set.side_effect = lambda key, value, ex: values.update({key: value})
+
+        provider = model_client()
+        provider.forward_request.side_effect = _forward_request
+        provider.forward_stream = MagicMock(side_effect=_forward_stream)
+
+        yield ModelRouter(name="my-model", type="text-generation", owned_by="me", aliases=[], routing_strategy="round_robin", providers=[provider])  # fmt: off
+
+        global_context.response_cache = None
+
+    @pytest.mark.asyncio
+    async def test_cached_completion_is_returned_with_usage(self, router):
+        json = {"model": "my-model", "messages": [{"role": "user", "content": "hi"}], "temperature": 0}
+        await router.forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json=json)
+
+        request_context.set(RequestContext(id="request-2", usage=Usage()))
+        response = await router.forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json=json, additional_data={"search_results": []})
+
+        assert router._providers[0].forward_request.await_count == 1
+        data = response.json()
+        assert data["choices"][0]["message"]["content"] == "hello world"
+        assert data["id"] != "request-1"
+        assert data["search_results"] == []
+
+        # cache hits are counted in the usage as the original completion
+        assert data["usage"]["total_tokens"] == 5
+        assert data["usage"]["cost"] == 0.5
+        assert request_context.get().usage.details[-1].id == data["id"]
+
+    @pytest.mark.asyncio
+    async def test_cached_stream_is_replayed(self, router):
+        json = {"model": "my-model", "messages": [{"role": "user", "content": "hi"}], "temperature": 0, "stream": True}
+        chunks = [chunk async for chunk, _ in router.forward_stream(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json=json)]
+        assert len(chunks) == 3
+
+        # a streamed completion is also served to non-stream requests
+        response = await router.forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json={**json, "stream": False})
+        assert response.json()["choices"][0]["message"]["content"] == "hello world"
+
+        request_context.set(RequestContext(id="request-3", usage=Usage()))
+        chunks = [chunk async for chunk, _ in router.forward_stream(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json=json)]
+        events = _get_chunks(stream=b"".join(chunks))
+
+        assert router._providers[0].forward_stream.call_count == 1
+        router._providers[0].forward_request.assert_not_awaited()
+        assert events[-1] == b"[DONE]"
+        events = [orjson.loads(event) for event in events[:-1]]
+        assert "".join(choice["delta"].get("content", "") for event in events for choice in event["choices"]) == "hello world"
+        assert events[-2]["choices"][0]["finish_reason"] == "stop"
+        assert events[-1]["usage"]["total_tokens"] == 5
+
+    def test_response_cache_key_ignores_stream_and_high_temperatures(self):
+        cache = ResponseCache(redis=ConnectionPool(), ttl=60, max_temperature=0.2)
+        json = {"model": "my-model", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.1}
+
+        assert cache.get_key(model="my-model", body=json) == cache.get_key(model="my-model", body={**json, "stream": True})
+        assert cache.get_key(model="my-model", body=json) != cache.get_key(model="my-model", body={**json, "max_tokens": 10})
+        assert cache.get_key(model="my-model", body={**json, "temperature": 0.7}) is None
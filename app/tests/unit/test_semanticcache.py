@@ -0,0 +1,177 @@
+import math
+from unittest.mock import AsyncMock
+
+from coredis import ConnectionPool
+import httpx
+import orjson
+import pytest
+
+from app.helpers._semanticcache import SemanticCache
+from app.helpers.models.routers import ModelRouter
+from app.schemas.core.context import RequestContext
+from app.schemas.search import Search, SearchMethod
+from app.schemas.usage import Usage
+from app.utils.context import global_context, request_context
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
+
+
+async def _forward_request(method: str, json: dict, **kwargs) -> httpx.Response:
+    message = {"role": "assistant", "content": f"answer to {json['messages'][-1]['content']}"}
+    data = {"id": "request-1", "object": "chat.completion", "created": 0, "model": "my-model", "choices": [{"index": 0, "message": message, "finish_reason": "stop"}]}  # fmt: off
+    return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
+
+
+class FakeEmbeddingsModel:
+    name = "my-embeddings-model"
+    vector_size = 2
+
+    async def forward_request(self, endpoint: str, method: str, json: dict) -> httpx.Response:
+        request_context.get().usage.prompt_tokens += 1
+
+        # vector of the counts of "a" and "b" in the input
+        vector = [json["input"][0].count("a"), json["input"][0].count("b")]
+        return httpx.Response(status_code=200, json={"data": [{"index": 0, "embedding": vector}]})
+
+
+class FakeVectorStore:
+    def __init__(self) -> None:
+        self.collections = dict()
+
+    async def get_collections(self) -> list[int]:
+        return list(self.collections)
+
+    async def create_collection(self, collection_id: int, vector_size: int) -> None:
+        self.collections[collection_id] = list()
+
+    async def delete_document(self, collection_id: int, document_id: int) -> None:
+        self.collections[collection_id] = [(chunk, vector) for chunk, vector in self.collections[collection_id] if chunk.metadata["document_id"] != document_id]  # fmt: off
+
+    async def upsert(self, collection_id: int, chunks: list, embeddings: list) -> None:
+        self.collections[collection_id].extend(zip(chunks, embeddings))
+
+    async def search(self, method, collection_ids, query_prompt, query_vector, k, rff_k=20, score_threshold=0.0) -> list[Search]:
+        def cosine(u, v):
+            return sum(x * y for x, y in zip(u, v)) / (math.hypot(*u) * math.hypot(*v))
+
+        searches = [Search(method=SearchMethod.SEMANTIC, score=cosine(query_vector, vector), chunk=chunk) for chunk, vector in self.collections[collection_ids[0]]]  # fmt: off
+        searches = [search for search in searches if search.score >= score_threshold]
+
+        return sorted(searches, key=lambda search: search.score, reverse=True)[:k]
+
+
+async def _complete(router: ModelRouter, messages: list) -> str:
+    response = await router.forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json={"model": "my-model", "messages": messages})
+    await global_context.semantic_cache.close()  # completions are cached in background
+
+    return response.json()["choices"][0]["message"]["content"]
+
+
+class TestSemanticCache:
+    @pytest.fixture
+    def router(self, context, tokenizer, model_client):
+        global_context.semantic_cache = SemanticCache(vector_store=FakeVectorStore(), vector_store_model=FakeEmbeddingsModel(), redis=ConnectionPool(), models=["my-model"], threshold=0.99, ttl=60)  # fmt: off
+        global_context.semantic_cache.vector_store.collections[SemanticCache.COLLECTION_ID] = list()
+        global_context.semantic_cache.redis = AsyncMock()
+        global_context.semantic_cache.redis.zrangebyscore.return_value = ()
+
+        provider = model_client()
+        provider.forward_request.side_effect = _forward_request
+
+        yield ModelRouter(name="my-model", type="text-generation", owned_by="me", aliases=[], routing_strategy="round_robin", providers=[provider])  # fmt: off
+
+        global_context.semantic_cache = None
+
+    @pytest.mark.asyncio
+    async def test_completion_of_similar_prompt_is_returned(self, router):
+        system = {"role": "system", "content": "You are a helpful assistant."}
+
+        assert await _complete(router, messages=[system, {"role": "user", "content": "ab"}]) == "answer to ab"
+        assert await _complete(router, messages=[system, {"role": "user", "content": "aabb"}]) == "answer to ab"
+        assert router._providers[0].forward_request.await_count == 1
+
+        # dissimilar prompt
+        assert await _complete(router, messages=[system, {"role": "user", "content": "aab"}]) == "answer to aab"
+        assert router._providers[0].forward_request.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_completion_of_similar_prompt_is_billed_on_the_prompt_of_the_request(self, router):
+        router.cost_prompt_tokens, router.cost_completion_tokens = 1_000_000.0, 2_000_000.0  # 1.0 by prompt token, 2.0 by completion token
+        usage = {"prompt_tokens": 2, "completion_tokens": 3, "total_tokens": 5, "cost": 8.0}
+
+        async def forward_request(method: str, json: dict, **kwargs) -> httpx.Response:
+            response = await _forward_request(method=method, json=json)
+            return httpx.Response(status_code=200, json={**response.json(), "usage": {**usage, "details": [{"id": "request-1", "model": "my-model", "usage": usage}]}})  # fmt: off
+
+        router._providers[0].forward_request.side_effect = forward_request
+        await _complete(router, messages=[{"role": "user", "content": "a b"}])
+
+        request_context.set(RequestContext(id="request-2", usage=Usage()))
+        response = await router.forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json={"model": "my-model", "messages": [{"role": "user", "content": "a a b b"}]})  # fmt: off
+
+        assert router._providers[0].forward_request.await_count == 1
+        assert response.json()["choices"][0]["message"]["content"] == "answer to a b"
+        assert response.json()["usage"]["prompt_tokens"] == 4
+        assert response.json()["usage"]["completion_tokens"] == 3
+        assert response.json()["usage"]["total_tokens"] == 7
+        assert response.json()["usage"]["cost"] == 10.0
+
+    @pytest.mark.asyncio
+    async def test_completion_is_not_returned_for_other_system_prompt_or_conversation(self, router):
+        await _complete(router, messages=[{"role": "user", "content": "ab"}])
+
+        assert await _complete(router, messages=[{"role": "system", "content": "Be brief."}, {"role": "user", "content": "ab"}]) == "answer to ab"
+        assert router._providers[0].forward_request.await_count == 2
+
+        conversation = [{"role": "user", "content": "ab"}, {"role": "assistant", "content": "ok"}, {"role": "user", "content": "ab"}]
+        assert global_context.semantic_cache.get_prompt(model="my-model", body={"messages": conversation}) is None
+        await _complete(router, messages=conversation)
+        assert router._providers[0].forward_request.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_prompt_lookup_is_not_counted_in_the_usage_of_the_user(self, router):
+        await _complete(router, messages=[{"role": "user", "content": "ab"}])
+        await _complete(router, messages=[{"role": "user", "content": "ab"}])
+
+        assert router._providers[0].forward_request.await_count == 1
+        # only the prompt of the cache hit is counted, not the prompts vectorized for the lookups
+        assert request_context.get().usage.prompt_tokens == 1
+
+    @pytest.mark.asyncio
+    async def test_requests_augmented_with_search_results_are_not_cached(self, router):
+        cache = global_context.semantic_cache
+        await _complete(router, messages=[{"role": "user", "content": "ab"}])
+        cache.vector_store.search = AsyncMock(side_effect=cache.vector_store.search)
+        cache.vector_store.upsert = AsyncMock(side_effect=cache.vector_store.upsert)
+
+        # the prompt contains chunks of the private collections of the user
+        json = {"model": "my-model", "messages": [{"role": "user", "content": "ab"}]}
+        await router.forward_request(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json=json, additional_data={"search_results": [{}]})
+        await cache.close()
+
+        assert router._providers[0].forward_request.await_count == 2
+        cache.vector_store.search.assert_not_awaited()
+        cache.vector_store.upsert.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_completion_of_same_prompt_is_replaced(self, router):
+        cache = global_context.semantic_cache
+        body = {"model": "my-model", "messages": [{"role": "user", "content": "ab"}]}
+
+        await cache.set(model="my-model", body=body, vector=[1, 1], completion={"id": "1"})
+        await cache.set(model="my-model", body=body, vector=[1, 1], completion={"id": "2"})
+
+        chunks = [chunk for chunk, _ in cache.vector_store.collections[SemanticCache.COLLECTION_ID]]
+        assert [orjson.loads(chunk.content) for chunk in chunks] == [{"id": "2"}]
+        assert cache.redis.zadd.call_args.args[1] == {str(chunks[0].id): chunks[0].metadata["created"]}
+
+    @pytest.mark.asyncio
+    async def test_expired_completions_are_deleted(self, router):
+        cache = global_context.semantic_cache
+        await cache.set(model="my-model", body={"model": "my-model", "messages": [{"role": "user", "content": "ab"}]}, vector=[1, 1], completion={})
+        chunk, _ = cache.vector_store.collections[SemanticCache.COLLECTION_ID][0]
+        cache.redis.zrangebyscore.return_value = (str(chunk.id).encode(),)
+
+        assert await cache.evict() == 1
+
+        assert cache.vector_store.collections[SemanticCache.COLLECTION_ID] == []
+        cache.redis.zrem.assert_awaited_once_with(SemanticCache.EXPIRATION_KEY, (str(chunk.id).encode(),))
@@ -0,0 +1,78 @@
+from json import dumps, loads
+
+import httpx
+import pytest
+
+from app.helpers._serversenteventsparser import ServerSentEventsParser
+from app.utils.context import request_context
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
+
+
+def _chunk(content: str) -> dict:
+    return {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "upstream", "choices": [{"index": 0, "delta": {"content": content}}]}  # fmt: off
+
+
+class TestServerSentEventsParser:
+    def test_feed_returns_complete_events(self):
+        parser = ServerSentEventsParser()
+
+        events = parser.feed(chunk=b'data: {"a": 1}\n\ndata: {"b": 2}\n\n')
+
+        assert events == [b'data: {"a": 1}\n\n', b'data: {"b": 2}\n\n']
+
+    def test_feed_keeps_event_split_across_chunks(self):
+        parser = ServerSentEventsParser()
+
+        assert parser.feed(chunk=b'data: {"a"') == []
+        assert parser.feed(chunk=b": 1}\n") == []
+        assert parser.feed(chunk=b'\ndata: {"b": 2}') == [b'data: {"a": 1}\n\n']
+        assert parser.flush() == b'data: {"b": 2}\n\n'
+        assert parser.flush() is None
+
+    def test_feed_normalizes_carriage_returns(self):
+        parser = ServerSentEventsParser()
+
+        events = parser.feed(chunk=b"data: [DONE]\r\n\r\n")
+
+        assert events == [b"data: [DONE]\n\n"]
+
+    def test_feed_keeps_crlf_split_across_chunks(self):
+        parser = ServerSentEventsParser()
+
+        assert parser.feed(chunk=b'data: {"a": 1}\r') == []
+        assert parser.feed(chunk=b'\ndata: {"b": 2}\r') == []
+        assert parser.feed(chunk=b"\n\r") == []
+        assert parser.feed(chunk=b"\n") == [b'data: {"a": 1}\ndata: {"b": 2}\n\n']
+
+    def test_get_data(self):
+        assert ServerSentEventsParser.get_data(event=b"data: [DONE]\n\n") == b"[DONE]"
+        assert ServerSentEventsParser.get_data(event=b"data:a\ndata: b\n\n") == b"a\nb"
+        assert ServerSentEventsParser.get_data(event=b": keep-alive\n\n") is None
+
+    @pytest.mark.asyncio
+    async def test_forward_stream_frames_events_across_network_chunks(self, http_model_client, tokenizer, context):
+        stream = b"".join([f"data: {dumps(_chunk(content))}\n\n".encode() for content in ["Hello", " world"]]) + b"data: [DONE]\n\n"
+        network_chunks = [stream[i : i + 7] for i in range(0, len(stream), 7)]
+
+        class NetworkStream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                for chunk in network_chunks:
+                    yield chunk
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(status_code=200, headers={"Content-Type": "text/event-stream"}, stream=NetworkStream())
+
+        client = http_model_client(handler=handler, endpoint=ENDPOINT__CHAT_COMPLETIONS)
+
+        output = [chunk async for chunk, status_code in client.forward_stream(method="POST", json={"model": "my-model", "messages": []})]
+        events = ServerSentEventsParser().feed(chunk=b"".join(output))
+        data = [ServerSentEventsParser.get_data(event=event) for event in events]
+
+        assert len(events) == 4
+        assert data[-1] == b"[DONE]"
+        extra_chunk = loads(data[-2])
+        assert extra_chunk["model"] == "my-model"
+        assert extra_chunk["id"] == "chatcmpl-1"
+        assert extra_chunk["choices"] == []
+        assert extra_chunk["usage"]["completion_tokens"] == 2
+        assert request_context.get().usage.completion_tokens == 2
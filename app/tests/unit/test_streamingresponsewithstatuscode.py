@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from app.helpers._streamingresponsewithstatuscode import StreamingResponseWithStatusCode, streams_cancelled
+from app.helpers.models.routers import ModelRouter
+from app.helpers.models.routers._modelrouter import ModelStream
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
+
+
+async def _send_stream(response: StreamingResponseWithStatusCode) -> list:
+    bodies = list()
+
+    async def receive() -> dict:
+        await asyncio.Event().wait()
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.body":
+            bodies.append(message["body"])
+
+    await asyncio.wait_for(response(scope={"type": "http"}, receive=receive, send=send), timeout=1)
+
+    return bodies
+
+
+class TestStreamingResponseWithStatusCode:
+    @pytest.mark.asyncio
+    async def test_stream_is_closed_when_client_disconnects(self):
+        closed, sent, disconnected = asyncio.Event(), list(), asyncio.Event()
+
+        async def content():
+            try:
+                while True:
+                    yield b"data: chunk\n\n", 200
+                    await asyncio.sleep(0.01)
+            finally:
+                closed.set()
+
+        async def receive() -> dict:
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            sent.append(message)
+            if len(sent) == 3:
+                disconnected.set()
+
+        cancelled = streams_cancelled._value.get()
+        response = StreamingResponseWithStatusCode(content=content(), media_type="text/event-stream")
+        await asyncio.wait_for(response(scope={"type": "http", "asgi": {"spec_version": "2.4"}}, receive=receive, send=send), timeout=1)
+
+        assert closed.is_set()
+        assert sent[0]["status"] == 200
+        assert streams_cancelled._value.get() == cancelled + 1
+
+    @pytest.mark.asyncio
+    async def test_completed_stream_is_not_counted_as_cancelled(self):
+        async def content():
+            yield b"data: chunk\n\n", 200
+            yield b"data: [DONE]\n\n", 200
+
+        async def receive() -> dict:
+            await asyncio.Event().wait()
+
+        async def send(message: dict) -> None:
+            pass
+
+        cancelled = streams_cancelled._value.get()
+        response = StreamingResponseWithStatusCode(content=content(), media_type="text/event-stream")
+        await asyncio.wait_for(response(scope={"type": "http"}, receive=receive, send=send), timeout=1)
+
+        assert response.response_completed
+        assert streams_cancelled._value.get() == cancelled
+
+    @pytest.mark.asyncio
+    async def test_chunks_are_coalesced_within_the_window(self):
+        async def content():
+            yield b"data: 1\n\n", 200
+            yield b"data: 2\n\n", 200
+            yield b"data: 3\n\n", 200
+            await asyncio.sleep(0.1)
+            yield b"data: [DONE]\n\n", 200
+
+        response = StreamingResponseWithStatusCode(content=content(), media_type="text/event-stream", coalescing_window_ms=50, coalescing_max_bytes=1024)  # fmt: off
+
+        # the first chunk is sent at once, the chunk received after the window is sent in another write
+        assert await _send_stream(response) == [b"data: 1\n\n", b"data: 2\n\ndata: 3\n\n", b"data: [DONE]\n\n", b""]
+
+    @pytest.mark.asyncio
+    async def test_chunks_are_sent_when_the_byte_budget_is_reached(self):
+        async def content():
+            for i in range(5):
+                yield f"data: {i}\n\n".encode(), 200
+
+        response = StreamingResponseWithStatusCode(content=content(), media_type="text/event-stream", coalescing_window_ms=1000, coalescing_max_bytes=18)  # fmt: off
+
+        assert await _send_stream(response) == [b"data: 0\n\n", b"data: 1\n\ndata: 2\n\n", b"data: 3\n\ndata: 4\n\n", b""]
+
+    @pytest.mark.asyncio
+    async def test_background_runs_when_client_disconnects_while_waiting_for_a_chunk(self):
+        closed, ran, disconnected = asyncio.Event(), list(), asyncio.Event()
+
+        async def content():
+            try:
+                yield b"data: 1\n\n", 200
+                yield b"data: 2\n\n", 200
+                await asyncio.sleep(10)
+            finally:
+                closed.set()
+
+        async def receive() -> dict:
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            disconnected.set()
+
+        async def background() -> None:
+            ran.append(response.status_code)
+
+        response = StreamingResponseWithStatusCode(content=content(), media_type="text/event-stream", coalescing_window_ms=1000, background=background)  # fmt: off
+        await asyncio.wait_for(response(scope={"type": "http"}, receive=receive, send=send), timeout=1)
+
+        assert closed.is_set()
+        assert ran == [200]
+
+    @pytest.mark.asyncio
+    async def test_stream_of_the_provider_is_read_after_the_first_chunk(self, model_client, context, monkeypatch):
+        async def forward_stream(**kwargs):
+            for i in range(3):
+                yield f"data: {i}\n\n".encode(), 200
+
+        client = model_client(max_concurrent_requests=1)
+        client.forward_stream = forward_stream
+        router = ModelRouter(name="my-model", type="text-generation", owned_by="me", aliases=[], routing_strategy="round_robin", providers=[client])  # fmt: off
+
+        reads = list()
+        anext_ = ModelStream.__anext__
+
+        async def spy(stream: ModelStream):
+            reads.append(stream)
+            return await anext_(stream)
+
+        monkeypatch.setattr(ModelStream, "__anext__", spy)
+        content = router.forward_stream(endpoint=ENDPOINT__CHAT_COMPLETIONS, method="POST", json={"messages": []})
+        response = StreamingResponseWithStatusCode(content=content, media_type="text/event-stream", coalescing_window_ms=0)
+
+        assert await _send_stream(response) == [b"data: 0\n\n", b"data: 1\n\n", b"data: 2\n\n", b""]
+
+        # only the first chunk goes through the stream of the model, the provider is released at the end of the response
+        assert len(reads) == 1
+        assert router._admission_controller._running[client] == 0
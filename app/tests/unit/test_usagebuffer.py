@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import pytest
+
+from app.helpers._usagebuffer import UsageBuffer, usage_buffer_dropped
+from app.sql.models import Usage
+
+
+def _usage(user_id: int) -> Usage:
+    return Usage(datetime=datetime.now(), user_id=user_id, endpoint="/v1/chat/completions", prompt_tokens=10)
+
+
+class TestUsageBuffer:
+    @pytest.mark.asyncio
+    async def test_usage_buffer_writes_usage_logs_in_a_single_insert(self, session):
+        buffer = UsageBuffer(flush_interval_ms=3_600_000)
+
+        buffer.add(usage=_usage(user_id=1))
+        buffer.add(usage=_usage(user_id=2))
+        await buffer.close()
+
+        session.execute.assert_awaited_once()
+        rows = session.execute.call_args.args[1]
+        assert [row["user_id"] for row in rows] == [1, 2]
+        assert "id" not in rows[0]
+        session.commit.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_usage_buffer_retries_then_drops_failed_writes(self, session):
+        buffer = UsageBuffer(flush_interval_ms=3_600_000, batch_size=2, max_size=3, max_retries=1, retry_backoff=0.0)
+        session.execute.side_effect = [ConnectionError("PostgreSQL is not reachable."), None, ConnectionError("PostgreSQL is not reachable.")] * 2
+
+        for user_id in range(4):
+            buffer.add(usage=_usage(user_id=user_id))
+        assert len(buffer._rows) == 3
+
+        # the first batch is written on retry, the second one is dropped after the last retry
+        dropped = usage_buffer_dropped.labels(reason="error")._value.get()
+        await buffer.close()
+        assert len(buffer._rows) == 0
+        assert session.execute.await_count == 4
+        assert session.commit.await_count == 1
+        assert usage_buffer_dropped.labels(reason="error")._value.get() == dropped + 1
@@ -0,0 +1,73 @@
+from app.helpers._usagetokenizer import TokenCountsCache
+from app.schemas.core.context import RequestContext
+from app.utils.context import request_context
+from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
+
+
+def _chunk(choices: list, usage: dict = None) -> dict:
+    return {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "upstream", "choices": choices, "usage": usage}
+
+
+class TestUsageTokenizer:
+    def test_stream_accumulator_counts_completion_tokens_per_choice(self, tokenizer):
+        accumulator = tokenizer.get_stream_accumulator()
+
+        assert accumulator.add(chunk=_chunk(choices=[{"index": 0, "delta": {"role": "assistant", "content": ""}}])) == 0
+        assert accumulator.add(chunk=_chunk(choices=[{"index": 0, "delta": {"content": "hello world"}}])) == 2
+        assert accumulator.add(chunk=_chunk(choices=[{"index": 1, "delta": {"content": "bonjour"}}])) == 1
+
+        assert accumulator.id == "chatcmpl-1"
+        assert accumulator.choices_completion_tokens == {0: 2, 1: 1}
+        assert tokenizer.get_completion_tokens(endpoint=ENDPOINT__CHAT_COMPLETIONS, response=accumulator, stream=True) == 3
+
+    def test_stream_accumulator_trusts_upstream_usage(self, tokenizer):
+        accumulator = tokenizer.get_stream_accumulator()
+
+        accumulator.add(chunk=_chunk(choices=[{"index": 0, "delta": {"content": "hello world"}}]))
+        accumulator.add(chunk=_chunk(choices=[], usage={"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}))
+
+        assert accumulator.completion_tokens == 5
+        assert accumulator.last_chunk["choices"] == []
+
+    def test_prompt_tokens_are_counted_once_per_request(self, tokenizer):
+        request_context.set(RequestContext(id="request-1"))
+        body = {"messages": [{"role": "system", "content": "be brief"}, {"role": "user", "content": "hello world"}]}
+
+        assert tokenizer.get_prompt_tokens(endpoint=ENDPOINT__CHAT_COMPLETIONS, body=body) == 4
+        assert tokenizer.get_prompt_tokens(endpoint=ENDPOINT__CHAT_COMPLETIONS, body=body) == 4
+        assert tokenizer.tokenizer.encoded == ["be brief", "hello world"]
+
+        # augmented prompt: only the modified message is tokenized again
+        body["messages"][-1]["content"] = "hello world with some chunks"
+        assert tokenizer.get_prompt_tokens(endpoint=ENDPOINT__CHAT_COMPLETIONS, body=body) == 7
+        assert tokenizer.tokenizer.encoded == ["be brief", "hello world", "hello world with some chunks"]
+
+        # each request has its own counts
+        request_context.set(RequestContext(id="request-2"))
+        tokenizer.get_prompt_tokens(endpoint=ENDPOINT__CHAT_COMPLETIONS, body=body)
+        assert len(tokenizer.tokenizer.encoded) == 5
+
+    def test_token_counts_are_cached_across_turns(self, tokenizer):
+        tokenizer.cache = TokenCountsCache(max_bytes=100 * TokenCountsCache.ENTRY_SIZE)
+        messages = [{"role": "user", "content": "hello world"}]
+
+        for turn in range(3):
+            request_context.set(RequestContext(id=f"request-{turn}"))
+            messages += [{"role": "assistant", "content": f"answer {turn}"}, {"role": "user", "content": f"question {turn}"}]
+            assert tokenizer.get_prompt_tokens(endpoint=ENDPOINT__CHAT_COMPLETIONS, body={"messages": messages}) == 2 + 4 * (turn + 1)
+
+        # only the new messages of each turn are tokenized
+        assert tokenizer.tokenizer.encoded == ["hello world", "answer 0", "question 0", "answer 1", "question 1", "answer 2", "question 2"]
+        assert tokenizer.cache.hits == 8 and tokenizer.cache.misses == 7
+        assert tokenizer.cache.hit_rate == 8 / 15
+
+    def test_token_counts_cache_is_bounded_by_size(self):
+        cache = TokenCountsCache(max_bytes=2 * TokenCountsCache.ENTRY_SIZE)
+        for text in ["a", "b", "c"]:
+            cache.set(key=cache.get_key(text=text), tokens=1)
+            cache.get(key=cache.get_key(text="a"))  # the least recently used count is evicted first
+
+        assert cache.size == 2 * TokenCountsCache.ENTRY_SIZE
+        assert cache.get(key=cache.get_key(text="a")) == 1
+        assert cache.get(key=cache.get_key(text="b")) is None
+        assert cache.get(key=cache.get_key(text="c")) == 1
@@ -1,8 +1,14 @@
 from contextvars import ContextVar
+import logging
 from uuid import uuid4
 
+from fastapi import Request
+import orjson
+
 from app.schemas.core.context import GlobalContext, RequestContext
 
+logger = logging.getLogger(__name__)
+
 global_context: GlobalContext = GlobalContext()
 request_context: ContextVar[RequestContext] = ContextVar("request_context", default=RequestContext())
 
@@ -12,3 +18,48 @@ def generate_request_id() -> str:
     Get the ID of the request.
     """
     return f"request-{str(uuid4()).replace("-", "")}"
+
+
+async def get_request_body(request: Request) -> dict:
+    """
+    Get the body of the request, parsed once and cached in the request context so that the access controller, the hooks and the endpoints share
+    the same decoding. The JSON body is taken from the request if already decoded by FastAPI to validate the endpoint parameters. Forms (multipart
+    or URL-encoded) are returned as a dict of their fields, with the uploaded files as is.
+
+    Args:
+        request(Request): The request.
+
+    Returns:
+        dict: The parsed body of the request, an empty dict if the body is empty or can not be parsed.
+    """
+    context = request_context.get()
+    if context.body is not None:
+        return context.body
+
+    body = {}
+    content_type = request.headers.get("content-type", "").lower()
+    try:
+        if content_type.startswith("multipart/form-data") or content_type.startswith("application/x-www-form-urlencoded"):
+            form = await request.form()
+            body = {key: value for key, value in form.items()}
+        else:
+            raw_body = await request.body()
+            if raw_body:
+                body = getattr(request, "_json", None)  # decoded by FastAPI to validate the endpoint parameters
+                if body is None:
+                    try:
+                        body = orjson.loads(raw_body)
+                    except orjson.JSONDecodeError:
+                        # invalid UTF-8 characters are replaced
+                        body = orjson.loads(raw_body.decode("utf-8", errors="replace"))
+            context.raw_body = raw_body
+    except Exception:
+        logger.warning(f"Failed to parse request body ({request.url.path}).", exc_info=True)
+
+    body = body if isinstance(body, dict) else {}
+
+    # the default context, outside of a request, is not used as a cache
+    if context.id is not None:
+        context.body = body
+
+    return body
@@ -49,6 +49,11 @@ class InvalidTokenExpirationException(HTTPException):
         super().__init__(status_code=400, detail=detail)
 
 
+class ContextLengthExceededException(HTTPException):
+    def __init__(self, detail: str = "Prompt exceeds the maximum context length of the model."):
+        super().__init__(status_code=400, detail=detail)
+
+
 # 403
 class InvalidPasswordException(HTTPException):
     def __init__(self, detail: str = "Invalid password."):
@@ -173,6 +178,11 @@ class RateLimitExceeded(HTTPException):
         super(RateLimitExceeded, self).__init__(status_code=429, detail=detail)
 
 
+class ModelOverloadedException(HTTPException):
+    def __init__(self, detail: str = "Model is too busy, too many requests are waiting for a provider.", retry_after: int = 1) -> None:
+        super().__init__(status_code=429, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
 # 500
 class ChunkingFailedException(HTTPException):
     def __init__(self, detail: str = "Chunking failed.") -> None:
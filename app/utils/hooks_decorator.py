@@ -1,19 +1,17 @@
-import asyncio
 from datetime import datetime
 import functools
-import json
 import logging
 from typing import Optional
 
 from fastapi import HTTPException, Request, Response
-from sqlalchemy import func, select, update
+import orjson
+from starlette.background import BackgroundTask, BackgroundTasks
 from starlette.responses import StreamingResponse
 
 from app.helpers._streamingresponsewithstatuscode import StreamingResponseWithStatusCode
-from app.sql.models import Usage, User
-from app.sql.session import get_db_session
+from app.sql.models import Usage
 from app.utils.configuration import configuration
-from app.utils.context import global_context, request_context
+from app.utils.context import get_request_body, global_context, request_context
 
 logger = logging.getLogger(__name__)
 
@@ -68,101 +66,71 @@ def hooks(func):
 
             # extract usage from non-streaming response
             else:
-                # extract_usage_from_response calls perform_log internally
-                asyncio.create_task(extract_usage_from_response(response=response, start_time=start_time, usage=usage))
+                # extract_usage_from_response calls perform_log internally, in the background task of the response which is run after the
+                # response is sent and awaited by the server before shutting down
+                if isinstance(response, Response):
+                    add_background_task(
+                        response=response, task=BackgroundTask(extract_usage_from_response, response=response, start_time=start_time, usage=usage)
+                    )
+                else:
+                    await extract_usage_from_response(response=response, start_time=start_time, usage=usage)
                 return response
 
         except HTTPException as e:
             usage.status = e.status_code
-            asyncio.create_task(log_usage(response=None, usage=usage, start_time=start_time))
+            log_usage(response=None, usage=usage, start_time=start_time)
             raise e  # Re-raise the exception for FastAPI to handle
 
     return wrapper
 
 
-async def extract_usage_from_request(usage: Usage, request: Request):
-    content_type = request.headers.get("Content-Type", "")
+def add_background_task(response: Response, task: BackgroundTask) -> None:
+    """
+    Adds a task to run after the response is sent, after the background task already set by the endpoint if any.
+    """
+    response.background = BackgroundTasks(tasks=[response.background, task] if response.background is not None else [task])
 
-    if content_type.startswith("multipart/form-data"):
-        body = await request.form()
-        body = {key: value for key, value in body.items()}
-        usage.request_model = body.get("model")
-    else:
-        try:
-            body = await request.body()
-            body = json.loads(body.decode("utf-8")) if body else {}
-            usage.request_model = body.get("model")
-        except Exception as e:
-            logger.warning(f"Failed to parse JSON request body ({request.url.path}): {e}")
+
+async def extract_usage_from_request(usage: Usage, request: Request):
+    body = await get_request_body(request=request)
+    usage.request_model = body.get("model")
 
 
 def extract_usage_from_streaming_response(response: StreamingResponse, start_time: datetime, usage: Usage) -> StreamingResponseWithStatusCode:
-    original_stream = response.body_iterator
-    buffer = []
+    """
+    Logs usage at the end of the stream, in the background task of the streaming response. The stream is not wrapped nor buffered: usage is read
+    from the request context, which is filled by the model client when it computes the final usage chunk of the stream (or when the stream is
+    interrupted by the client).
+    """
+    if not isinstance(response, StreamingResponseWithStatusCode):
+        response = StreamingResponseWithStatusCode(response.body_iterator, media_type=response.media_type)
 
-    async def wrapped_stream():
-        nonlocal usage, buffer  # Add final_response_status_code
-        response_status_code = None
+    async def log_stream_usage():
+        if response.first_chunk_at is not None:
+            usage.time_to_first_token = int((response.first_chunk_at - start_time).total_seconds() * 1000)
 
-        async for chunk in original_stream:  # This item is (content, status_from_original_stream)
-            if isinstance(chunk, tuple):
-                content = chunk[0]
-                response_status_code = chunk[1]
-            else:
-                content = chunk
-                response_status_code = response.status_code
-
-            try:
-                usage.time_to_first_token = int((datetime.now() - start_time).total_seconds() * 1000) if usage.time_to_first_token is None else usage.time_to_first_token  # fmt: off
-                buffer.append(content)  # Appends only the content part
-            except Exception:
-                logger.warning("Failed to process chunk in streaming response for usage/buffer calculations")
-                # Continue to yield the original item even if buffer append fails
-                pass
-
-            # Yield the original item from the downstream iterator.
-            # This preserves its structure, e.g., (content, original_status_code),
-            # ensuring the correct status code is passed to StreamingResponseWithStatusCode.
-            yield chunk
-
-        if buffer:
-            for lines in buffer:
-                lines = lines.decode(encoding="utf-8").split(sep="\n\n")
-                for line in lines:
-                    line = line.strip()
-                    if not line.startswith("data: "):
-                        continue
-                    line = line.removeprefix("data: ")
-                    if not line:
-                        continue
-                    try:
-                        data = json.loads(line)
-                    except json.JSONDecodeError as e:
-                        logger.debug(f"Failed to decode JSON from streaming response ({e}) on the following chunk: {line}.")
-                        continue
-
-                    # last chunk overrides previous chunks
-                    if data.get("model"):
-                        usage.model = data["model"]
-
-                    if data.get("usage"):
-                        usage.prompt_tokens = data["usage"]["prompt_tokens"]
-                        usage.completion_tokens = data["usage"]["completion_tokens"]
-                        usage.total_tokens = data["usage"]["total_tokens"]
-                        usage.cost = data["usage"].get("cost", None)
-                        usage.kwh_min = data["usage"].get("carbon", {}).get("kWh", {}).get("min", None)
-                        usage.kwh_max = data["usage"].get("carbon", {}).get("kWh", {}).get("max", None)
-                        usage.kgco2eq_min = data["usage"].get("carbon", {}).get("kgCO2eq", {}).get("min", None)
-                        usage.kgco2eq_max = data["usage"].get("carbon", {}).get("kgCO2eq", {}).get("max", None)
-
-        # Set usage.status with the captured status code before calling write_usage
-        if response_status_code is not None:
-            usage.status = response_status_code
-
-        asyncio.create_task(log_usage(response=response, usage=usage, start_time=start_time))
-        asyncio.create_task(update_budget(usage=usage))
-
-    return StreamingResponseWithStatusCode(wrapped_stream(), media_type=response.media_type)
+        # same usage as the one sent in the last chunk of the stream
+        context_usage = request_context.get().usage
+        if context_usage and context_usage.details:
+            usage.model = context_usage.details[-1].model
+            usage.prompt_tokens = context_usage.prompt_tokens
+            usage.completion_tokens = context_usage.completion_tokens
+            usage.total_tokens = context_usage.total_tokens
+            usage.cost = context_usage.cost
+            usage.kwh_min = context_usage.carbon.kWh.min
+            usage.kwh_max = context_usage.carbon.kWh.max
+            usage.kgco2eq_min = context_usage.carbon.kgCO2eq.min
+            usage.kgco2eq_max = context_usage.carbon.kgCO2eq.max
+
+        # status code of the last chunk of the stream
+        usage.status = response.status_code
+
+        log_usage(response=response, usage=usage, start_time=start_time)
+        await update_budget(usage=usage)
+
+    add_background_task(response=response, task=BackgroundTask(log_stream_usage))
+
+    return response
 
 
 async def extract_usage_from_response(response: Response, start_time: datetime, usage: Usage):
@@ -175,7 +143,7 @@ async def extract_usage_from_response(response: Response, start_time: datetime,
     try:
         body = {}
         if hasattr(response, "body") and response.body:
-            body = json.loads(response.body)
+            body = orjson.loads(response.body)
 
         usage.model = body.get("model", None)
         response_usage = body.get("usage", {})
@@ -192,17 +160,17 @@ async def extract_usage_from_response(response: Response, start_time: datetime,
         logger.warning(f"Failed to parse JSON response body: {response.body} ({e})")
         return
 
-    asyncio.create_task(log_usage(response, usage, start_time))
-    asyncio.create_task(update_budget(usage=usage))
+    log_usage(response=response, usage=usage, start_time=start_time)
+    await update_budget(usage=usage)
 
 
-async def log_usage(response: Optional[Response], usage: Usage, start_time: datetime):
+def log_usage(response: Optional[Response], usage: Usage, start_time: datetime):
     """
-    Logs the usage information to the database.
+    Logs the usage information to the database, through the usage buffer which writes the usage logs in batches.
     This function captures the duration of the request and sets the status code of the response if available.
     """
 
-    if configuration.settings.monitoring_postgres_enabled is False:
+    if configuration.settings.monitoring_postgres_enabled is False or global_context.usage_buffer is None:
         return
 
     usage.duration = int((datetime.now() - start_time).total_seconds() * 1000)
@@ -214,53 +182,21 @@ async def log_usage(response: Optional[Response], usage: Usage, start_time: date
     if usage.request_model:
         usage.request_model = global_context.model_registry.aliases.get(usage.request_model, usage.request_model)
 
-    async for session in get_db_session():
-        session.add(usage)
-        try:
-            await session.commit()
-        except Exception as e:
-            logger.error(f"Failed to log usage: {e}")
-            await session.rollback()
+    global_context.usage_buffer.add(usage=usage)
 
 
 async def update_budget(usage: Usage):
     """
     Updates the budget of the user by decreasing it by the calculated cost.
-    Retrieves the current user budget, and decreases it by min(usage.budget, current_budget_value).
-    Uses row-level locking to prevent concurrency issues.
+    The budget is decreased in the budget ledger with an atomic operation which does not go below zero, the budget is written in the database
+    in batches by the budget ledger, so that concurrent requests of a user do not lock its row.
     """
     # Check if there's a budget cost to deduct
     if usage.cost is None or usage.cost == 0:
         return
 
-    user_id = usage.user_id
-    cost = usage.cost
-
-    if not user_id:
+    if not usage.user_id:
         logger.warning("No user_id found in usage object for budget update")
         return
 
-    # Decrease the user's budget by the calculated cost with proper locking
-    async for session in get_db_session():
-        try:
-            async with session.begin():
-                # Use SELECT FOR UPDATE to lock the user row during the transaction. This prevents concurrent modifications to the budget
-                select_stmt = select(User.budget).where(User.id == user_id).with_for_update()
-                result = await session.execute(select_stmt)
-                current_budget = result.scalar_one_or_none()
-
-                if current_budget is None or current_budget == 0:
-                    return
-
-                # Calculate the actual cost to deduct (minimum of requested cost and available budget)
-                actual_cost = min(cost, current_budget)
-                new_budget = round(current_budget - actual_cost, ndigits=6)
-
-                # Update the budget
-                update_stmt = update(User).where(User.id == user_id).values(budget=new_budget, updated_at=func.now()).returning(User.budget)
-
-                result = await session.execute(update_stmt)
-
-        except Exception as e:
-            logger.exception(f"Failed to update budget for user {user_id}: {e}")
-            return
+    await global_context.budget_ledger.debit(user_id=usage.user_id, cost=usage.cost)
@@ -1,9 +1,14 @@
+import asyncio
 from contextlib import asynccontextmanager
+import os
+import socket
 import traceback
 from types import SimpleNamespace
+from typing import List, Set, Tuple
 
 from coredis import ConnectionPool, Redis
 from fastapi import FastAPI
+import orjson
 
 from app.clients.mcp_bridge import BaseMCPBridgeClient as MCPBridgeClient
 from app.clients.model import BaseModelClient as ModelClient
@@ -11,16 +16,24 @@ from app.clients.parser import BaseParserClient as ParserClient
 from app.clients.vector_store import BaseVectorStoreClient as VectorStoreClient
 from app.clients.web_search_engine import BaseWebSearchEngineClient as WebSearchEngineClient
 from app.helpers._agentmanager import AgentManager
+from app.helpers._budgetledger import BudgetLedger
+from app.helpers._circuitbreaker import CircuitBreaker
 from app.helpers._documentmanager import DocumentManager
+from app.helpers._embeddingscache import EmbeddingsCache
 from app.helpers._identityaccessmanager import IdentityAccessManager
 from app.helpers._limiter import Limiter
+from app.helpers._metricsbuffer import MetricsBuffer
 from app.helpers._multiagentmanager import MultiAgentManager
 from app.helpers._parsermanager import ParserManager
+from app.helpers._requestcoalescer import RequestCoalescer
+from app.helpers._responsecache import ResponseCache
+from app.helpers._semanticcache import SemanticCache
+from app.helpers._usagebuffer import UsageBuffer
 from app.helpers._usagetokenizer import UsageTokenizer
 from app.helpers._websearchmanager import WebSearchManager
 from app.helpers.models import ModelRegistry
 from app.helpers.models.routers import ModelRouter
-from app.schemas.core.configuration import Configuration
+from app.schemas.core.configuration import Configuration, Model, RoutingStrategy
 from app.schemas.core.context import GlobalContext
 from app.utils.configuration import get_configuration
 from app.utils.context import global_context
@@ -44,62 +57,324 @@ async def lifespan(app: FastAPI):
 
     redis_test_client = Redis(connection_pool=redis)
     assert (await redis_test_client.ping()).decode("ascii") == "PONG", "Redis database is not reachable."
-    assert await vector_store.check() if vector_store else True, "Vector store database is not reachable."
+
+    # check dependencies concurrently
+    vector_store_check, parser_check, mcp_bridge_check = await asyncio.gather(
+        vector_store.check() if vector_store else asyncio.sleep(0, result=True),
+        parser.check() if parser else asyncio.sleep(0, result=True),
+        mcp_bridge.check() if mcp_bridge else asyncio.sleep(0, result=True),
+    )
+    assert vector_store_check, "Vector store database is not reachable."
+    assert parser_check, "Parser API is not reachable."
+    assert mcp_bridge_check, "MCP bridge API is not reachable."
 
     dependencies = SimpleNamespace(mcp_bridge=mcp_bridge, parser=parser, redis=redis, vector_store=vector_store, web_search_engine=web_search_engine)
 
     # setup global context
-    await _setup_model_registry(configuration=configuration, global_context=global_context, dependencies=dependencies)
+    model_provider_tasks, unavailable_model_providers = await _setup_model_registry(configuration=configuration, global_context=global_context, dependencies=dependencies)  # fmt: off
     await _setup_identity_access_manager(configuration=configuration, global_context=global_context, dependencies=dependencies)
+    await _setup_budget_ledger(configuration=configuration, global_context=global_context, dependencies=dependencies)
     await _setup_limiter(configuration=configuration, global_context=global_context, dependencies=dependencies)
     await _setup_tokenizer(configuration=configuration, global_context=global_context, dependencies=dependencies)
+    await _setup_embeddings_cache(configuration=configuration, global_context=global_context, dependencies=dependencies)
+    await _setup_response_cache(configuration=configuration, global_context=global_context, dependencies=dependencies)
+    await _setup_semantic_cache(configuration=configuration, global_context=global_context, dependencies=dependencies)
+    await _setup_request_coalescer(configuration=configuration, global_context=global_context, dependencies=dependencies)
     await _setup_agent_manager(configuration=configuration, global_context=global_context, dependencies=dependencies)
     await _setup_document_manager(configuration=configuration, global_context=global_context, dependencies=dependencies)
+    await _setup_usage_buffer(configuration=configuration, global_context=global_context, dependencies=dependencies)
+
+    # check periodically the health of the model providers, and the model providers not available to add them as soon as they come up
+    model_health_check_task = None
+    if configuration.settings.models_health_check_interval:
+        model_health_check_task = asyncio.create_task(
+            _check_model_providers(
+                model_registry=global_context.model_registry,
+                interval=configuration.settings.models_health_check_interval,
+                redis=Redis(connection_pool=redis),
+                cache_ttl=configuration.settings.models_cache_ttl,
+                tasks=model_provider_tasks,
+                unavailable_providers=unavailable_model_providers,
+            )
+        )
+
+    # refresh periodically the routing statistics of the model providers for the latency and least busy routing strategies
+    model_routing_task = None
+    routing_strategies = [RoutingStrategy.LATENCY] + ([RoutingStrategy.LEAST_BUSY] if configuration.settings.models_least_busy_shared else [])
+    if any(model.routing_strategy in routing_strategies for model in configuration.models):
+        model_routing_task = asyncio.create_task(_refresh_model_routers(model_registry=global_context.model_registry, interval=configuration.settings.models_routing_refresh_interval, routing_strategies=routing_strategies))  # fmt: off
 
     yield
 
     # cleanup resources when app shuts down
+    if model_health_check_task:
+        model_health_check_task.cancel()
+        await asyncio.gather(model_health_check_task, return_exceptions=True)
+    if model_routing_task:
+        model_routing_task.cancel()
+
+    for task in model_provider_tasks:
+        task.cancel()
+    await asyncio.gather(*model_provider_tasks, return_exceptions=True)
+
+    for model in global_context.model_registry.models:
+        await global_context.model_registry(model=model).close()
+    for _, provider in unavailable_model_providers:
+        await provider.close()
+
+    await global_context.metrics_buffer.close()
+
+    # budgets of the users and usage logs of the last requests are written before exiting
+    await global_context.budget_ledger.close()
+    if global_context.usage_buffer:
+        await global_context.usage_buffer.close()
+
+    # completions of the last requests are cached before closing the vector store
+    if global_context.semantic_cache:
+        await global_context.semantic_cache.close()
     if vector_store:
         await vector_store.close()
 
 
-async def _setup_model_registry(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
-    routers = []
+async def _setup_model_registry(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace) -> Tuple[Set[asyncio.Task], List[Tuple[Model, ModelClient]]]:  # fmt: off
+    global_context.model_registry = ModelRegistry(routers=[])
+    redis = Redis(connection_pool=dependencies.redis)
+
+    # performance metrics of all the model providers are written in redis in batches
+    global_context.metrics_buffer = MetricsBuffer(
+        redis=dependencies.redis,
+        retention_ms=configuration.settings.metrics_retention_ms,
+        flush_interval_ms=configuration.settings.metrics_flush_interval_ms,
+        batch_size=configuration.settings.metrics_flush_batch_size,
+        max_size=configuration.settings.metrics_buffer_max_size,
+    )
+    global_context.metrics_buffer.start()
+
+    tasks, unavailable_providers = set(), list()
     for model in configuration.models:
-        providers = []
         for provider in model.providers:
-            try:
-                # model provider can be not reatachable to API start up
-                provider = ModelClient.import_module(type=provider.type)(
-                    redis=dependencies.redis,
-                    metrics_retention_ms=configuration.settings.metrics_retention_ms,
-                    **provider.model_dump(),
-                )
-                providers.append(provider)
-            except Exception:
-                logger.debug(msg=traceback.format_exc())
-                continue
-        if not providers:
-            logger.error(msg=f"skip model {model.name} (0/{len(model.providers)} providers).")
-
-            # check if models specified in configuration are reachable
-            if configuration.settings.search_web_query_model and model.name == configuration.settings.search_web_query_model:
-                raise ValueError(f"Query web search model ({model.name}) must be reachable.")
-            if configuration.settings.vector_store_model and model.name == configuration.settings.vector_store_model:
-                raise ValueError(f"Vector store embedding model ({model.name}) must be reachable.")
-            if model.name == configuration.settings.search_multi_agents_synthesis_model:
-                raise ValueError(f"Multi agents synthesis model ({model.name}) must be reachable.")
-            if model.name == configuration.settings.search_multi_agents_reranker_model:
-                raise ValueError(f"Multi agents reranker model ({model.name}) must be reachable.")
+            circuit_breaker = CircuitBreaker(
+                name=f"{provider.model_name} ({provider.url})",
+                failure_rate=configuration.settings.models_circuit_breaker_failure_rate,
+                open_duration=configuration.settings.models_circuit_breaker_open_duration,
+                half_open_requests=configuration.settings.models_circuit_breaker_half_open_requests,
+            )
+            provider = ModelClient.import_module(type=provider.type)(
+                redis=dependencies.redis,
+                metrics_retention_ms=configuration.settings.metrics_retention_ms,
+                circuit_breaker=circuit_breaker,
+                metrics_buffer=global_context.metrics_buffer,
+                **provider.model_dump(),
+            )
+            setup = _setup_model_provider(
+                model=model,
+                provider=provider,
+                model_registry=global_context.model_registry,
+                redis=redis,
+                cache_ttl=configuration.settings.models_cache_ttl,
+                tasks=tasks,
+                unavailable_providers=unavailable_providers,
+            )
+            task = asyncio.create_task(setup)
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    # model providers are checked concurrently, those not available before the startup timeout are added in background as soon as they come up
+    pending = set()
+    if tasks:
+        _, pending = await asyncio.wait(set(tasks), timeout=configuration.settings.models_startup_timeout)
+    if pending:
+        logger.warning(msg=f"{len(pending)} model providers not available after {configuration.settings.models_startup_timeout}s, they will be added in background.")  # fmt: off
+    if unavailable_providers:
+        logger.warning(msg=f"{len(unavailable_providers)} model providers not available, they will be checked again by the health checks.")
 
+    for model in configuration.models:
+        if model.name in global_context.model_registry.models:
+            router = global_context.model_registry(model=model.name)
+            logger.info(msg=f"add model {model.name} ({len(router._providers)}/{len(model.providers)} providers).")
             continue
 
-        logger.info(msg=f"add model {model.name} ({len(providers)}/{len(model.providers)} providers).")
-        model = model.model_dump()
-        model["providers"] = providers
-        routers.append(ModelRouter(**model))
+        logger.error(msg=f"skip model {model.name} (0/{len(model.providers)} providers).")
+
+        # check if models specified in configuration are reachable
+        if configuration.settings.search_web_query_model and model.name == configuration.settings.search_web_query_model:
+            raise ValueError(f"Query web search model ({model.name}) must be reachable.")
+        if configuration.settings.vector_store_model and model.name == configuration.settings.vector_store_model:
+            raise ValueError(f"Vector store embedding model ({model.name}) must be reachable.")
+        if model.name == configuration.settings.search_multi_agents_synthesis_model:
+            raise ValueError(f"Multi agents synthesis model ({model.name}) must be reachable.")
+        if model.name == configuration.settings.search_multi_agents_reranker_model:
+            raise ValueError(f"Multi agents reranker model ({model.name}) must be reachable.")
+
+    return tasks, unavailable_providers
+
+
+async def _setup_model_provider(
+    model: Model,
+    provider: ModelClient,
+    model_registry: ModelRegistry,
+    redis: Redis,
+    cache_ttl: int,
+    tasks: Set[asyncio.Task],
+    unavailable_providers: List[Tuple[Model, ModelClient]],
+) -> None:
+    """
+    Check a model provider and add it to its model in the model registry. The attributes of the model provider are cached in Redis, a model provider
+    found in the cache is added immediately and checked in background. A model provider not available is added to the unavailable providers, to be
+    checked again by the health checks.
+
+    Args:
+        model(Model): The configuration of the model.
+        provider(ModelClient): The model provider to add.
+        model_registry(ModelRegistry): The model registry.
+        redis(Redis): The Redis client used to cache the attributes of the model provider.
+        cache_ttl(int): The time to live of the cached attributes in seconds, 0 to disable the cache.
+        tasks(Set[asyncio.Task]): The background tasks of the model providers, cancelled at shutdown.
+        unavailable_providers(List[Tuple[Model, ModelClient]]): The model providers not available, with the configuration of their model.
+    """
+    key = f"model_provider:{model.name}:{provider.name}:{provider.url}"
+
+    cache = None
+    if cache_ttl:
+        try:
+            cache = await redis.get(key)
+        except Exception as e:
+            logger.warning(msg=f"Failed to read cached attributes of model provider {provider.name} ({provider.url}): {e}")
+
+    try:
+        if cache:
+            cache = orjson.loads(cache)
+            provider.vector_size, provider.max_context_length = cache["vector_size"], cache["max_context_length"]
+        else:
+            # model provider can be not reachable to API start up
+            await provider.load()
+
+        if model.name in model_registry.models:
+            model_registry(model=model.name).add_provider(provider=provider)
+        else:
+            router = model.model_dump()
+            router["providers"] = [provider]
+            model_registry.add_router(router=ModelRouter(**router))
+
+    except asyncio.CancelledError:
+        await provider.close()
+        raise
+    except Exception:
+        logger.debug(msg=traceback.format_exc())
+        unavailable_providers.append((model, provider))
+        return
 
-    global_context.model_registry = ModelRegistry(routers=routers)
+    logger.debug(msg=f"add model provider {provider.name} ({provider.url}) to model {model.name}.")
+
+    if cache:
+        task = asyncio.create_task(_check_cached_model_provider(model=model, provider=provider, model_registry=model_registry, redis=redis, cache_ttl=cache_ttl))  # fmt: off
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    elif cache_ttl:
+        await _cache_model_provider(model=model, provider=provider, redis=redis, cache_ttl=cache_ttl)
+
+
+async def _check_cached_model_provider(model: Model, provider: ModelClient, model_registry: ModelRegistry, redis: Redis, cache_ttl: int) -> None:
+    """
+    Check a model provider added from the cache. If the model provider is not available, it is ejected by its circuit breaker until a health check
+    succeeds, otherwise the attributes of its model and its cached attributes are refreshed.
+
+    Args:
+        model(Model): The configuration of the model.
+        provider(ModelClient): The model provider to check.
+        model_registry(ModelRegistry): The model registry.
+        redis(Redis): The Redis client used to cache the attributes of the model provider.
+        cache_ttl(int): The time to live of the cached attributes in seconds.
+    """
+    try:
+        await provider.load()
+        router = model_registry(model=model.name)
+        router._set_providers(providers=router._providers)
+    except Exception:
+        logger.warning(msg=f"Model provider {provider.name} ({provider.url}) added from cache is not available, it is ejected.")
+        logger.debug(msg=traceback.format_exc())
+        provider.circuit_breaker.eject()
+        return
+
+    await _cache_model_provider(model=model, provider=provider, redis=redis, cache_ttl=cache_ttl)
+
+
+async def _cache_model_provider(model: Model, provider: ModelClient, redis: Redis, cache_ttl: int) -> None:
+    key = f"model_provider:{model.name}:{provider.name}:{provider.url}"
+    try:
+        await redis.set(key, orjson.dumps({"vector_size": provider.vector_size, "max_context_length": provider.max_context_length}), ex=cache_ttl)
+    except Exception as e:
+        logger.warning(msg=f"Failed to cache attributes of model provider {provider.name} ({provider.url}): {e}")
+
+
+async def _check_model_providers(
+    model_registry: ModelRegistry,
+    interval: int,
+    redis: Redis,
+    cache_ttl: int,
+    tasks: Set[asyncio.Task],
+    unavailable_providers: List[Tuple[Model, ModelClient]],
+) -> None:
+    """
+    Check periodically the health of the model providers of the model registry, the results feed the circuit breakers of the providers. The model
+    providers not available are checked again and added to the model registry as soon as they come up.
+
+    Args:
+        model_registry(ModelRegistry): The model registry.
+        interval(int): The interval between two health checks in seconds.
+        redis(Redis): The Redis client used to cache the attributes of the model providers.
+        cache_ttl(int): The time to live of the cached attributes in seconds, 0 to disable the cache.
+        tasks(Set[asyncio.Task]): The background tasks of the model providers, cancelled at shutdown.
+        unavailable_providers(List[Tuple[Model, ModelClient]]): The model providers not available, with the configuration of their model.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        routers = [model_registry(model=model) for model in model_registry.models]
+        providers, unavailable_providers[:] = unavailable_providers[:], []
+        await asyncio.gather(
+            *[router.check(timeout=interval) for router in routers],
+            *[
+                _setup_model_provider(
+                    model=model,
+                    provider=provider,
+                    model_registry=model_registry,
+                    redis=redis,
+                    cache_ttl=cache_ttl,
+                    tasks=tasks,
+                    unavailable_providers=unavailable_providers,
+                )  # fmt: off
+                for model, provider in providers
+            ],
+            return_exceptions=True,
+        )
+
+
+async def _refresh_model_routers(model_registry: ModelRegistry, interval: int, routing_strategies: List[RoutingStrategy]) -> None:
+    """
+    Refresh periodically the routing statistics of the model providers: the recent latencies for the models using the latency routing strategy, and
+    the in-flight requests shared with the other API workers for the models using the least busy routing strategy.
+
+    Args:
+        model_registry(ModelRegistry): The model registry.
+        interval(int): The interval between two refreshes in seconds.
+        routing_strategies(List[RoutingStrategy]): The routing strategies to refresh.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    while True:
+        refreshes = list()
+        for model in model_registry.models:
+            router = model_registry(model=model)
+            if router._routing_strategy not in routing_strategies:
+                continue
+            if router._routing_strategy == RoutingStrategy.LATENCY:
+                refreshes.append(router.refresh_latencies())
+            else:
+                # counters of a worker are ignored if not published for several intervals (worker stopped)
+                refreshes.append(router.share_inflight_requests(worker_id=worker_id, ttl=interval * 3))
+
+        await asyncio.gather(*refreshes, return_exceptions=True)
+        await asyncio.sleep(interval)
 
 
 async def _setup_identity_access_manager(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
@@ -109,6 +384,16 @@ async def _setup_identity_access_manager(configuration: Configuration, global_co
     )
 
 
+async def _setup_budget_ledger(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
+    # budgets of the users are decreased in redis and written in postgres in batches
+    global_context.budget_ledger = BudgetLedger(
+        redis=dependencies.redis,
+        flush_interval_ms=configuration.settings.auth_budget_flush_interval_ms,
+        batch_size=configuration.settings.auth_budget_flush_batch_size,
+    )
+    global_context.budget_ledger.start()
+
+
 async def _setup_limiter(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
     limiter = Limiter(redis=dependencies.redis, strategy=configuration.settings.rate_limiting_strategy)
 
@@ -116,7 +401,53 @@ async def _setup_limiter(configuration: Configuration, global_context: GlobalCon
 
 
 async def _setup_tokenizer(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
-    global_context.tokenizer = UsageTokenizer(tokenizer=configuration.settings.usage_tokenizer)
+    global_context.tokenizer = UsageTokenizer(tokenizer=configuration.settings.usage_tokenizer, cache_max_bytes=configuration.settings.usage_tokenizer_cache_max_bytes)  # fmt: off
+
+
+async def _setup_embeddings_cache(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
+    if not configuration.settings.embeddings_cache_ttl:
+        global_context.embeddings_cache = None
+        return
+
+    global_context.embeddings_cache = EmbeddingsCache(
+        redis=dependencies.redis,
+        ttl=configuration.settings.embeddings_cache_ttl,
+        max_size=configuration.settings.embeddings_cache_max_size,
+    )
+
+
+async def _setup_response_cache(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
+    if not configuration.settings.chat_completions_cache_ttl:
+        global_context.response_cache = None
+        return
+
+    global_context.response_cache = ResponseCache(
+        redis=dependencies.redis,
+        ttl=configuration.settings.chat_completions_cache_ttl,
+        max_temperature=configuration.settings.chat_completions_cache_max_temperature,
+        max_size=configuration.settings.chat_completions_cache_max_size,
+    )
+
+
+async def _setup_semantic_cache(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
+    if not configuration.settings.chat_completions_semantic_cache_models:
+        global_context.semantic_cache = None
+        return
+
+    aliases = {alias: model.name for model in configuration.models for alias in model.aliases}
+    global_context.semantic_cache = SemanticCache(
+        vector_store=dependencies.vector_store,
+        vector_store_model=global_context.model_registry(model=configuration.settings.vector_store_model),
+        redis=dependencies.redis,
+        models=[aliases.get(model, model) for model in configuration.settings.chat_completions_semantic_cache_models],
+        threshold=configuration.settings.chat_completions_semantic_cache_threshold,
+        ttl=configuration.settings.chat_completions_semantic_cache_ttl,
+    )
+    await global_context.semantic_cache.setup()
+
+
+async def _setup_request_coalescer(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
+    global_context.request_coalescer = RequestCoalescer() if configuration.settings.models_request_coalescing else None
 
 
 async def _setup_agent_manager(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
@@ -161,3 +492,17 @@ async def _setup_document_manager(configuration: Configuration, global_context:
         web_search_manager=web_search_manager,
         multi_agent_manager=multi_agent_manager,
     )
+
+
+async def _setup_usage_buffer(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
+    if not configuration.settings.monitoring_postgres_enabled:
+        return
+
+    # usage logs of the requests are written in postgres in batches
+    global_context.usage_buffer = UsageBuffer(
+        flush_interval_ms=configuration.settings.monitoring_postgres_flush_interval_ms,
+        batch_size=configuration.settings.monitoring_postgres_flush_batch_size,
+        max_size=configuration.settings.monitoring_postgres_buffer_max_size,
+        max_retries=configuration.settings.monitoring_postgres_max_retries,
+    )
+    global_context.usage_buffer.start()